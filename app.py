@@ -6,6 +6,8 @@ import os
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import RandomForestRegressor
 import warnings
+from model_loader import ChangeAwareLoader
+from model_store import write_atomic
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
@@ -17,17 +19,36 @@ label_encoders = {}
 # Currency conversion rate (USD to INR) - you can update this as needed
 USD_TO_INR_RATE = float(os.environ.get('USD_TO_INR_RATE', 83.0))
 
-def load_model_and_encoders():
-    """Load the trained model and label encoders"""
-    global model, label_encoders
+MODEL_PATH = os.environ.get('MODEL_PATH') or 'insurance_model.pkl'
+ENCODERS_PATH = os.environ.get('ENCODERS_PATH') or 'label_encoders.pkl'
+# How often the model files are checked for changes
+MODEL_CHECK_INTERVAL_MS = int(os.environ.get('MODEL_CHECK_INTERVAL_MS', 1000))
+
+def read_model_and_encoders():
+    """Unpickle the model and label encoders that exist on disk"""
+    loaded_model, loaded_encoders = None, {}
     
-    if os.path.exists('insurance_model.pkl'):
-        with open('insurance_model.pkl', 'rb') as f:
-            model = pickle.load(f)
+    if os.path.exists(MODEL_PATH):
+        with open(MODEL_PATH, 'rb') as f:
+            loaded_model = pickle.load(f)
+        # Requests score one row; joblib threads only add overhead
+        loaded_model.n_jobs = 1
     
-    if os.path.exists('label_encoders.pkl'):
-        with open('label_encoders.pkl', 'rb') as f:
-            label_encoders = pickle.load(f)
+    if os.path.exists(ENCODERS_PATH):
+        with open(ENCODERS_PATH, 'rb') as f:
+            loaded_encoders = pickle.load(f)
+    
+    return loaded_model, loaded_encoders
+
+# The files are only unpickled again after they change; training replaces both,
+# and a reload waits until they stop changing so a model is not paired with old encoders
+model_loader = ChangeAwareLoader([MODEL_PATH, ENCODERS_PATH], read_model_and_encoders, MODEL_CHECK_INTERVAL_MS,
+                                 together=True)
+
+def load_model_and_encoders(refresh=False):
+    """Load the trained model and label encoders if they changed since the last load"""
+    global model, label_encoders
+    model, label_encoders = model_loader.get(refresh)
 
 def train_model():
     """Train the Random Forest model on the insurance dataset"""
@@ -50,15 +71,15 @@ def train_model():
     y = df['charges']
     
     # Train Random Forest model
-    model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=1, n_jobs=-1)
+    model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=1,
+                                  n_jobs=int(os.environ.get('TRAIN_N_JOBS', 1)))
     model.fit(X, y)
     
-    # Save the model and encoders
-    with open('insurance_model.pkl', 'wb') as f:
-        pickle.dump(model, f)
-    
-    with open('label_encoders.pkl', 'wb') as f:
-        pickle.dump(label_encoders, f)
+    # Save the model and encoders; written atomically so other workers never load a partial file
+    write_atomic(MODEL_PATH, lambda f: pickle.dump(model, f))
+    write_atomic(ENCODERS_PATH, lambda f: pickle.dump(label_encoders, f))
+    # Serve the files just written, not the previous version the loader still holds
+    load_model_and_encoders(refresh=True)
     
     print("Model trained and saved successfully!")
 
@@ -71,7 +92,7 @@ def home():
 def predict():
     """Predict insurance charges based on input parameters"""
     try:
-        load_model_and_encoders()  # Ensure model is loaded
+        load_model_and_encoders()  # Pick up a retrained model
         # Get input data
         data = request.get_json()
         
@@ -136,9 +157,11 @@ def train():
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
+    load_model_and_encoders()
     return jsonify({
         'status': 'healthy',
-        'model_loaded': model is not None
+        'model_loaded': model is not None,
+        'model_loads': model_loader.loads
     })
 
 if __name__ == '__main__':
@@ -1,110 +1,222 @@
+import time
+_import_start = time.perf_counter()
+
 import os
+import sys
 import logging
-import time
+import json
+import hmac
+import math
+import subprocess
+import threading
 from functools import wraps
-from flask import Flask, request, jsonify, render_template, g
-import pandas as pd
+from flask import Flask, request, jsonify, render_template, g, url_for
 import numpy as np
-import pickle
-from sklearn.preprocessing import LabelEncoder
-from sklearn.ensemble import RandomForestRegressor
 import warnings
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-import sentry_sdk
-from sentry_sdk.integrations.flask import FlaskIntegration
 from config import config
+import codec
+from codec import (ResponseCodec, INVALID_JSON, MODEL_NOT_LOADED, ENCODING_ERROR, PREDICTION_ERROR,
+                   SERVER_ERROR, QUANTILES_UNAVAILABLE)
+from features import RequestValidator, validate_batch, encode_batch, encode_row
+from cache import create_prediction_cache
+from ratelimit import create_rate_limiter
+from model_store import ModelStore
+from registry import DEFAULT_MODEL, ModelRegistry, ShadowScorer, parse_stores
+from training import training_settings, train_and_publish
+from log_pipeline import should_sample
+from profiler import SamplingProfiler
+from concurrency import limit_native_threads, thread_env
 
 warnings.filterwarnings('ignore')
 
-# Initialize Sentry for error tracking
-if os.environ.get('SENTRY_DSN'):
-    sentry_sdk.init(
-        dsn=os.environ.get('SENTRY_DSN'),
-        integrations=[FlaskIntegration()],
-        traces_sample_rate=1.0,
-        environment=os.environ.get('FLASK_ENV', 'development')
-    )
+_imports_done = time.perf_counter()
+
+class StartupTimer:
+    """Durations of the startup phases, reported in the log and on /health"""
+    
+    def __init__(self, start):
+        self.start = start
+        self.last = start
+        self.phases = {}
+    
+    def mark(self, phase):
+        """Record the time since the previous mark as ``phase``"""
+        now = time.perf_counter()
+        self.phases[phase] = round(now - self.last, 4)
+        self.last = now
+    
+    def report(self):
+        return {**self.phases, 'total': round(self.last - self.start, 4)}
 
 def create_app(config_name=None):
     """Application factory pattern"""
+    startup = StartupTimer(_import_start)
+    startup.phases['imports'] = round(_imports_done - _import_start, 4)
+    startup.last = time.perf_counter()
+    
     if config_name is None:
         config_name = os.environ.get('FLASK_ENV', 'development')
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    # Under gunicorn the pools are capped before NumPy loads (gunicorn.conf.py)
+    limit_native_threads(app.config['INFERENCE_THREADS'])
+    startup.mark('config')
     
     # Setup logging
     setup_logging(app)
     
-    # Initialize metrics
+    # Error tracking is optional and only imported when configured
+    trace_sampler = None
+    if app.config.get('SENTRY_DSN'):
+        trace_sampler = setup_sentry(app, config_name)
+    startup.mark('integrations')
+    
+    # Initialize metrics; prometheus_client is only imported when they are enabled,
+    # otherwise every recording call goes to a no-op stand-in
     if app.config.get('ENABLE_METRICS'):
-        setup_metrics(app)
+        import metrics
+        metrics.init_app(app)
+    else:
+        import null_metrics as metrics
     
-    # Global variables for the model and encoders
-    model = None
-    label_encoders = {}
+    # Opt-in sampling profiler, started in each worker by its first request
+    profiler = None
+    if app.config['PROFILER_ENABLED']:
+        profiler = SamplingProfiler(
+            hz=app.config['PROFILER_HZ'],
+            output_dir=app.config['PROFILER_OUTPUT_DIR'] or None,
+            dump_interval=app.config['PROFILER_DUMP_INTERVAL_S']
+        )
     
-    def load_model_and_encoders():
-        """Load the trained model and label encoders"""
-        nonlocal model, label_encoders
+    # The active model version; replaced as a whole when a new version is published.
+    # Further stores of MODEL_REGISTRY are served on request next to it.
+    check_interval = app.config['MODEL_CHECK_INTERVAL_MS']
+    store = ModelStore(app.config['MODEL_DIR'], check_interval)
+    stores = {name: ModelStore(path, check_interval)
+              for name, path in parse_stores(app.config['MODEL_REGISTRY']).items()}
+    stores[DEFAULT_MODEL] = store
+    registry = ModelRegistry(
+        stores,
+        lambda model_store, version: model_store.load(
+            version,
+            engine=app.config['INFERENCE_ENGINE'],
+            grid_mode=app.config['GRID_MODE'],
+            threads=app.config['INFERENCE_THREADS'],
+            parallel_min_rows=app.config['INFERENCE_PARALLEL_MIN_ROWS']
+        ),
+        memory_budget=int(app.config['MODEL_MEMORY_BUDGET_MB'] * 1024 * 1024),
+        logger=app.logger,
+        metrics=metrics
+    )
+    shadow = None
+    if app.config['SHADOW_MODEL']:
+        shadow = ShadowScorer(registry, app.config['SHADOW_MODEL'], app.config['SHADOW_MAX_PENDING'], app.logger)
+    active = None
+    # (job id, process) of the training runs this worker started
+    training_processes = []
+    # Synchronous training (TRAIN_ASYNC=false) runs one request at a time
+    training_lock = threading.Lock()
+    
+    # Repeated profiles are served from a two-tier prediction cache
+    prediction_cache = create_prediction_cache(app)
+    rate_limiter = create_rate_limiter(app)
+    startup.mark('cache')
+    
+    def load_model_and_encoders(refresh=False):
+        """Load the published model version if it changed since the last check
+        
+        CURRENT is checked at most every MODEL_CHECK_INTERVAL_MS unless ``refresh``
+        is set, as it is right after publishing from this process.
+        """
+        nonlocal active
         
         try:
-            if os.path.exists(app.config['MODEL_PATH']):
-                with open(app.config['MODEL_PATH'], 'rb') as f:
-                    model = pickle.load(f)
-                app.logger.info("Model loaded successfully")
-            
-            if os.path.exists(app.config['ENCODERS_PATH']):
-                with open(app.config['ENCODERS_PATH'], 'rb') as f:
-                    label_encoders = pickle.load(f)
-                app.logger.info("Label encoders loaded successfully")
-                
+            # Keeps serving the previous version if this one fails; the next publish retries
+            loaded = registry.published(refresh=refresh)
         except Exception as e:
             app.logger.error(f"Error loading model: {str(e)}")
             raise
+        if loaded is None or loaded is active:
+            return
+        
+        if prediction_cache is not None:
+            prediction_cache.clear()
+        active = loaded
+        app.logger.info(f"Model version {loaded.version} loaded ({loaded.engine} engine)")
     
-    def train_model():
-        """Train the Random Forest model on the insurance dataset"""
-        nonlocal model, label_encoders
+    def select_model(spec):
+        """Model a request picked with ?model=name[@version], or the published default
         
-        try:
-            # Load the dataset
-            df = pd.read_csv(app.config['DATASET_PATH'])
-            
-            # Create label encoders for categorical variables
-            label_encoders = {}
-            categorical_columns = ['sex', 'smoker', 'region']
-            
-            for col in categorical_columns:
-                le = LabelEncoder()
-                df[col] = le.fit_transform(df[col])
-                label_encoders[col] = le
-            
-            # Prepare features and target
-            X = df.drop(['charges'], axis=1)
-            y = df['charges']
-            
-            # Train Random Forest model
-            model = RandomForestRegressor(n_estimators=100, max_depth=10, random_state=1, n_jobs=-1)
-            model.fit(X, y)
-            
-            # Save the model and encoders
-            with open(app.config['MODEL_PATH'], 'wb') as f:
-                pickle.dump(model, f)
-            
-            with open(app.config['ENCODERS_PATH'], 'wb') as f:
-                pickle.dump(label_encoders, f)
-            
-            app.logger.info("Model trained and saved successfully!")
-            
-        except Exception as e:
-            app.logger.error(f"Error training model: {str(e)}")
-            raise
+        Raises KeyError for an unknown model or version.
+        """
+        if not spec:
+            return active
+        return registry.get(spec)
+    
+    def start_training_job():
+        """Launch a training run in a separate process unless one is running already
+        
+        Returns (job_id, started) like ModelStore.start_job().
+        """
+        def launch(job_id):
+            process = subprocess.Popen(
+                [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training.py'),
+                 '--model-dir', app.config['MODEL_DIR'], '--job', job_id],
+                # Training gets its own thread budget, not the worker's
+                env=thread_env(app.config['TRAIN_N_JOBS'])
+            )
+            training_processes.append((job_id, process))
+            return process.pid
+        
+        return store.start_job(training_settings(app.config), launch)
+    
+    def reap_training_processes():
+        """Collect finished training processes so they do not linger as zombies
+        
+        A process that exited without recording how its job ended, e.g. because
+        it was killed, leaves the job marked failed.
+        """
+        running = []
+        for job_id, process in training_processes:
+            returncode = process.poll()
+            if returncode is None:
+                running.append((job_id, process))
+            else:
+                store.fail_job(job_id, f"Training process exited with code {returncode} without recording a status")
+        training_processes[:] = running
+    
+    def has_admin_token():
+        """Whether the request carries ADMIN_TOKEN, which must be configured"""
+        token = app.config['ADMIN_TOKEN']
+        supplied = request.headers.get('X-Admin-Token', '')
+        return bool(token) and hmac.compare_digest(supplied.encode(), token.encode())
     
     # Request timing middleware
     @app.before_request
     def before_request():
         g.start_time = time.time()
+        if profiler is not None:
+            profiler.ensure_running()
+        if training_processes:
+            reap_training_processes()
+        
+        # Pick up a newly published model version
+        try:
+            load_model_and_encoders()
+        except Exception:
+            pass
+    
+    # Share of successful requests whose log lines are kept; failures are always logged
+    log_sample_rate = app.config['LOG_SAMPLE_RATE']
+    
+    def record_request(method, path, status, duration):
+        """Feed a finished request to the trace sampler and the access log"""
+        if trace_sampler is not None:
+            trace_sampler.record(path, duration, status)
+        # Log request timing; the line is formatted by the log writer, not here
+        if status >= 400 or should_sample(log_sample_rate):
+            app.logger.info("%s %s - %s - %.3fs", method, path, status, duration)
     
     @app.after_request
     def after_request(response):
@@ -113,10 +225,8 @@ def create_app(config_name=None):
             for header, value in app.config['SECURITY_HEADERS'].items():
                 response.headers[header] = value
         
-        # Log request timing
         if hasattr(g, 'start_time'):
-            duration = time.time() - g.start_time
-            app.logger.info(f"{request.method} {request.path} - {response.status_code} - {duration:.3f}s")
+            record_request(request.method, request.path, response.status_code, time.time() - g.start_time)
         
         return response
     
@@ -140,15 +250,46 @@ def create_app(config_name=None):
         def decorator(f):
             @wraps(f)
             def wrapped(*args, **kwargs):
-                # Simple in-memory rate limiting (use Redis in production)
-                client_ip = request.remote_addr
-                current_time = time.time()
+                if rate_limiter is None:
+                    return f(*args, **kwargs)
                 
-                # This is a simplified rate limiter - use Flask-Limiter in production
+                key_header = app.config['RATELIMIT_KEY_HEADER']
+                client_ip = (key_header and request.headers.get(key_header)) or request.remote_addr
+                retry_after = rate_limiter.hit(f'{f.__name__}:{client_ip}', max_requests, window)
+                if retry_after:
+                    return rate_limit_exceeded(f.__name__, retry_after)
                 return f(*args, **kwargs)
+            # Read by asgi.py, which serves /predict outside of Flask
+            wrapped.rate_limit = (max_requests, window)
             return wrapped
         return decorator
     
+    def rate_limit_exceeded(endpoint, retry_after):
+        metrics.RATE_LIMITED.labels(endpoint).inc()
+        retry_after = math.ceil(retry_after)
+        return jsonify({
+            'success': False,
+            'error': 'Rate limit exceeded',
+            'message': f'Too many requests, retry in {retry_after} seconds'
+        }), 429, {'Retry-After': str(retry_after)}
+    
+    # /predict fast path: validator and response bodies are prepared once
+    validator = RequestValidator()
+    response_codec = ResponseCodec(app)
+    
+    def parse_json_body():
+        """Parse the request body like request.get_json(), with the fast codec if enabled"""
+        if not request.is_json:
+            # Raises the same error get_json() always has
+            return request.get_json()
+        return codec.loads(request.get_data(cache=False), app.config['FAST_JSON'])
+    
+    def json_response(body, status=200):
+        return app.response_class(body, status=status, mimetype=response_codec.mimetype)
+    
+    def error_response(error, status):
+        return json_response(response_codec.error(*error), status)
+    
     @app.route('/')
     def home():
         """Home page with a simple form"""
@@ -160,118 +301,291 @@ def create_app(config_name=None):
         """Predict insurance charges based on input parameters"""
         try:
             # Validate input data
-            data = request.get_json()
+            with metrics.PARSE.time():
+                data = parse_json_body()
             if not data:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid JSON',
-                    'message': 'Request must contain valid JSON data'
-                }), 400
+                return error_response(INVALID_JSON, 400)
             
-            required_fields = ['age', 'sex', 'bmi', 'children', 'smoker', 'region']
-            for field in required_fields:
-                if field not in data:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Missing field',
-                        'message': f'Missing required field: {field}'
-                    }), 400
+            missing = validator.missing(data)
+            if missing is not None:
+                return error_response(('Missing field', f'Missing required field: {missing}'), 400)
             
-            # Load model if not loaded
-            if model is None:
-                load_model_and_encoders()
+            # Use one model version for the whole request
+            try:
+                current = select_model(request.args.get('model'))
+            except KeyError as e:
+                return error_response(('Unknown model', e.args[0]), 404)
+            if current is None:
+                return error_response(MODEL_NOT_LOADED, 503)
             
             # Extract and validate features
             try:
-                age = float(data['age'])
-                if not (18 <= age <= 100):
-                    raise ValueError("Age must be between 18 and 100")
+                with metrics.VALIDATE.time():
+                    age, sex, bmi, children, smoker, region = validator.validate(data)
+            except (ValueError, TypeError) as e:
+                return error_response(('Validation error', str(e)), 400)
+            
+            explain = codec.parse_flag(request.args.get('explain'))
+            try:
+                quantiles = codec.parse_quantiles(request.args.get('quantiles'), app.config['PREDICTION_QUANTILES'])
+            except ValueError as e:
+                return error_response(('Validation error', str(e)), 400)
+            if quantiles is not None and not current.has_quantiles:
+                return error_response(QUANTILES_UNAVAILABLE, 422)
+            scored = explain or quantiles is not None
+            
+            # Serve repeated profiles from the cache; explanations and quantiles always walk the forest
+            extra = None
+            cache_key = None
+            prediction_usd = None
+            if prediction_cache is not None and not scored:
+                cache_key = prediction_cache.key(f'{current.name}-{current.version}-{current.engine}',
+                                                 age, sex, bmi, children, smoker, region)
+                cached = prediction_cache.get(cache_key)
+                if cached is not None:
+                    prediction_usd = np.float64(cached)
+                    metrics.CACHE_HITS.inc()
+                else:
+                    metrics.CACHE_MISSES.inc()
+            
+            if prediction_usd is None:
+                # Encode categorical variables
+                try:
+                    with metrics.ENCODE.time():
+                        sex_encoded = current.encoding.encode('sex', sex)
+                        smoker_encoded = current.encoding.encode('smoker', smoker)
+                        region_encoded = current.encoding.encode('region', region)
+                except Exception as e:
+                    app.logger.error(f"Error encoding categorical variables: {str(e)}")
+                    return error_response(ENCODING_ERROR, 500)
                 
-                sex = data['sex']
-                if sex not in ['male', 'female']:
-                    raise ValueError("Sex must be 'male' or 'female'")
+                # Create feature array
+                features = np.array([[age, sex_encoded, bmi, children, smoker_encoded, region_encoded]])
+            
+            # Make prediction
+            try:
+                if scored:
+                    with metrics.PREDICT.time(), registry.timed(current):
+                        predictions_usd, explained, quantile_values = current.score(features, explain, quantiles)
+                    prediction_usd = predictions_usd[0]
+                    extra = codec.extra_fields(0, explained, quantiles, quantile_values,
+                                               app.config['USD_TO_INR_RATE'])
+                elif prediction_usd is None:
+                    with metrics.PREDICT.time(), registry.timed(current):
+                        prediction_usd = current.predict(features)[0]
+                    if cache_key is not None:
+                        prediction_cache.set(cache_key, prediction_usd)
+                prediction_inr = prediction_usd * app.config['USD_TO_INR_RATE']
+                metrics.PREDICTIONS.labels(current.engine).inc()
                 
-                bmi = float(data['bmi'])
-                if not (10 <= bmi <= 50):
-                    raise ValueError("BMI must be between 10 and 50")
+                # Log successful prediction
+                if should_sample(log_sample_rate):
+                    app.logger.info("Prediction successful: $%.2f USD, ₹%.2f INR", prediction_usd, prediction_inr)
                 
-                children = int(data['children'])
-                if not (0 <= children <= 10):
-                    raise ValueError("Children must be between 0 and 10")
+                with metrics.SERIALIZE.time():
+                    response = json_response(response_codec.prediction(prediction_usd, prediction_inr, extra))
+                if shadow is not None:
+                    # Queued once the response has been sent
+                    values = (age, sex, bmi, children, smoker, region)
+                    response.call_on_close(lambda: shadow.submit(
+                        current, lambda encoding: np.array([encode_row(encoding, *values)]), [prediction_usd]))
+                return response
                 
-                smoker = data['smoker']
-                if smoker not in ['yes', 'no']:
-                    raise ValueError("Smoker must be 'yes' or 'no'")
+            except Exception as e:
+                app.logger.error(f"Error making prediction: {str(e)}")
+                return error_response(PREDICTION_ERROR, 500)
                 
-                region = data['region']
-                valid_regions = ['southwest', 'southeast', 'northwest', 'northeast']
-                if region not in valid_regions:
-                    raise ValueError(f"Region must be one of: {', '.join(valid_regions)}")
-                    
-            except (ValueError, TypeError) as e:
+        except Exception as e:
+            app.logger.error(f"Unexpected error in prediction: {str(e)}")
+            return error_response(SERVER_ERROR, 500)
+    
+    def parse_batch_payload():
+        """Read the applicants of a batch request from a JSON array or NDJSON body"""
+        if request.mimetype == 'application/x-ndjson':
+            lines = request.get_data(as_text=True).splitlines()
+            return [json.loads(line) for line in lines if line.strip()]
+        
+        data = request.get_json()
+        if isinstance(data, dict):
+            data = data.get('applicants')
+        if not isinstance(data, list):
+            raise ValueError('Request must contain a JSON array of applicants')
+        return data
+    
+    @app.route('/predict/batch', methods=['POST'])
+    @rate_limit(max_requests=60, window=60)
+    def predict_batch():
+        """Predict insurance charges for many applicants in one vectorized call"""
+        try:
+            try:
+                records = parse_batch_payload()
+            except Exception:
                 return jsonify({
                     'success': False,
-                    'error': 'Validation error',
-                    'message': str(e)
+                    'error': 'Invalid JSON',
+                    'message': 'Request must contain a JSON array or NDJSON stream of applicants'
                 }), 400
             
-            # Encode categorical variables
+            if len(records) > app.config['BATCH_MAX_SIZE']:
+                return jsonify({
+                    'success': False,
+                    'error': 'Batch too large',
+                    'message': f"A batch may contain at most {app.config['BATCH_MAX_SIZE']} applicants"
+                }), 413
+            
             try:
-                sex_encoded = label_encoders['sex'].transform([sex])[0]
-                smoker_encoded = label_encoders['smoker'].transform([smoker])[0]
-                region_encoded = label_encoders['region'].transform([region])[0]
-            except Exception as e:
-                app.logger.error(f"Error encoding categorical variables: {str(e)}")
+                current = select_model(request.args.get('model'))
+            except KeyError as e:
+                return jsonify({
+                    'success': False,
+                    'error': 'Unknown model',
+                    'message': e.args[0]
+                }), 404
+            if current is None:
                 return jsonify({
                     'success': False,
-                    'error': 'Encoding error',
-                    'message': 'Error processing categorical data'
-                }), 500
+                    'error': 'Model not loaded',
+                    'message': 'Model needs to be trained first'
+                }), 503
             
-            # Create feature array
-            features = np.array([[age, sex_encoded, bmi, children, smoker_encoded, region_encoded]])
+            # Validate and encode every applicant column-wise
+            with metrics.VALIDATE.time():
+                columns, errors = validate_batch(records)
+            valid_rows = np.array([i for i in range(len(records)) if i not in errors], dtype=np.intp)
             
-            # Make prediction
+            explain = codec.parse_flag(request.args.get('explain'))
             try:
-                prediction_usd = model.predict(features)[0]
-                prediction_inr = prediction_usd * app.config['USD_TO_INR_RATE']
-                
-                # Log successful prediction
-                app.logger.info(f"Prediction successful: ${prediction_usd:.2f} USD, ₹{prediction_inr:.2f} INR")
-                
+                quantiles = codec.parse_quantiles(request.args.get('quantiles'), app.config['PREDICTION_QUANTILES'])
+            except ValueError as e:
                 return jsonify({
-                    'success': True,
-                    'predicted_charges_usd': round(prediction_usd, 2),
-                    'predicted_charges_inr': round(prediction_inr, 2),
-                    'message': 'Prediction successful'
-                })
-                
-            except Exception as e:
-                app.logger.error(f"Error making prediction: {str(e)}")
+                    'success': False,
+                    'error': 'Validation error',
+                    'message': str(e)
+                }), 400
+            if quantiles is not None and not current.has_quantiles:
                 return jsonify({
                     'success': False,
-                    'error': 'Prediction error',
-                    'message': 'Error generating prediction'
-                }), 500
-                
+                    'error': QUANTILES_UNAVAILABLE[0],
+                    'message': QUANTILES_UNAVAILABLE[1]
+                }), 422
+            scored = explain or quantiles is not None
+            
+            predictions_usd = np.empty(0)
+            if len(valid_rows):
+                try:
+                    with metrics.ENCODE.time():
+                        features = encode_batch(columns, current.encoding, valid_rows)
+                    with metrics.PREDICT.time(), registry.timed(current):
+                        if scored:
+                            predictions_usd, explained, quantile_values = current.score(features, explain, quantiles)
+                        else:
+                            predictions_usd = current.predict(features)
+                except Exception as e:
+                    app.logger.error(f"Error making batch prediction: {str(e)}")
+                    return jsonify({
+                        'success': False,
+                        'error': 'Prediction error',
+                        'message': 'Error generating prediction'
+                    }), 500
+            
+            metrics.BATCH_SIZE.labels('batch').observe(len(valid_rows))
+            metrics.PREDICTIONS.labels(current.engine).inc(len(valid_rows))
+            
+            serialize_start = time.perf_counter()
+            predictions_inr = predictions_usd * app.config['USD_TO_INR_RATE']
+            results = [None] * len(records)
+            for i, prediction_usd, prediction_inr in zip(valid_rows.tolist(),
+                                                         predictions_usd.round(2).tolist(),
+                                                         predictions_inr.round(2).tolist()):
+                results[i] = {
+                    'index': i,
+                    'success': True,
+                    'predicted_charges_usd': prediction_usd,
+                    'predicted_charges_inr': prediction_inr
+                }
+            if scored and len(valid_rows):
+                for k, i in enumerate(valid_rows.tolist()):
+                    results[i].update(codec.extra_fields(k, explained, quantiles, quantile_values,
+                                                         app.config['USD_TO_INR_RATE']))
+            for i, (error, message) in errors.items():
+                results[i] = {
+                    'index': i,
+                    'success': False,
+                    'error': error,
+                    'message': message
+                }
+            
+            if should_sample(log_sample_rate):
+                app.logger.info("Batch prediction: %d scored, %d rejected", len(valid_rows), len(errors))
+            
+            response = jsonify({
+                'success': True,
+                'count': len(records),
+                'errors': len(errors),
+                'results': results,
+                'message': 'Batch prediction completed'
+            })
+            metrics.SERIALIZE.observe(time.perf_counter() - serialize_start)
+            if shadow is not None and len(valid_rows):
+                response.call_on_close(lambda: shadow.submit(
+                    current, lambda encoding: encode_batch(columns, encoding, valid_rows), predictions_usd))
+            return response
+            
         except Exception as e:
-            app.logger.error(f"Unexpected error in prediction: {str(e)}")
+            app.logger.error(f"Unexpected error in batch prediction: {str(e)}")
             return jsonify({
                 'success': False,
                 'error': 'Server error',
                 'message': 'An unexpected error occurred'
             }), 500
     
+    def training_in_progress(job_id=None):
+        body = {
+            'success': False,
+            'error': 'Training in progress',
+            'message': 'A training job is already running'
+        }
+        if job_id is not None:
+            body.update(job_id=job_id, status_url=url_for('train_status', job_id=job_id))
+        return jsonify(body), 409
+    
     @app.route('/train', methods=['POST'])
+    @rate_limit(max_requests=10, window=3600)  # 10 training requests per hour
     def train():
-        """Retrain the model"""
+        """Retrain the model in a background process and return a job id"""
+        # With ADMIN_TOKEN set, only its holders may retrain
+        if app.config['ADMIN_TOKEN'] and not has_admin_token():
+            return jsonify({
+                'success': False,
+                'error': 'Forbidden',
+                'message': 'Training requires the X-Admin-Token header'
+            }), 403
         try:
-            train_model()
-            load_model_and_encoders()  # Reload the model
+            if not app.config['TRAIN_ASYNC']:
+                if not training_lock.acquire(blocking=False):
+                    return training_in_progress()
+                try:
+                    version = train_and_publish(training_settings(app.config), app.logger)
+                finally:
+                    training_lock.release()
+                load_model_and_encoders(refresh=True)
+                return jsonify({
+                    'success': True,
+                    'version': version,
+                    'message': 'Model trained successfully'
+                })
+            
+            reap_training_processes()
+            job_id, started = start_training_job()
+            if not started:
+                return training_in_progress(job_id)
             return jsonify({
                 'success': True,
-                'message': 'Model trained successfully'
-            })
+                'job_id': job_id,
+                'status': 'queued',
+                'status_url': url_for('train_status', job_id=job_id),
+                'message': 'Model training started'
+            }), 202
         except Exception as e:
             app.logger.error(f"Error training model: {str(e)}")
             return jsonify({
@@ -280,17 +594,52 @@ def create_app(config_name=None):
                 'message': 'Error training model'
             }), 500
     
+    @app.route('/train/<job_id>', methods=['GET'])
+    def train_status(job_id):
+        """Status of a background training job"""
+        reap_training_processes()
+        try:
+            job = store.read_job(job_id)
+        except ValueError:
+            job = None
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': 'Not found',
+                'message': f'Unknown training job: {job_id}'
+            }), 404
+        
+        job.pop('settings', None)
+        return jsonify({'success': True, **job})
+    
     @app.route('/health', methods=['GET'])
     def health():
         """Health check endpoint"""
         try:
-            model_status = model is not None
-            return jsonify({
+            current = active
+            model_status = current is not None
+            status = {
                 'status': 'healthy',
                 'model_loaded': model_status,
+                'model_version': current.version if current else None,
+                'inference_engine': current.engine if current else None,
                 'timestamp': time.time(),
                 'version': '1.0.0'
-            })
+            }
+            if current is not None and current.grid is not None:
+                status['grid_error'] = {'max': current.grid.max_error, 'mean': current.grid.mean_error}
+            if prediction_cache is not None:
+                status['cache'] = prediction_cache.stats()
+            status['models'] = registry.stats()
+            if shadow is not None:
+                status['shadow'] = shadow.stats()
+            if profiler is not None:
+                status['profiler'] = profiler.stats()
+            if app.log_handler is not None:
+                status['logging'] = {'dropped': app.log_handler.dropped, 'write_errors': app.log_handler.write_errors}
+            status['memory'] = process_memory()
+            status['startup'] = app.startup_report
+            return jsonify(status)
         except Exception as e:
             app.logger.error(f"Health check failed: {str(e)}")
             return jsonify({
@@ -298,66 +647,129 @@ def create_app(config_name=None):
                 'error': str(e)
             }), 500
     
+    @app.route('/admin/profile', methods=['GET'])
+    def admin_profile():
+        """Stacks sampled in this worker, in collapsed form for flamegraph rendering"""
+        # Only exists for callers with the admin token
+        if profiler is None or not has_admin_token():
+            return jsonify({'error': 'Not found', 'message': 'The requested resource was not found'}), 404
+        
+        body = profiler.collapsed(reset=codec.parse_flag(request.args.get('reset')))
+        return body, 200, {
+            'Content-Type': 'text/plain; charset=utf-8',
+            'X-Profile-Samples': str(profiler.samples),
+            'X-Worker-Pid': str(os.getpid())
+        }
+    
     @app.route('/metrics')
-    def metrics():
+    def prometheus_metrics():
         """Prometheus metrics endpoint"""
         if app.config.get('ENABLE_METRICS'):
-            return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+            body, content_type = metrics.latest()
+            return body, 200, {'Content-Type': content_type}
         else:
             return jsonify({'error': 'Metrics disabled'}), 404
     
-    # Initialize model on startup
+    # Model access for alternative front ends such as asgi.py
+    app.metrics = metrics
+    app.current_model = lambda: active
+    app.load_model_and_encoders = load_model_and_encoders
+    app.select_model = select_model
+    app.registry = registry
+    app.shadow = shadow
+    app.profiler = profiler
+    app.prediction_cache = prediction_cache
+    app.validator = validator
+    app.response_codec = response_codec
+    app.rate_limiter = rate_limiter
+    app.record_request = record_request
+    
+    startup.mark('routes')
+    
+    # Initialize model on startup; serving-only deployments ship a prebuilt
+    # model (python training.py) and set TRAIN_ON_STARTUP=false
     with app.app_context():
         try:
             load_model_and_encoders()
-            if model is None:
+            startup.mark('model_load')
+            if active is None and app.config['TRAIN_ON_STARTUP']:
                 app.logger.info("Training model on startup...")
-                train_model()
-                load_model_and_encoders()
+                train_and_publish(training_settings(app.config), app.logger)
+                load_model_and_encoders(refresh=True)
+                startup.mark('training')
+            elif active is None:
+                app.logger.warning("No published model found and TRAIN_ON_STARTUP is disabled")
         except Exception as e:
             app.logger.error(f"Error initializing model: {str(e)}")
     
+    app.startup_report = startup.report()
+    app.logger.info(
+        f"Startup completed in {app.startup_report['total']:.3f}s: "
+        + ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in startup.phases.items())
+    )
     return app
 
 def setup_logging(app):
     """Setup application logging"""
+    app.log_handler = None
     if not app.debug:
         import logging
-        from logging.handlers import RotatingFileHandler
-        
-        if not os.path.exists('logs'):
-            os.mkdir('logs')
+        from log_pipeline import QueueLogHandler
         
-        file_handler = RotatingFileHandler(
-            app.config['LOG_FILE'], 
-            maxBytes=10240000, 
-            backupCount=10
+        # Requests only enqueue records; a writer thread per worker appends them
+        # to the worker's own file (LOG_FILE with the worker slot added) in batches
+        file_handler = QueueLogHandler(
+            app.config['LOG_FILE'],
+            max_bytes=10240000,
+            backup_count=10,
+            queue_size=app.config['LOG_QUEUE_SIZE'],
+            per_process=app.config['LOG_PER_PROCESS']
         )
         file_handler.setFormatter(logging.Formatter(
             '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
         ))
         file_handler.setLevel(logging.INFO)
         app.logger.addHandler(file_handler)
+        app.log_handler = file_handler
         
         app.logger.setLevel(logging.INFO)
         app.logger.info('Insurance Predictor startup')
 
-def setup_metrics(app):
-    """Setup Prometheus metrics"""
-    # Request counter
-    request_counter = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-    
-    # Request duration histogram
-    request_duration = Histogram('http_request_duration_seconds', 'HTTP request duration')
-    
-    # Prediction counter
-    prediction_counter = Counter('predictions_total', 'Total predictions made')
-    
-    app.metrics = {
-        'request_counter': request_counter,
-        'request_duration': request_duration,
-        'prediction_counter': prediction_counter
-    }
+def setup_sentry(app, environment):
+    """Initialize Sentry for error tracking; returns the trace sampler to feed with finished requests"""
+    import sentry_sdk
+    from sentry_sdk.integrations.flask import FlaskIntegration
+    from profiler import AdaptiveTraceSampler
+    
+    sampler = AdaptiveTraceSampler(
+        base_rate=app.config['SENTRY_TRACES_SAMPLE_RATE'],
+        slow_ms=app.config['SENTRY_SLOW_REQUEST_MS'],
+        window=app.config['SENTRY_SLOW_WINDOW_S']
+    )
+    sentry_sdk.init(
+        dsn=app.config['SENTRY_DSN'],
+        integrations=[FlaskIntegration()],
+        traces_sampler=sampler.traces_sampler,
+        before_send_transaction=sampler.before_send_transaction,
+        environment=environment
+    )
+    return sampler
+
+def process_memory():
+    """Resident memory of this worker, split into private and file-backed pages"""
+    fields = {'VmRSS': 'rss_bytes', 'RssAnon': 'rss_anon_bytes', 'RssFile': 'rss_file_bytes'}
+    usage = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    usage[fields[key]] = int(value.split()[0]) * 1024
+    except OSError:
+        # Not Linux: fall back to the peak resident size
+        import resource
+        usage['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
 
 # Create the application instance
 app = create_app()
@@ -0,0 +1,125 @@
+import json
+import struct
+
+import numpy as np
+
+# Layout: magic, little-endian uint64 header length, JSON header, then every
+# array's raw bytes at a 64-byte aligned offset recorded in the header
+MAGIC = b'ARRFILE1'
+ALIGNMENT = 64
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(specs):
+    """Offsets of arrays given as {name: (dtype, shape)}, relative to the data start"""
+    layout = {}
+    offset = 0
+    for name, (dtype, shape) in specs.items():
+        dtype = np.dtype(dtype)
+        layout[name] = {'dtype': dtype.str, 'shape': list(shape), 'offset': offset}
+        offset = _align(offset + dtype.itemsize * int(np.prod(shape, dtype=np.int64)))
+    return layout, offset
+
+
+def _write_header(f, layout, meta, size=0):
+    """Write the magic and header; return (header end, data start) offsets
+
+    The JSON is padded with spaces to at least ``size`` bytes, leaving room
+    for update_meta() to grow it in place.
+    """
+    header = json.dumps({'meta': meta or {}, 'arrays': layout}).encode().ljust(size)
+    f.write(MAGIC)
+    f.write(struct.pack('<Q', len(header)))
+    f.write(header)
+    end = len(MAGIC) + 8 + len(header)
+    return end, _align(end)
+
+
+def _views(buffer, layout, data_start):
+    """Views of every array in a uint8 buffer holding a whole array file"""
+    arrays = {}
+    for name, spec in layout.items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = data_start + spec['offset']
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    return arrays
+
+
+def write_arrays(f, arrays, meta=None):
+    """Write named arrays and a JSON-serialisable meta dict to a binary file object
+
+    The arrays are stored uncompressed and C-contiguous so they can be
+    memory-mapped straight from the file by open_arrays().
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout, _ = _layout({name: (array.dtype, array.shape) for name, array in arrays.items()})
+    position, data_start = _write_header(f, layout, meta)
+    for name, array in arrays.items():
+        start = data_start + layout[name]['offset']
+        f.write(b'\0' * (start - position))
+        f.write(array.tobytes())
+        position = start + array.nbytes
+
+
+def create_arrays(path, specs, meta=None, header_size=0):
+    """Create an array file of zeroed arrays and return writable memory-mapped views
+
+    ``specs`` maps names to (dtype, shape). Lets large arrays be filled chunk
+    by chunk without ever holding them in memory; flush() the returned arrays
+    when done. Reserve ``header_size`` bytes of header to update the meta
+    afterwards.
+    """
+    layout, size = _layout(specs)
+    with open(path, 'wb') as f:
+        _, data_start = _write_header(f, layout, meta, header_size)
+        f.truncate(data_start + size)
+    return _views(np.memmap(path, dtype=np.uint8, mode='r+'), layout, data_start)
+
+
+def read_header(path):
+    """Return (meta, layout, data_start) from the header of an array file"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an array file")
+        (header_length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length))
+    return header['meta'], header['arrays'], _align(len(MAGIC) + 8 + header_length)
+
+
+def update_meta(path, meta, shapes=None):
+    """Replace the meta dict of an array file in place
+
+    ``shapes`` ({name: shape}) shrinks arrays to a leading part of their
+    data, which stays where it is. Raises ValueError if the new header does
+    not fit in the existing one.
+    """
+    _, layout, _ = read_header(path)
+    for name, shape in (shapes or {}).items():
+        layout[name]['shape'] = list(shape)
+    with open(path, 'r+b') as f:
+        f.seek(len(MAGIC))
+        (header_length,) = struct.unpack('<Q', f.read(8))
+        header = json.dumps({'meta': meta, 'arrays': layout}).encode()
+        if len(header) > header_length:
+            raise ValueError(f"New header of {path} needs {len(header)} bytes, only {header_length} reserved")
+        f.write(header.ljust(header_length))
+
+
+def open_arrays(path, mmap=True):
+    """Return (meta, arrays) for a file written by write_arrays()
+
+    With mmap the arrays are read-only views of one shared file mapping, so
+    every process that opens the file shares the same physical pages.
+    """
+    meta, layout, data_start = read_header(path)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        with open(path, 'rb') as f:
+            buffer = np.frombuffer(f.read(), dtype=np.uint8)
+
+    return meta, _views(buffer, layout, data_start)
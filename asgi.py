@@ -0,0 +1,259 @@
+"""Asynchronous entry point for the insurance predictor
+
+POST /predict is served natively on the event loop and scored through a
+MicroBatcher, so concurrent requests share one model call. Calls that may
+block (Redis, a model reload, a forest walk) run in the default executor,
+never on the loop. Every other route, and a /predict body that is not JSON,
+is delegated to the Flask application; responses match the Flask view's.
+
+Run with:
+    gunicorn --config gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+"""
+import asyncio
+import functools
+import math
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+from asgiref.wsgi import WsgiToAsgi
+
+import codec
+from app_production import app as flask_app
+from batching import MicroBatcher
+from codec import (INVALID_JSON, MODEL_NOT_LOADED, ENCODING_ERROR, PREDICTION_ERROR, SERVER_ERROR,
+                   QUANTILES_UNAVAILABLE)
+from features import encode_row
+from log_pipeline import should_sample
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _client_ip(scope):
+    """Client address for rate limiting, as the Flask app determines it"""
+    key_header = flask_app.config['RATELIMIT_KEY_HEADER']
+    if key_header:
+        name = key_header.lower().encode()
+        for header, value in scope.get('headers', []):
+            if header == name:
+                return value.decode('latin-1')
+    client = scope.get('client')
+    return client[0] if client else None
+
+
+def _is_json(scope):
+    """Whether the request declares a JSON body, like Flask's request.is_json"""
+    for header, value in scope.get('headers', []):
+        if header == b'content-type':
+            mimetype = value.decode('latin-1').split(';')[0].strip().lower()
+            return mimetype == 'application/json' or (mimetype.startswith('application/')
+                                                      and mimetype.endswith('+json'))
+    return False
+
+
+async def _blocking(func, *args):
+    """Run a call that may wait on the network or the CPU off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+
+
+def _query_param(scope, name):
+    """First value of a query string parameter, or None, like request.args.get()"""
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+
+async def _send_body(send, body, status=200, extra_headers=()):
+    headers = [(b'content-type', b'application/json'), *extra_headers]
+    for header, value in (flask_app.config.get('SECURITY_HEADERS') or {}).items():
+        headers.append((header.lower().encode(), value.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+async def _send_error(send, error, status, extra_headers=()):
+    return await _send_body(send, flask_app.response_codec.error(*error), status, extra_headers)
+
+
+class InsuranceASGI:
+    """ASGI application that micro-batches /predict and delegates the rest to Flask"""
+
+    def __init__(self, wsgi_app):
+        self.wsgi = WsgiToAsgi(wsgi_app)
+        self.batcher = MicroBatcher(
+            max_batch_size=flask_app.config['MICROBATCH_MAX_SIZE'],
+            max_wait_us=flask_app.config['MICROBATCH_MAX_WAIT_US'],
+            observe=lambda model, seconds: flask_app.registry.observe(model, 'primary', seconds),
+            metrics=flask_app.metrics
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif (scope['type'] == 'http' and scope['path'] == '/predict' and scope['method'] == 'POST'
+              and _is_json(scope)):
+            start = time.perf_counter()
+            status = await self.predict(scope, receive, send)
+            duration = time.perf_counter() - start
+            flask_app.metrics.observe_request('POST', '/predict', status, duration)
+            flask_app.record_request('POST', '/predict', status, duration)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    def _before_request(client_ip):
+        """What the Flask app does ahead of its view, in the same order
+
+        Picks up a newly published model version, then counts the request
+        against the /predict rate limit. Both may block, so this runs in the
+        executor. Returns the Retry-After delay, or 0 if the request is allowed.
+        """
+        try:
+            flask_app.load_model_and_encoders()
+        except Exception:
+            pass
+        # Same limit as the Flask view, counted in the same buckets
+        limit = getattr(flask_app.view_functions['predict'], 'rate_limit', None)
+        if flask_app.rate_limiter is None or limit is None:
+            return 0
+        return flask_app.rate_limiter.hit(f'predict:{client_ip}', *limit)
+
+    async def predict(self, scope, receive, send):
+        """Predict insurance charges, sharing the model call with concurrent requests"""
+        metrics = flask_app.metrics
+        try:
+            if flask_app.profiler is not None:
+                flask_app.profiler.ensure_running()
+
+            retry_after = await _blocking(self._before_request, _client_ip(scope))
+            if retry_after:
+                metrics.RATE_LIMITED.labels('predict').inc()
+                retry_after = math.ceil(retry_after)
+                return await _send_error(
+                    send, ('Rate limit exceeded', f'Too many requests, retry in {retry_after} seconds'),
+                    429, [(b'retry-after', str(retry_after).encode())])
+
+            # A malformed body fails like it does in the Flask view, with a server error
+            body = await _read_body(receive)
+            with metrics.PARSE.time():
+                data = codec.loads(body, flask_app.config['FAST_JSON'])
+            if not data:
+                return await _send_error(send, INVALID_JSON, 400)
+
+            validator = flask_app.validator
+            missing = validator.missing(data)
+            if missing is not None:
+                return await _send_error(send, ('Missing field', f'Missing required field: {missing}'), 400)
+
+            # Use one model version for the whole request
+            try:
+                current = flask_app.select_model(_query_param(scope, 'model'))
+            except KeyError as e:
+                return await _send_error(send, ('Unknown model', e.args[0]), 404)
+            if current is None:
+                return await _send_error(send, MODEL_NOT_LOADED, 503)
+
+            try:
+                with metrics.VALIDATE.time():
+                    age, sex, bmi, children, smoker, region = validator.validate(data)
+            except (ValueError, TypeError) as e:
+                return await _send_error(send, ('Validation error', str(e)), 400)
+
+            explain = codec.parse_flag(_query_param(scope, 'explain'))
+            try:
+                quantiles = codec.parse_quantiles(_query_param(scope, 'quantiles'),
+                                                  flask_app.config['PREDICTION_QUANTILES'])
+            except ValueError as e:
+                return await _send_error(send, ('Validation error', str(e)), 400)
+            if quantiles is not None and not current.has_quantiles:
+                return await _send_error(send, QUANTILES_UNAVAILABLE, 422)
+            scored = explain or quantiles is not None
+
+            # Explanations and quantiles skip the cache and the micro-batcher; they walk the forest directly
+            extra = None
+            cache = flask_app.prediction_cache
+            cache_key = None
+            prediction_usd = None
+            if cache is not None and not scored:
+                cache_key = cache.key(f'{current.name}-{current.version}-{current.engine}',
+                                      age, sex, bmi, children, smoker, region)
+                # Only the shared tier goes over the network
+                cached = await _blocking(cache.get, cache_key) if cache.shared is not None else cache.get(cache_key)
+                if cached is not None:
+                    prediction_usd = np.float64(cached)
+                    metrics.CACHE_HITS.inc()
+                else:
+                    metrics.CACHE_MISSES.inc()
+
+            if prediction_usd is None:
+                encoding = current.encoding
+                try:
+                    with metrics.ENCODE.time():
+                        row = [
+                            age,
+                            encoding.encode('sex', sex),
+                            bmi,
+                            children,
+                            encoding.encode('smoker', smoker),
+                            encoding.encode('region', region),
+                        ]
+                except Exception as e:
+                    flask_app.logger.error(f"Error encoding categorical variables: {str(e)}")
+                    return await _send_error(send, ENCODING_ERROR, 500)
+
+            try:
+                if scored:
+                    with metrics.PREDICT.time(), flask_app.registry.timed(current):
+                        predictions_usd, explained, quantile_values = await _blocking(
+                            current.score, np.array([row]), explain, quantiles)
+                    prediction_usd = predictions_usd[0]
+                    extra = codec.extra_fields(0, explained, quantiles, quantile_values,
+                                               flask_app.config['USD_TO_INR_RATE'])
+                elif prediction_usd is None:
+                    prediction_usd = await self.batcher.submit(current, row)
+                    if cache_key is not None:
+                        if cache.shared is not None:
+                            await _blocking(cache.set, cache_key, prediction_usd)
+                        else:
+                            cache.set(cache_key, prediction_usd)
+            except Exception as e:
+                flask_app.logger.error(f"Error making prediction: {str(e)}")
+                return await _send_error(send, PREDICTION_ERROR, 500)
+
+            prediction_inr = prediction_usd * flask_app.config['USD_TO_INR_RATE']
+            metrics.PREDICTIONS.labels(current.engine).inc()
+            if should_sample(flask_app.config['LOG_SAMPLE_RATE']):
+                flask_app.logger.info("Prediction successful: $%.2f USD, ₹%.2f INR", prediction_usd, prediction_inr)
+            with metrics.SERIALIZE.time():
+                body = flask_app.response_codec.prediction(prediction_usd, prediction_inr, extra)
+            status = await _send_body(send, body)
+
+            # Only once the response is out, so the shadow model never delays it
+            if flask_app.shadow is not None:
+                values = (age, sex, bmi, children, smoker, region)
+                flask_app.shadow.submit(current, lambda encoding: np.array([encode_row(encoding, *values)]),
+                                        [prediction_usd])
+            return status
+
+        except Exception as e:
+            flask_app.logger.error(f"Unexpected error in prediction: {str(e)}")
+            return await _send_error(send, SERVER_ERROR, 500)
+
+
+app = InsuranceASGI(flask_app)
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import numpy as np
+
+import null_metrics
+
+
+class MicroBatcher:
+    """Coalesce concurrent single-row predictions into one model call
+
+    Each request submits its encoded feature row and awaits the result. A
+    background task takes the first queued row, keeps collecting until
+    ``max_batch_size`` rows are queued or ``max_wait_us`` microseconds have
+    passed, then scores the batch with one predict() call in the default
+    executor so the event loop keeps accepting requests meanwhile.
+    Rows are grouped by the model they were encoded for, so a model swap
+    in the middle of a batch never mixes versions. ``observe(model, seconds)``,
+    if given, is called with the duration of every model call, and batch
+    sizes are recorded in ``metrics``, the metrics module or null_metrics.
+    """
+
+    def __init__(self, max_batch_size=64, max_wait_us=2000, observe=None, metrics=null_metrics):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self.observe = observe
+        self.metrics = metrics
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._task = None
+
+    async def submit(self, model, row):
+        """Queue one encoded row for ``model`` and wait for its prediction"""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model, row, future))
+        return await future
+
+    async def _collect(self):
+        """Wait for one item, then gather more until the batch is full or the wait expires"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self.batches += 1
+            self.rows += len(batch)
+
+            groups = {}
+            for model, row, future in batch:
+                groups.setdefault(id(model), (model, [], []))
+                groups[id(model)][1].append(row)
+                groups[id(model)][2].append(future)
+
+            for model, rows, futures in groups.values():
+                self.metrics.BATCH_SIZE.labels('microbatch').observe(len(rows))
+                try:
+                    start = time.perf_counter()
+                    with self.metrics.PREDICT.time():
+                        predictions = await loop.run_in_executor(None, model.predict, np.array(rows))
+                    if self.observe is not None:
+                        self.observe(model, time.perf_counter() - start)
+                except Exception as e:
+                    for future in futures:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future, prediction in zip(futures, predictions):
+                    # The caller may have gone away (client disconnect)
+                    if not future.done():
+                        future.set_result(prediction)
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,605 @@
+"""Latency and throughput benchmarks for the insurance predictor
+
+Examples:
+    python benchmark.py                                  # in-process, default scenarios
+    python benchmark.py --url http://localhost:8000 --concurrency 16
+    python benchmark.py --output run.json --baseline baseline.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import codec
+from features import BMI_RANGE, validate_features
+
+# Relative change beyond which a metric is flagged as a regression
+DEFAULT_THRESHOLD = 0.10
+
+# Most throughput the sampling profiler may cost at its default rate, in percent
+PROFILER_OVERHEAD_BUDGET = 2.0
+
+
+def generate_payloads(n, seed=0, dataset_path='insurance.csv', repeat_fraction=0.0):
+    """Draw realistic /predict payloads from the rows of the training dataset
+
+    Rows are sampled with replacement and BMI gets a small amount of noise,
+    so payloads follow the joint distribution create_dataset.py produces
+    without replaying the training set verbatim. ``repeat_fraction`` of the
+    payloads are copies of a small pool of profiles, to exercise caching.
+    """
+    with open(dataset_path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    rng = np.random.default_rng(seed)
+
+    payloads = []
+    for i in rng.integers(0, len(rows), n):
+        row = rows[i]
+        bmi = float(np.clip(float(row['bmi']) + rng.normal(0, 1.0), *BMI_RANGE))
+        payloads.append({
+            'age': int(row['age']),
+            'sex': row['sex'],
+            'bmi': round(bmi, 2),
+            'children': int(row['children']),
+            'smoker': row['smoker'],
+            'region': row['region'],
+        })
+
+    if repeat_fraction > 0:
+        pool = payloads[:max(1, n // 100)]
+        for i in np.flatnonzero(rng.random(n) < repeat_fraction):
+            payloads[i] = dict(pool[rng.integers(0, len(pool))])
+    return payloads
+
+
+def summarize(latencies, elapsed):
+    """Throughput and latency percentiles for a list of per-request seconds"""
+    ms = np.asarray(latencies) * 1e3
+    return {
+        'requests': len(latencies),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(float(ms.mean()), 4),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p95_ms': round(float(np.percentile(ms, 95)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def run_requests(send, payloads, concurrency=1, warmup=20):
+    """Send every payload with ``concurrency`` threads and summarize the latencies"""
+    for payload in payloads[:warmup]:
+        send(payload)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(chunk):
+        local = []
+        for payload in chunk:
+            start = time.perf_counter()
+            send(payload)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    chunks = [payloads[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, chunks))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def inprocess_client():
+    """Flask test client for the production app, plus the app itself"""
+    # Measure the prediction path, not the per-client request limit
+    os.environ.setdefault('RATELIMIT_ENABLED', 'false')
+    from app_production import app
+    return app, app.test_client()
+
+
+def check_response(response, status):
+    if status != 200:
+        raise RuntimeError(f"Benchmark request failed with status {status}: {response}")
+
+
+def scenario_predict(args, payloads):
+    """Single-row /predict requests in-process or over HTTP"""
+    if args.url:
+        import requests
+        local = threading.local()
+
+        def send(payload):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            response = local.session.post(f"{args.url}/predict", json=payload)
+            check_response(response.text, response.status_code)
+
+        return run_requests(send, payloads, args.concurrency)
+
+    _, client = inprocess_client()
+
+    def send(payload):
+        response = client.post('/predict', json=payload)
+        check_response(response.data, response.status_code)
+
+    return run_requests(send, payloads, args.concurrency)
+
+
+def scenario_batch(args, payloads):
+    """/predict/batch throughput in rows per second"""
+    size = args.batch_size
+    batches = [payloads[i:i + size] for i in range(0, len(payloads), size)]
+    if args.url:
+        import requests
+        session = requests.Session()
+
+        def send(batch):
+            response = session.post(f"{args.url}/predict/batch", json=batch)
+            check_response(response.text, response.status_code)
+    else:
+        _, client = inprocess_client()
+
+        def send(batch):
+            response = client.post('/predict/batch', json=batch)
+            check_response(response.data, response.status_code)
+
+    result = run_requests(send, batches, concurrency=1, warmup=1)
+    result['batch_size'] = size
+    result['rows_per_s'] = round(result['throughput_per_s'] * size, 2)
+    return result
+
+
+def scenario_stages(args, payloads):
+    """Per-stage cost of the /predict hot path, measured in-process
+
+    Parsing, validation and serialization are also timed the way /predict
+    did them before its fast path (json module, validate_features() and
+    jsonify) and reported with a ``baseline_`` prefix.
+    """
+    app, _ = inprocess_client()
+    current = app.current_model()
+    validator, response_codec = app.validator, app.response_codec
+    stages = ['parsing', 'validation', 'encoding', 'inference', 'serialization',
+              'baseline_parsing', 'baseline_validation', 'baseline_serialization']
+    timings = {stage: [] for stage in stages}
+
+    for body in [json.dumps(payload).encode() for payload in payloads]:
+        start = time.perf_counter()
+        payload = codec.loads(body, app.config['FAST_JSON'])
+        parsed = time.perf_counter()
+
+        age, sex, bmi, children, smoker, region = validator.validate(payload)
+        validated = time.perf_counter()
+
+        encoding = current.encoding
+        features = np.array([[
+            age,
+            encoding.encode('sex', sex),
+            bmi,
+            children,
+            encoding.encode('smoker', smoker),
+            encoding.encode('region', region),
+        ]])
+        encoded = time.perf_counter()
+
+        prediction_usd = current.predict(features)[0]
+        predicted = time.perf_counter()
+
+        prediction_inr = prediction_usd * app.config['USD_TO_INR_RATE']
+        app.response_class(response_codec.prediction(prediction_usd, prediction_inr),
+                           mimetype=response_codec.mimetype).get_data()
+        serialized = time.perf_counter()
+
+        json.loads(body)
+        baseline_parsed = time.perf_counter()
+        validate_features(payload)
+        baseline_validated = time.perf_counter()
+        with app.app_context():
+            app.json.response({
+                'success': True,
+                'predicted_charges_usd': round(prediction_usd, 2),
+                'predicted_charges_inr': round(prediction_inr, 2),
+                'message': 'Prediction successful'
+            }).get_data()
+        baseline_serialized = time.perf_counter()
+
+        timings['parsing'].append(parsed - start)
+        timings['validation'].append(validated - parsed)
+        timings['encoding'].append(encoded - validated)
+        timings['inference'].append(predicted - encoded)
+        timings['serialization'].append(serialized - predicted)
+        timings['baseline_parsing'].append(baseline_parsed - serialized)
+        timings['baseline_validation'].append(baseline_validated - baseline_parsed)
+        timings['baseline_serialization'].append(baseline_serialized - baseline_validated)
+
+    result = {'engine': current.engine, 'fast_json': codec.orjson is not None and app.config['FAST_JSON']}
+    for stage, samples in timings.items():
+        us = np.asarray(samples) * 1e6
+        result[f'{stage}_p50_us'] = round(float(np.percentile(us, 50)), 3)
+        result[f'{stage}_p99_us'] = round(float(np.percentile(us, 99)), 3)
+    return result
+
+
+def scenario_startup(args, payloads, runs=3):
+    """Cold start of a serving process, broken down by startup phase"""
+    code = 'import json, app_production; print(json.dumps(app_production.app.startup_report))'
+    env = dict(os.environ, TRAIN_ON_STARTUP='false')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get('PYTHONPATH')]))
+    samples = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                text=True, check=True).stdout
+        samples.setdefault('wall', []).append(time.perf_counter() - start)
+        for phase, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            samples.setdefault(phase, []).append(seconds)
+    return {f'{phase}_s': round(float(np.median(values)), 4) for phase, values in samples.items()}
+
+
+def _scoring_overhead(args, payloads, name, score):
+    """Single-row and batched latency of ``score`` against plain predictions"""
+    from features import encode_batch, validate_batch
+
+    app, _ = inprocess_client()
+    current = app.current_model()
+    columns, errors = validate_batch(payloads)
+    X = encode_batch(columns, current.encoding, np.array([i for i in range(len(payloads)) if i not in errors],
+                                                          dtype=np.intp))
+    batches = [X[i:i + args.batch_size] for i in range(0, len(X), args.batch_size)]
+
+    result = {'engine': current.engine, 'batch_size': args.batch_size}
+    for variant, run in (('predict', current.predict), (name, lambda features: score(current, features))):
+        single = []
+        for row in X:
+            start = time.perf_counter()
+            run(row[None, :])
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for batch in batches:
+            run(batch)
+        batch_seconds = time.perf_counter() - start
+        result[f'{variant}_single_p50_us'] = round(float(np.percentile(single, 50)) * 1e6, 3)
+        result[f'{variant}_single_p99_us'] = round(float(np.percentile(single, 99)) * 1e6, 3)
+        result[f'{variant}_batch_row_us'] = round(batch_seconds / max(1, len(X)) * 1e6, 3)
+    result['single_overhead_ratio'] = round(result[f'{name}_single_p50_us'] / result['predict_single_p50_us'], 3)
+    result['batch_overhead_ratio'] = round(result[f'{name}_batch_row_us'] / result['predict_batch_row_us'], 3)
+    return result
+
+
+def scenario_explain(args, payloads):
+    """Overhead of explained predictions over plain ones, single-row and batched"""
+    return _scoring_overhead(args, payloads, 'explain', lambda model, X: model.explain(X))
+
+
+def scenario_quantiles(args, payloads):
+    """Overhead of predictions with the default quantiles over plain ones, single-row and batched"""
+    from codec import parse_quantiles
+    app, _ = inprocess_client()
+    quantiles = parse_quantiles('true', app.config['PREDICTION_QUANTILES'])
+    result = _scoring_overhead(args, payloads, 'quantiles', lambda model, X: model.score(X, quantiles=quantiles))
+    result['quantiles'] = list(quantiles)
+    return result
+
+
+def scenario_ratelimit(args, payloads):
+    """Per-request cost of the rate limiter, per worker and with the shared-store stand-in"""
+    from cache import LocalSharedCache
+    from ratelimit import RateLimiter, SlidingWindowLimiter, TokenBucketLimiter
+
+    limiters = {
+        'local': RateLimiter(TokenBucketLimiter()),
+        'shared': RateLimiter(TokenBucketLimiter(), SlidingWindowLimiter(LocalSharedCache())),
+    }
+    clients = [f'10.0.{i // 256}.{i % 256}' for i in range(1024)]
+    result = {}
+    for name, limiter in limiters.items():
+        samples = []
+        for i in range(len(payloads)):
+            key = f'predict:{clients[i % len(clients)]}'
+            start = time.perf_counter()
+            # A limit that is never reached, so every request takes the full path
+            limiter.hit(key, len(payloads) + 1, 60)
+            samples.append(time.perf_counter() - start)
+        us = np.asarray(samples) * 1e6
+        result[f'{name}_p50_us'] = round(float(np.percentile(us, 50)), 3)
+        result[f'{name}_p99_us'] = round(float(np.percentile(us, 99)), 3)
+    return result
+
+
+def scenario_reload(args, payloads, before_requests=200):
+    """app.py /predict latency with model files unpickled per request and change-aware
+
+    ``before`` also unpickles the model and encoders inside every request, as
+    app.py's predict() did before it kept them loaded; it runs on the first
+    ``before_requests`` payloads only since each request takes that long.
+    """
+    from model_store import ENCODERS_FILE, MODEL_FILE
+
+    # Point app.py at the files of the published version
+    app, _ = inprocess_client()
+    current = app.current_model()
+    version_dir = app.registry.stores[current.name].version_dir(current.version)
+    os.environ['MODEL_PATH'] = os.path.join(version_dir, MODEL_FILE)
+    os.environ['ENCODERS_PATH'] = os.path.join(version_dir, ENCODERS_FILE)
+    import app as legacy
+    client = legacy.app.test_client()
+
+    def send(payload):
+        response = client.post('/predict', json=payload)
+        check_response(response.data, response.status_code)
+
+    def send_unpickling(payload):
+        legacy.read_model_and_encoders()
+        send(payload)
+
+    result = {'model_bytes': os.path.getsize(os.environ['MODEL_PATH'])}
+    for variant, run in (('before', send_unpickling), ('after', send)):
+        summary = run_requests(run, payloads[:before_requests] if variant == 'before' else payloads)
+        for metric in ('mean_ms', 'p50_ms', 'p99_ms', 'throughput_per_s'):
+            result[f'{variant}_{metric}'] = summary[metric]
+    result['model_loads'] = legacy.model_loader.loads
+    result['p50_speedup'] = round(result['before_p50_ms'] / result['after_p50_ms'], 2)
+    return result
+
+
+def scenario_logging(args, payloads, sample_rate=0.1):
+    """Per-request cost of the request log line, written synchronously and through the queue
+
+    ``sync`` formats an f-string and writes it with a RotatingFileHandler in
+    the request, as the app did before its log pipeline. ``queued`` hands the
+    record to a QueueLogHandler and ``sampled`` also keeps only
+    ``sample_rate`` of the lines.
+    """
+    import logging
+    from logging.handlers import RotatingFileHandler
+    from log_pipeline import QueueLogHandler, should_sample
+
+    formatter = logging.Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in ('sync', 'queued', 'sampled'):
+            path = os.path.join(tmp, f'{variant}.log')
+            if variant == 'sync':
+                handler = RotatingFileHandler(path, maxBytes=10240000, backupCount=10)
+            else:
+                handler = QueueLogHandler(path, per_process=False)
+            handler.setFormatter(formatter)
+            logger = logging.getLogger(f'benchmark.logging.{variant}')
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            logger.addHandler(handler)
+
+            rate = sample_rate if variant == 'sampled' else 1.0
+            samples = []
+            for i in range(len(payloads)):
+                duration = i * 1e-6
+                start = time.perf_counter()
+                if variant == 'sync':
+                    logger.info(f"POST /predict - 200 - {duration:.3f}s")
+                elif should_sample(rate):
+                    logger.info("%s %s - %s - %.3fs", 'POST', '/predict', 200, duration)
+                samples.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            handler.close()
+            logger.removeHandler(handler)
+            us = np.asarray(samples) * 1e6
+            result[f'{variant}_mean_us'] = round(float(us.mean()), 3)
+            result[f'{variant}_p50_us'] = round(float(np.percentile(us, 50)), 3)
+            result[f'{variant}_p99_us'] = round(float(np.percentile(us, 99)), 3)
+            result[f'{variant}_drain_s'] = round(time.perf_counter() - start, 4)
+            if variant != 'sync':
+                result[f'{variant}_dropped'] = handler.dropped
+    result['sample_rate'] = sample_rate
+    return result
+
+
+def scenario_profiler(args, payloads, rounds=3):
+    """/predict throughput with the sampling profiler off and on, alternating rounds
+
+    ``overhead_percent`` is the share of time the profiler spent sampling, and
+    so held the GIL, checked against PROFILER_OVERHEAD_BUDGET. The drop in
+    median throughput is reported as well; on a busy or single-core host it
+    is dominated by noise.
+    """
+    from profiler import SamplingProfiler
+
+    _, client = inprocess_client()
+
+    def send(payload):
+        response = client.post('/predict', json=payload)
+        check_response(response.data, response.status_code)
+
+    profiler = SamplingProfiler(hz=float(os.environ.get('PROFILER_HZ', '100')))
+    runs = {'off': [], 'on': []}
+    samples, overhead = [], []
+    for _ in range(rounds):
+        runs['off'].append(run_requests(send, payloads))
+        profiler.ensure_running()
+        runs['on'].append(run_requests(send, payloads))
+        samples.append(profiler.samples)
+        overhead.append(profiler.overhead_percent())
+        profiler.stop()
+
+    result = {'hz': profiler.stats()['hz'], 'samples': int(sum(samples))}
+    for variant, summaries in runs.items():
+        result[f'{variant}_throughput_per_s'] = round(float(np.median([s['throughput_per_s'] for s in summaries])), 2)
+        result[f'{variant}_p99_ms'] = round(float(np.median([s['p99_ms'] for s in summaries])), 4)
+    result['throughput_drop_percent'] = round(
+        (1 - result['on_throughput_per_s'] / result['off_throughput_per_s']) * 100, 2)
+    result['overhead_percent'] = round(float(np.median(overhead)), 4)
+    result['budget_percent'] = PROFILER_OVERHEAD_BUDGET
+    result['within_budget'] = result['overhead_percent'] <= PROFILER_OVERHEAD_BUDGET
+    return result
+
+
+# Loaders timed by the dataset scenario, each run in a fresh process. 'csv'
+# is the text path training used before the columnar format: a pandas parse
+# and encode into a float64 matrix.
+DATASET_LOADERS = {
+    'csv': '''
+import numpy as np, pandas as pd
+from features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+df = pd.read_csv(path)
+X = np.empty((len(df), len(FEATURE_COLUMNS)))
+for j, col in enumerate(FEATURE_COLUMNS):
+    X[:, j] = (np.unique(df[col].astype(str).to_numpy(), return_inverse=True)[1]
+               if col in CATEGORICAL_COLUMNS else df[col].to_numpy(dtype=np.float64))
+y = df['charges'].to_numpy(dtype=np.float64)
+''',
+    'columnar': '''
+from dataset import Dataset
+dataset = Dataset.load(path)
+X, y = dataset.X, dataset.y
+''',
+}
+
+
+def _load_dataset_in_subprocess(loader, path):
+    """(seconds, peak RSS bytes) of loading a dataset, including a touch of every target value"""
+    code = (f'import resource, sys, time\npath = {path!r}\nstart = time.perf_counter()\n'
+            f'{DATASET_LOADERS[loader]}float(X.sum() + y.sum())\n'
+            'print(time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)')
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                      env.get('PYTHONPATH')]))
+    output = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    seconds, rss = output.split()
+    return float(seconds), int(rss)
+
+
+def scenario_dataset(args, payloads, runs=3):
+    """Load time and peak RSS of the training data as CSV and as a columnar file"""
+    from columnar import convert_csv
+
+    result = {'csv_bytes': os.path.getsize(args.dataset)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dataset.cols')
+        start = time.perf_counter()
+        result['rows'] = convert_csv(args.dataset, path)
+        result['convert_s'] = round(time.perf_counter() - start, 4)
+        result['columnar_bytes'] = os.path.getsize(path)
+        for loader in DATASET_LOADERS:
+            samples = [_load_dataset_in_subprocess(loader, args.dataset if loader == 'csv' else path)
+                       for _ in range(runs)]
+            result[f'{loader}_load_s'] = round(float(np.median([s for s, _ in samples])), 4)
+            result[f'{loader}_peak_rss_bytes'] = int(np.median([rss for _, rss in samples]))
+    return result
+
+
+SCENARIOS = {
+    'predict': scenario_predict,
+    'batch': scenario_batch,
+    'stages': scenario_stages,
+    'startup': scenario_startup,
+    'ratelimit': scenario_ratelimit,
+    'explain': scenario_explain,
+    'quantiles': scenario_quantiles,
+    'dataset': scenario_dataset,
+    'reload': scenario_reload,
+    'logging': scenario_logging,
+    'profiler': scenario_profiler,
+}
+
+
+def is_regression(metric, baseline, current, threshold):
+    """Whether a metric moved in the bad direction by more than threshold"""
+    if not isinstance(baseline, (int, float)) or not isinstance(current, (int, float)) or not baseline:
+        return False
+    change = (current - baseline) / baseline
+    if metric.endswith('_per_s'):
+        return change < -threshold
+    if metric.endswith(('_ms', '_us', '_s', '_bytes')):
+        return change > threshold
+    return False
+
+
+def compare(baseline, results, threshold):
+    """List every metric that regressed against a baseline run"""
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get('results', {}).get(scenario, {}).get(metric)
+            if is_regression(metric, base, value, threshold):
+                regressions.append({
+                    'scenario': scenario,
+                    'metric': metric,
+                    'baseline': base,
+                    'current': value,
+                    'change': round((value - base) / base, 4),
+                })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the insurance prediction service')
+    parser.add_argument('--scenario', default='predict,batch,stages',
+                        help=f"Comma-separated scenarios: {', '.join(SCENARIOS)}")
+    parser.add_argument('--url', help='Benchmark a running server over HTTP instead of in-process')
+    parser.add_argument('--requests', type=int, default=2000, help='Payloads per scenario')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent clients')
+    parser.add_argument('--batch-size', type=int, default=500, help='Rows per /predict/batch request')
+    parser.add_argument('--repeat-fraction', type=float, default=0.0,
+                        help='Fraction of payloads drawn from a small pool of repeated profiles')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dataset', default=os.environ.get('DATASET_PATH', 'insurance.csv'))
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against a previous results file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change flagged as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+
+    payloads = generate_payloads(args.requests, args.seed, args.dataset, args.repeat_fraction)
+    results = {}
+    for name in args.scenario.split(','):
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario: {name}")
+        print(f"Running {name}...", file=sys.stderr)
+        results[name] = SCENARIOS[name](args, payloads)
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'target': args.url or 'in-process',
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report['regressions'] = compare(baseline, results, args.threshold)
+        if report['regressions']:
+            exit_code = 1
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    for regression in report.get('regressions', []):
+        print(f"REGRESSION {regression['scenario']}.{regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']} ({regression['change']:+.1%})",
+              file=sys.stderr)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with a size limit and optional TTL"""
+
+    def __init__(self, max_size=10000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store value, evicting the least recently used entries over max_size"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """In-memory stand-in for the Redis tier, for development and tests
+
+    Implements the subset of the redis client API the caches and the rate
+    limiter use. Entries are only shared within one process.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the stored bytes for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        """Store value as bytes, expiring after ex seconds if given"""
+        expires_at = time.monotonic() + ex if ex else None
+        with self._lock:
+            self._data[key] = (str(value).encode(), expires_at)
+        return True
+
+    def incr(self, key):
+        """Increment an integer counter, creating it at 0, and return the new value"""
+        with self._lock:
+            value, expires_at = self._data.get(key, (b'0', None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                value, expires_at = b'0', None
+            count = int(value) + 1
+            self._data[key] = (str(count).encode(), expires_at)
+            return count
+
+    def expire(self, key, seconds):
+        """Expire key after the given number of seconds"""
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._data[key] = (self._data[key][0], time.monotonic() + seconds)
+            return True
+
+    def pipeline(self):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Queue commands for a LocalSharedCache and run them in order on execute()"""
+
+    def __init__(self, store):
+        self.store = store
+        self.commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+        return lambda *args, **kwargs: self.commands.append((method, args, kwargs))
+
+    def execute(self):
+        results = [method(*args, **kwargs) for method, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+
+def connect_shared_store(backend, redis_url):
+    """Return a client for the shared tier: 'redis', 'local' or None to disable"""
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for the redis cache backend")
+        return redis.Redis.from_url(redis_url, socket_timeout=0.05, socket_connect_timeout=0.05)
+    if backend == 'local':
+        return LocalSharedCache()
+    return None
+
+
+class PredictionCache:
+    """Two-tier cache of predictions keyed on the validated features and model version
+
+    Lookups go to the in-process LRU first and then to the shared tier, whose
+    hits are copied into the LRU. The shared tier fails open: if it is
+    unreachable the request is simply treated as a miss.
+    """
+
+    def __init__(self, local, shared=None, shared_ttl=None, logger=None):
+        self.local = local
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self.logger = logger
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_errors = 0
+
+    def key(self, model_version, age, sex, bmi, children, smoker, region):
+        """Build the cache key for an already validated applicant
+
+        Numbers are keyed on their exact value, so a hit returns what the
+        model gives for this very request, whichever request came first.
+        """
+        return f"pred:{model_version}:{float(age)!r}:{sex}:{float(bmi)!r}:{children}:{smoker}:{region}"
+
+    def get(self, key):
+        """Look a prediction up in the local tier, then the shared tier"""
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+
+        try:
+            raw = self.shared.get(key)
+        except Exception as e:
+            self._shared_error(e)
+            return None
+        if raw is None:
+            self.shared_misses += 1
+            return None
+
+        self.shared_hits += 1
+        value = float(raw)
+        self.local.set(key, value)
+        return value
+
+    def set(self, key, value):
+        """Store a prediction in both tiers"""
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.set(key, repr(float(value)), ex=self.shared_ttl)
+            except Exception as e:
+                self._shared_error(e)
+
+    def clear(self):
+        """Drop the in-process tier; shared entries expire via their TTL"""
+        self.local.clear()
+
+    def _shared_error(self, error):
+        self.shared_errors += 1
+        if self.logger is not None:
+            self.logger.warning(f"Shared prediction cache unavailable: {str(error)}")
+
+    def stats(self):
+        """Hit/miss counters for /health"""
+        lookups = self.local.hits + self.local.misses
+        return {
+            'size': len(self.local),
+            'max_size': self.local.max_size,
+            'hits': self.local.hits,
+            'misses': self.local.misses,
+            'hit_ratio': round((self.local.hits + self.shared_hits) / lookups, 4) if lookups else 0.0,
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+            'shared_errors': self.shared_errors,
+        }
+
+
+def create_prediction_cache(app):
+    """Build the prediction cache described by the app config, or None if disabled"""
+    if not app.config['CACHE_ENABLED']:
+        return None
+    return PredictionCache(
+        local=LRUCache(app.config['CACHE_MAX_SIZE'], app.config['CACHE_TTL'] or None),
+        shared=connect_shared_store(app.config['CACHE_SHARED_BACKEND'], app.config['REDIS_URL']),
+        shared_ttl=app.config['CACHE_TTL'] or None,
+        logger=app.logger,
+    )
@@ -0,0 +1,188 @@
+"""Request parsing and prebuilt response bodies for the /predict fast path
+
+Bodies are produced byte for byte as Flask's jsonify() would produce them, so
+the Flask view and asgi.py can skip it without changing a single response.
+orjson is used to parse requests when it is installed.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from features import FEATURE_COLUMNS, FEATURE_SCHEMA
+
+# (error, message) pairs of every fixed /predict error response
+INVALID_JSON = ('Invalid JSON', 'Request must contain valid JSON data')
+MODEL_NOT_LOADED = ('Model not loaded', 'Model needs to be trained first')
+ENCODING_ERROR = ('Encoding error', 'Error processing categorical data')
+PREDICTION_ERROR = ('Prediction error', 'Error generating prediction')
+SERVER_ERROR = ('Server error', 'An unexpected error occurred')
+QUANTILES_UNAVAILABLE = ('Quantiles unavailable', 'This model version has no leaf quantiles; retrain it to add them')
+
+# Most quantile levels one request may ask for
+MAX_QUANTILES = 9
+QUANTILES_ERROR = f"Quantiles must be up to {MAX_QUANTILES} comma-separated numbers between 0 and 1"
+
+STATIC_ERRORS = [
+    INVALID_JSON, MODEL_NOT_LOADED, ENCODING_ERROR, PREDICTION_ERROR, SERVER_ERROR, QUANTILES_UNAVAILABLE,
+    *(('Missing field', f'Missing required field: {field}') for field, _, _, _ in FEATURE_SCHEMA),
+    *(('Validation error', message) for _, _, _, message in FEATURE_SCHEMA),
+    ('Validation error', QUANTILES_ERROR),
+]
+
+PREDICTION_MESSAGE = 'Prediction successful'
+
+# Placeholders substituted in the prebuilt prediction body
+_USD = '\x00usd'
+_INR = '\x00inr'
+
+
+def loads(body, fast=True):
+    """Parse a JSON request body, with orjson when available and ``fast`` is set
+
+    orjson rejects a few inputs the json module accepts (NaN literals, integers
+    beyond 64 bits, lone surrogates); those are parsed again with json so
+    both paths accept exactly the same requests.
+    """
+    if fast and orjson is not None:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(body)
+
+
+def parse_flag(value):
+    """Whether a query string flag such as ``?explain=true`` is set"""
+    return value is not None and value.lower() in ('1', 'true', 'yes')
+
+
+def parse_quantiles(value, default):
+    """Quantile levels asked for with ``?quantiles=``, or None if not asked for
+
+    A true flag selects ``default``, a comma-separated list like the
+    PREDICTION_QUANTILES setting. Raises ValueError with QUANTILES_ERROR if
+    the levels are invalid.
+    """
+    if value is None or value.lower() in ('', '0', 'false', 'no'):
+        return None
+    if parse_flag(value):
+        value = default
+    try:
+        levels = tuple(float(level) for level in value.split(','))
+    except ValueError:
+        raise ValueError(QUANTILES_ERROR) from None
+    # NaN fails the range check
+    if len(levels) > MAX_QUANTILES or not all(0 <= level <= 1 for level in levels):
+        raise ValueError(QUANTILES_ERROR)
+    return levels
+
+
+def round_cents(value):
+    """Round like NumPy's round(x, 2), which the responses have always used
+
+    NumPy scales, rounds half to even and scales back, which is not always
+    what Python's round(x, 2) returns.
+    """
+    value = float(value)
+    if not math.isfinite(value):
+        return value
+    # round() returns an int, which would turn NumPy's -0.0 into 0.0
+    return math.copysign(round(value * 100.0) / 100, value)
+
+
+def explanation(bias, contributions):
+    """Response field for a prediction explained by CompiledForest.explain()"""
+    return {
+        'baseline_usd': round_cents(bias),
+        'contributions_usd': {col: round_cents(value) for col, value in zip(FEATURE_COLUMNS, contributions)},
+    }
+
+
+def extra_fields(row, explained=None, quantiles=None, quantile_values=None, usd_to_inr=None):
+    """Optional response fields of row ``row`` of a LoadedModel.score() result, or None"""
+    fields = {}
+    if explained is not None:
+        bias, contributions = explained
+        fields['explanation'] = explanation(bias, contributions[row])
+    if quantile_values is not None:
+        labels = [f'{level:g}' for level in quantiles]
+        fields['quantiles_usd'] = {label: round_cents(value) for label, value in zip(labels, quantile_values[row])}
+        fields['quantiles_inr'] = {label: round_cents(value * usd_to_inr)
+                                   for label, value in zip(labels, quantile_values[row])}
+    return fields or None
+
+
+class ResponseCodec:
+    """JSON response bodies of an app, built as its jsonify() would build them
+
+    Fixed error bodies are serialized once. The success body is split into a
+    template around its two amounts, which are the only parts formatted per
+    request.
+    """
+
+    def __init__(self, app):
+        provider = app.json
+        if provider.compact is False or (provider.compact is None and app.debug):
+            self._dump_args = {'indent': 2}
+        else:
+            self._dump_args = {'separators': (',', ':')}
+        self._provider = provider
+        self.mimetype = provider.mimetype
+        self._errors = {pair: self.dumps(self._error_payload(*pair)) for pair in STATIC_ERRORS}
+
+        template = self.dumps({
+            'success': True,
+            'predicted_charges_usd': _USD,
+            'predicted_charges_inr': _INR,
+            'message': PREDICTION_MESSAGE
+        })
+        # Key order follows the provider's settings (sorted by default)
+        usd, inr = (self.dumps(placeholder).rstrip(b'\n') for placeholder in (_USD, _INR))
+        (start, first), (end, second) = sorted([(template.index(usd), usd), (template.index(inr), inr)])
+        self._usd_first = first == usd
+        self._template = (template[:start], template[start + len(first):end], template[end + len(second):])
+
+    @staticmethod
+    def _error_payload(error, message):
+        return {'success': False, 'error': error, 'message': message}
+
+    def dumps(self, payload):
+        """Body of jsonify(payload), as bytes"""
+        return f"{self._provider.dumps(payload, **self._dump_args)}\n".encode()
+
+    def error(self, error, message):
+        """Body of a /predict error response, prebuilt for every fixed message"""
+        body = self._errors.get((error, message))
+        if body is None:
+            body = self.dumps(self._error_payload(error, message))
+        return body
+
+    def prediction(self, prediction_usd, prediction_inr, extra=None):
+        """Body of a successful /predict response with both amounts rounded to cents
+
+        ``extra`` holds optional fields such as the explanation; a response
+        with any is serialized in full.
+        """
+        if extra:
+            return self.dumps({
+                'success': True,
+                'predicted_charges_usd': round_cents(prediction_usd),
+                'predicted_charges_inr': round_cents(prediction_inr),
+                **extra,
+                'message': PREDICTION_MESSAGE
+            })
+        usd = self._number(round_cents(prediction_usd))
+        inr = self._number(round_cents(prediction_inr))
+        head, middle, tail = self._template
+        first, second = (usd, inr) if self._usd_first else (inr, usd)
+        return b''.join((head, first, middle, second, tail))
+
+    def _number(self, value):
+        if math.isfinite(value):
+            # What the json module writes for finite floats
+            return float.__repr__(value).encode()
+        return self._provider.dumps(value).encode()
@@ -0,0 +1,161 @@
+"""Columnar binary format for training data
+
+Each column is stored as one fixed-width array: integers and floats in their
+own dtype, categoricals as one-byte codes into a vocabulary kept in the
+header with the schema. Files are array files (see arrayfile.py), so every
+column is memory-mapped straight from disk without parsing.
+
+Example:
+    python columnar.py insurance.csv insurance.cols
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from arrayfile import create_arrays, open_arrays, update_meta
+
+FORMAT = 'columnar'
+FORMAT_VERSION = 1
+COLUMNAR_SUFFIX = '.cols'
+
+CATEGORY = 'category'
+CODE_DTYPE = np.uint8
+
+# Column types of the insurance data, in file order
+SCHEMA = {
+    'age': 'int16',
+    'sex': CATEGORY,
+    'bmi': 'float64',
+    'children': 'int16',
+    'smoker': CATEGORY,
+    'region': CATEGORY,
+    'charges': 'float64',
+}
+
+DEFAULT_CHUNK_SIZE = 1000000
+
+# Header space reserved by the CSV converter for vocabularies found on the way
+CONVERT_HEADER_SIZE = 1 << 16
+
+
+def column_dtype(kind):
+    return CODE_DTYPE if kind == CATEGORY else np.dtype(kind)
+
+
+def _meta(rows, vocabularies, schema, meta):
+    return dict(meta or {}, format=FORMAT, format_version=FORMAT_VERSION, rows=rows,
+                schema=schema, vocabularies=vocabularies)
+
+
+def create_columns(path, rows, vocabularies, schema=SCHEMA, meta=None, header_size=0):
+    """Create a zeroed file of ``rows`` rows and return its writable memory-mapped columns"""
+    specs = {col: (column_dtype(kind), (rows,)) for col, kind in schema.items()}
+    return create_arrays(path, specs, _meta(rows, vocabularies, schema, meta), header_size)
+
+
+def open_columns(path):
+    """Return (meta, columns) with every column memory-mapped read-only"""
+    meta, arrays = open_arrays(path)
+    if meta.get('format') != FORMAT or meta.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} {FORMAT} file")
+    return meta, arrays
+
+
+def _count_rows(path):
+    """Data rows a CSV file can hold at most: its lines less the header"""
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n') - 1
+
+
+def _fits(values, dtype):
+    """Whether parsed CSV values are whole numbers within the range of an integer dtype"""
+    if values.dtype.kind == 'f':
+        if not np.all(np.isfinite(values) & (values == np.round(values))):
+            return False
+    elif values.dtype.kind not in 'iu':
+        return False
+    info = np.iinfo(dtype)
+    return not len(values) or (values.min() >= info.min and values.max() <= info.max)
+
+
+def convert_csv(csv_path, path, schema=SCHEMA, chunk_size=DEFAULT_CHUNK_SIZE, meta=None):
+    """Convert a CSV file to the columnar format, one chunk at a time; returns the row count
+
+    Categories are coded in the order they are first seen and the
+    vocabularies written to the header at the end. Integer columns accept
+    whole numbers written as floats (``34.0``), and blank lines are skipped,
+    as pandas.read_csv() does.
+    """
+    import pandas as pd
+
+    rows = _count_rows(csv_path)
+    columns = create_columns(path, rows, {}, schema, meta, CONVERT_HEADER_SIZE)
+    vocabularies = {col: {} for col, kind in schema.items() if kind == CATEGORY}
+    dtypes = {col: str for col in vocabularies}
+
+    offset = 0
+    for chunk in pd.read_csv(csv_path, usecols=list(schema), dtype=dtypes, keep_default_na=False,
+                             chunksize=chunk_size):
+        end = offset + len(chunk)
+        if end > rows:
+            raise ValueError(f"{csv_path} has more rows than lines; multi-line values are not supported")
+        for col, kind in schema.items():
+            values = chunk[col].to_numpy()
+            if kind == CATEGORY:
+                labels, inverse = np.unique(values, return_inverse=True)
+                codes = vocabularies[col]
+                for label in labels:
+                    codes.setdefault(label, len(codes))
+                if len(codes) > np.iinfo(CODE_DTYPE).max + 1:
+                    raise ValueError(f"Column {col} has more than {np.iinfo(CODE_DTYPE).max + 1} categories")
+                columns[col][offset:end] = np.array([codes[label] for label in labels], dtype=CODE_DTYPE)[inverse]
+            else:
+                dtype = np.dtype(kind)
+                if dtype.kind == 'i' and not _fits(values, dtype):
+                    raise ValueError(f"Column {col} does not fit in {kind}")
+                columns[col][offset:end] = values
+        offset = end
+
+    for column in columns.values():
+        column.flush()
+    vocabularies = {col: list(codes) for col, codes in vocabularies.items()}
+    # Blank lines were counted but hold no row; the unused tail of every column is dropped
+    update_meta(path, _meta(offset, vocabularies, schema, meta), {col: (offset,) for col in schema})
+    return offset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert a CSV dataset to the columnar binary format')
+    parser.add_argument('input', help='CSV file with the columns ' + ', '.join(SCHEMA))
+    parser.add_argument('output', help='Columnar file to write')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows parsed at a time')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    tmp_path = f'{args.output}.tmp'
+    try:
+        rows = convert_csv(args.input, tmp_path, chunk_size=args.chunk_size)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Converted {rows} rows to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) "
+          f"in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""CPU budgets for serving and training processes
+
+Gunicorn runs several workers per host. Left alone, each worker's
+BLAS/OpenMP pools and every joblib call would size themselves to all cores,
+so a loaded host runs many times more threads than it has CPUs. Every
+serving process instead gets INFERENCE_THREADS threads (one by default),
+used only by model calls on at least INFERENCE_PARALLEL_MIN_ROWS rows, and
+training runs get TRAIN_N_JOBS.
+
+Find the best worker and thread counts for a host with:
+    python concurrency.py tune --seconds 5
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Variables the native thread pools read when their library is loaded
+NATIVE_THREAD_VARS = (
+    'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS', 'BLIS_NUM_THREADS',
+)
+
+# tune recommends the highest throughput whose p99 is within this factor of the best p99
+P99_TOLERANCE = 1.5
+
+# Stable name of a serving process, set by gunicorn.conf.py: 'master', or
+# 'worker<n>' with n reused when gunicorn replaces a worker
+WORKER_SLOT_VAR = 'WORKER_SLOT'
+
+
+def thread_env(threads, env=None):
+    """Copy of ``env`` (default os.environ) with the native pools capped at ``threads``
+
+    Zero or less (joblib's -1) leaves the pools at every core.
+    """
+    env = dict(os.environ if env is None else env)
+    if threads < 1:
+        return env
+    for var in NATIVE_THREAD_VARS:
+        env[var] = str(threads)
+    return env
+
+
+def limit_native_threads(threads):
+    """Cap this process's BLAS/OpenMP pools at ``threads`` unless the operator set them
+
+    The variables only take effect for libraries loaded afterwards, so call
+    this before NumPy is imported (gunicorn.conf.py does). Pools that are
+    already loaded are capped too when threadpoolctl is installed. Zero or
+    less leaves them alone.
+    """
+    if threads < 1:
+        return
+    for var in NATIVE_THREAD_VARS:
+        os.environ.setdefault(var, str(threads))
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return
+    # The operator's own setting wins if it is a plain number (OpenMP also accepts lists like '4,2')
+    try:
+        limit = int(os.environ['OMP_NUM_THREADS'])
+    except ValueError:
+        limit = threads
+    threadpool_limits(limit)
+
+
+def inference_jobs(rows, threads, parallel_min_rows):
+    """Threads a model call on ``rows`` rows may use: always one for small requests"""
+    return threads if threads > 1 and rows >= parallel_min_rows else 1
+
+
+def worker_slot():
+    """Name of this process for per-process files: its gunicorn slot, else its pid
+
+    Files named after the slot are reused by the worker that replaces a
+    recycled one instead of piling up per pid.
+    """
+    return os.environ.get(WORKER_SLOT_VAR) or str(os.getpid())
+
+
+def assign_worker_slot(server, worker):
+    """gunicorn pre_fork hook: give a new worker the lowest slot no live worker holds"""
+    taken = {getattr(live, 'slot', None) for live in server.WORKERS.values()}
+    worker.slot = next(slot for slot in itertools.count() if slot not in taken)
+
+
+def default_workers():
+    """Gunicorn workers when WORKERS is not set"""
+    return os.cpu_count() * 2 + 1
+
+
+def _run(args):
+    """Child of tune: score requests in a loop and print the call latencies"""
+    import numpy as np
+
+    from benchmark import generate_payloads
+    from config import config
+    from features import encode_batch, validate_batch
+    from model_store import ModelStore
+
+    settings = config[os.environ.get('FLASK_ENV', 'production')]
+    store = ModelStore(settings.MODEL_DIR)
+    version = store.current_version()
+    if version is None:
+        raise SystemExit(f"No published model in {settings.MODEL_DIR}; run python training.py first")
+    loaded = store.load(version, engine=settings.INFERENCE_ENGINE, grid_mode=settings.GRID_MODE,
+                        threads=args.threads, parallel_min_rows=settings.INFERENCE_PARALLEL_MIN_ROWS)
+    payloads = generate_payloads(max(args.rows, 1000), seed=os.getpid(), dataset_path=settings.DATASET_PATH)
+    columns, errors = validate_batch(payloads)
+    X = encode_batch(columns, loaded.encoding, np.array([i for i in range(len(payloads)) if i not in errors],
+                                                        dtype=np.intp))
+    # Warm up, then start together with the other workers
+    loaded.predict(X[:args.rows])
+    time.sleep(max(0.0, args.start_at - time.time()))
+
+    latencies = []
+    end = time.perf_counter() + args.seconds
+    i = 0
+    while time.perf_counter() < end:
+        start = (i * args.rows) % (len(X) - args.rows + 1)
+        call_start = time.perf_counter()
+        loaded.predict(X[start:start + args.rows])
+        latencies.append(time.perf_counter() - call_start)
+        i += 1
+    print(json.dumps(latencies))
+    return 0
+
+
+def measure(workers, threads, seconds, rows):
+    """Throughput (rows/s) and p99 call latency of ``workers`` processes with ``threads`` threads each"""
+    import numpy as np
+
+    env = thread_env(threads)
+    env['INFERENCE_THREADS'] = str(threads)
+    start_at = time.time() + 5.0
+    command = [sys.executable, os.path.abspath(__file__), '_run', '--threads', str(threads),
+               '--seconds', str(seconds), '--rows', str(rows), '--start-at', str(start_at)]
+    processes = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True) for _ in range(workers)]
+    latencies = []
+    for process in processes:
+        output, _ = process.communicate()
+        if process.returncode:
+            raise RuntimeError(f"Tuning worker failed with exit code {process.returncode}")
+        latencies.extend(json.loads(output.strip().splitlines()[-1]))
+    ms = np.asarray(latencies) * 1e3
+    return {
+        'workers': workers,
+        'threads': threads,
+        'throughput_rows_per_s': round(len(latencies) * rows / seconds, 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 4),
+        'p99_ms': round(float(np.percentile(ms, 99)), 4),
+    }
+
+
+def recommend(results):
+    """Highest throughput among the settings whose p99 is within P99_TOLERANCE of the best"""
+    best_p99 = min(result['p99_ms'] for result in results)
+    eligible = [result for result in results if result['p99_ms'] <= best_p99 * P99_TOLERANCE]
+    return max(eligible, key=lambda result: result['throughput_rows_per_s'])
+
+
+def _counts(value):
+    return sorted({int(count) for count in value.split(',') if int(count) > 0})
+
+
+def tune(args):
+    cpus = os.cpu_count()
+    workers = _counts(args.workers) if args.workers else sorted({max(1, cpus // 2), cpus, cpus * 2, default_workers()})
+    threads = _counts(args.threads) if args.threads else sorted({1, 2, 4} & set(range(1, cpus + 1)))
+
+    results = []
+    for worker_count in workers:
+        for thread_count in threads:
+            print(f"Measuring {worker_count} workers x {thread_count} threads...", file=sys.stderr)
+            results.append(measure(worker_count, thread_count, args.seconds, args.rows))
+
+    best = recommend(results)
+    print(json.dumps({'cpu_count': cpus, 'rows_per_call': args.rows, 'results': results,
+                      'recommended': best}, indent=2))
+    print(f"Recommended: WORKERS={best['workers']} INFERENCE_THREADS={best['threads']}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tune worker and thread counts for this host')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    tune_parser = commands.add_parser('tune', help='Benchmark worker x thread combinations and recommend one')
+    tune_parser.add_argument('--workers', help='Comma-separated worker counts (default: around the CPU count)')
+    tune_parser.add_argument('--threads', help='Comma-separated threads per worker (default: 1,2,4)')
+    tune_parser.add_argument('--seconds', type=float, default=5.0, help='Measuring time per combination')
+    tune_parser.add_argument('--rows', type=int, default=1,
+                             help='Rows per model call: 1 for /predict traffic, more for batches')
+
+    run_parser = commands.add_parser('_run')
+    run_parser.add_argument('--threads', type=int, required=True)
+    run_parser.add_argument('--seconds', type=float, required=True)
+    run_parser.add_argument('--rows', type=int, required=True)
+    run_parser.add_argument('--start-at', type=float, required=True)
+
+    args = parser.parse_args(argv)
+    if args.command == '_run':
+        return _run(args)
+    return tune(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
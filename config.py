@@ -11,25 +11,129 @@ class Config:
     DATASET_PATH = os.environ.get('DATASET_PATH') or 'insurance.csv'
     USD_TO_INR_RATE = float(os.environ.get('USD_TO_INR_RATE', '83.0'))
     
+    # Versioned model artifacts; MODEL_PATH/ENCODERS_PATH keep a copy of the
+    # current version for app.py
+    MODEL_DIR = os.environ.get('MODEL_DIR') or 'models'
+    MODEL_KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', '5'))
+    
+    # How often a worker checks for a newly published version (and app.py for
+    # changed model files); in between requests do not touch the filesystem
+    MODEL_CHECK_INTERVAL_MS = int(os.environ.get('MODEL_CHECK_INTERVAL_MS', '1000'))
+    
+    # Further model stores a request can pick with ?model=name[@version],
+    # as 'name=dir,name=dir'; loaded versions share MODEL_MEMORY_BUDGET_MB and
+    # published ones are never evicted. SHADOW_MODEL (a name or name@version)
+    # also scores every prediction in the background for comparison.
+    MODEL_REGISTRY = os.environ.get('MODEL_REGISTRY', '')
+    MODEL_MEMORY_BUDGET_MB = float(os.environ.get('MODEL_MEMORY_BUDGET_MB', '512'))
+    SHADOW_MODEL = os.environ.get('SHADOW_MODEL', '')
+    SHADOW_MAX_PENDING = int(os.environ.get('SHADOW_MAX_PENDING', '100'))
+    
+    # Run /train in a background process and report progress via /train/<job_id>
+    TRAIN_ASYNC = os.environ.get('TRAIN_ASYNC', 'true').lower() == 'true'
+    
+    # Train a model at startup when none is published; disable for serving-only
+    # deployments that ship a prebuilt model
+    TRAIN_ON_STARTUP = os.environ.get('TRAIN_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Cores used to fit the forest; keep low so training does not starve serving workers
+    TRAIN_N_JOBS = int(os.environ.get('TRAIN_N_JOBS', '1'))
+    
+    # When rows were only appended to the dataset, grow the current forest by
+    # TRAIN_WARM_START_TREES trees instead of retraining, up to TRAIN_MAX_TREES
+    TRAIN_WARM_START = os.environ.get('TRAIN_WARM_START', 'true').lower() == 'true'
+    TRAIN_WARM_START_TREES = int(os.environ.get('TRAIN_WARM_START_TREES', '10'))
+    TRAIN_MAX_TREES = int(os.environ.get('TRAIN_MAX_TREES', '200'))
+    
+    # Inference engine: 'compiled' (flat-array forest) or 'sklearn'
+    INFERENCE_ENGINE = os.environ.get('INFERENCE_ENGINE', 'compiled')
+    
+    # Threads per serving process for BLAS/OpenMP pools and sklearn model calls;
+    # calls on fewer than INFERENCE_PARALLEL_MIN_ROWS rows are always single-threaded
+    # (python concurrency.py tune recommends WORKERS and INFERENCE_THREADS)
+    INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', '1'))
+    INFERENCE_PARALLEL_MIN_ROWS = int(os.environ.get('INFERENCE_PARALLEL_MIN_ROWS', '1000'))
+    
+    # Compact forest: float32 thresholds/leaves, narrow indices and leaves merged
+    # within FOREST_MERGE_TOLERANCE (USD); kept only if no training prediction
+    # moves by more than FOREST_COMPACT_MAX_ERROR (USD)
+    FOREST_COMPACT = os.environ.get('FOREST_COMPACT', 'false').lower() == 'true'
+    FOREST_MERGE_TOLERANCE = float(os.environ.get('FOREST_MERGE_TOLERANCE', '0.0'))
+    FOREST_COMPACT_MAX_ERROR = float(os.environ.get('FOREST_COMPACT_MAX_ERROR', '0.01'))
+    
+    # Prediction quantiles: training keeps QUANTILE_POINTS target quantiles per
+    # leaf (0 disables); ?quantiles=true returns PREDICTION_QUANTILES
+    QUANTILE_POINTS = int(os.environ.get('QUANTILE_POINTS', '16'))
+    PREDICTION_QUANTILES = os.environ.get('PREDICTION_QUANTILES', '0.05,0.95')
+    
+    # Grid mode: answer requests from a precomputed age/BMI lookup table
+    GRID_MODE = os.environ.get('GRID_MODE', 'false').lower() == 'true'
+    GRID_AGE_STEP = float(os.environ.get('GRID_AGE_STEP', '1.0'))
+    GRID_BMI_STEP = float(os.environ.get('GRID_BMI_STEP', '0.5'))
+    
+    # Batch prediction
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', '10000'))
+    
+    # Parse /predict bodies with orjson when it is installed
+    FAST_JSON = os.environ.get('FAST_JSON', 'true').lower() == 'true'
+    
+    # Micro-batching of concurrent /predict requests in the ASGI entry point
+    MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', '64'))
+    MICROBATCH_MAX_WAIT_US = int(os.environ.get('MICROBATCH_MAX_WAIT_US', '2000'))
+    
     # Redis configuration for caching
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Prediction cache: in-process LRU plus an optional shared tier
+    # ('redis', 'local' for an in-memory stand-in, or 'none')
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', '10000'))
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', '3600'))
+    CACHE_SHARED_BACKEND = os.environ.get('CACHE_SHARED_BACKEND', 'none')
+    
     # Logging configuration
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FILE = os.environ.get('LOG_FILE', 'app.log')
+    # Log records are queued and written by a background thread into one file
+    # per process (app.worker<n>.log) unless LOG_PER_PROCESS=false. Only
+    # LOG_SAMPLE_RATE of successful requests are logged; failures always are.
+    LOG_PER_PROCESS = os.environ.get('LOG_PER_PROCESS', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', '1.0'))
     
     # Security settings
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
-    # Rate limiting
-    RATELIMIT_ENABLED = True
-    RATELIMIT_STORAGE_URL = REDIS_URL
+    # Rate limiting: a token bucket per worker, plus a sliding window shared by
+    # all workers when RATELIMIT_STORAGE_URL is a redis URL ('memory://' limits
+    # per worker only, 'local://' uses an in-memory stand-in)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    # Request header with the client address when behind a proxy, e.g. X-Real-IP
+    RATELIMIT_KEY_HEADER = os.environ.get('RATELIMIT_KEY_HEADER')
     
     # Monitoring
     SENTRY_DSN = os.environ.get('SENTRY_DSN')
     ENABLE_METRICS = os.environ.get('ENABLE_METRICS', 'true').lower() == 'true'
+    
+    # Sentry traces SENTRY_TRACES_SAMPLE_RATE of requests, and every request to
+    # a path that was slower than SENTRY_SLOW_REQUEST_MS or failed within the
+    # last SENTRY_SLOW_WINDOW_S seconds; of those only slow or failed ones are sent
+    SENTRY_TRACES_SAMPLE_RATE = float(os.environ.get('SENTRY_TRACES_SAMPLE_RATE', '0.01'))
+    SENTRY_SLOW_REQUEST_MS = float(os.environ.get('SENTRY_SLOW_REQUEST_MS', '250'))
+    SENTRY_SLOW_WINDOW_S = float(os.environ.get('SENTRY_SLOW_WINDOW_S', '60'))
+    
+    # Sampling profiler: PROFILER_HZ stack samples per second in every worker,
+    # served as collapsed stacks on /admin/profile (which needs ADMIN_TOKEN in
+    # the X-Admin-Token header) and written to PROFILER_OUTPUT_DIR if set
+    PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', 'false').lower() == 'true'
+    PROFILER_HZ = float(os.environ.get('PROFILER_HZ', '100'))
+    PROFILER_OUTPUT_DIR = os.environ.get('PROFILER_OUTPUT_DIR', '')
+    PROFILER_DUMP_INTERVAL_S = float(os.environ.get('PROFILER_DUMP_INTERVAL_S', '60'))
+    # When set, POST /train also requires it in the X-Admin-Token header
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -59,6 +163,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     WTF_CSRF_ENABLED = False
+    RATELIMIT_ENABLED = False
 
 # Configuration dictionary
 config = {
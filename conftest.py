@@ -0,0 +1,47 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pytest
+
+# test_api.py exercises a running server: python test_api.py
+collect_ignore = ['test_api.py']
+
+_model_root = None
+
+
+def pytest_configure(config):
+    """Point the app at a temporary model store before any test imports config.py"""
+    global _model_root
+    _model_root = tempfile.mkdtemp(prefix='insurance-tests-')
+    os.environ.update({
+        'FLASK_ENV': 'testing',
+        'MODEL_DIR': os.path.join(_model_root, 'models'),
+        'MODEL_PATH': os.path.join(_model_root, 'insurance_model.pkl'),
+        'ENCODERS_PATH': os.path.join(_model_root, 'label_encoders.pkl'),
+        'DATASET_PATH': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'insurance.csv'),
+    })
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_model_root, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def insurance_rows():
+    """Encoded feature matrix and charges of a small generated dataset"""
+    from create_dataset import generate_blocks
+    from features import FEATURE_COLUMNS
+
+    _, block = next(generate_blocks(2000, seed=7))
+    X = np.column_stack([block[col] for col in FEATURE_COLUMNS])
+    return X.astype(np.float64), block['charges']
+
+
+@pytest.fixture(scope='session')
+def sklearn_forest(insurance_rows):
+    from sklearn.ensemble import RandomForestRegressor
+
+    X, y = insurance_rows
+    return RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0).fit(X, y)
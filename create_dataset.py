@@ -1,90 +1,286 @@
-import pandas as pd
+"""Generate a synthetic insurance dataset
+
+Rows are generated in blocks of vectorized NumPy draws and streamed to disk,
+so datasets of any size can be produced in bounded memory. The defaults
+reproduce the original 1338-row insurance.csv exactly.
+
+Examples:
+    python create_dataset.py
+    python create_dataset.py --rows 10000000 --output large.parquet
+    python create_dataset.py --rows 10000000 --output large.cols --smoker-rate 0.3
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
 import numpy as np
-import random
-
-# Set random seed for reproducibility
-np.random.seed(42)
-random.seed(42)
-
-# Generate sample data
-n_samples = 1338
-
-# Age: 18-64 years
-age = np.random.randint(18, 65, n_samples)
-
-# Sex: male/female
-sex = np.random.choice(['male', 'female'], n_samples)
-
-# BMI: 15-50 (realistic range)
-bmi = np.random.uniform(15, 50, n_samples)
-
-# Children: 0-5
-children = np.random.randint(0, 6, n_samples)
-
-# Smoker: yes/no (with realistic distribution)
-smoker = np.random.choice(['yes', 'no'], n_samples, p=[0.2, 0.8])
-
-# Region: four regions
-region = np.random.choice(['southwest', 'southeast', 'northwest', 'northeast'], n_samples)
-
-# Create DataFrame
-df = pd.DataFrame({
-    'age': age,
-    'sex': sex,
-    'bmi': bmi,
-    'children': children,
-    'smoker': smoker,
-    'region': region
-})
-
-# Calculate charges based on realistic factors
-charges = []
-
-for i in range(n_samples):
-    base_charge = 250
-    
-    # Age factor
-    age_factor = 1 + (df.iloc[i]['age'] - 18) * 0.02
-    
-    # BMI factor
-    bmi_factor = 1 + (df.iloc[i]['bmi'] - 25) * 0.01
-    
-    # Children factor
-    children_factor = 1 + df.iloc[i]['children'] * 0.1
-    
-    # Smoker factor (major impact)
-    smoker_factor = 3.0 if df.iloc[i]['smoker'] == 'yes' else 1.0
-    
-    # Region factor
-    region_factors = {
-        'southwest': 1.0,
-        'southeast': 1.1,
-        'northwest': 1.05,
-        'northeast': 1.15
+
+DEFAULT_ROWS = 1338
+DEFAULT_SEED = 42
+
+# Every block draws from its own random stream seeded by (seed, block index),
+# so the output depends only on the seed and the row count. Block 0 uses the
+# bare seed, which keeps the default dataset identical to earlier versions.
+BLOCK_SIZE = 1000000
+
+# Labels in the order the draws index them
+SEXES = np.array(['male', 'female'], dtype=object)
+SMOKERS = np.array(['yes', 'no'], dtype=object)
+REGIONS = np.array(['southwest', 'southeast', 'northwest', 'northeast'], dtype=object)
+
+SEX_FACTORS = np.array([1.1, 1.0])
+SMOKER_FACTORS = np.array([3.0, 1.0])
+REGION_FACTORS = np.array([1.0, 1.1, 1.05, 1.15])
+BASE_CHARGE = 250
+
+COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region', 'charges']
+
+
+class Knobs:
+    """Distribution parameters of the generated applicants"""
+
+    def __init__(self, min_age=18, max_age=64, min_bmi=15.0, max_bmi=50.0, max_children=5,
+                 smoker_rate=0.2, noise=0.2):
+        self.min_age = min_age
+        self.max_age = max_age
+        self.min_bmi = min_bmi
+        self.max_bmi = max_bmi
+        self.max_children = max_children
+        self.smoker_rate = smoker_rate
+        self.noise = noise
+
+
+def round_charges(charges):
+    """Round to cents exactly like Python's round(x, 2)
+
+    np.round scales by 100 first, which can land on the other side of a
+    half-cent; those rare values are re-rounded one by one.
+    """
+    rounded = np.round(charges, 2)
+    cents = charges * 100
+    suspect = np.flatnonzero(np.abs(cents - np.floor(cents) - 0.5) < 1e-6)
+    for i in suspect:
+        rounded[i] = round(float(charges[i]), 2)
+    return rounded
+
+
+def generate_block(rng, n, knobs):
+    """Draw n applicants; returns label indices for the categoricals and the charges"""
+    # Draw order and calls match the original per-row generator
+    age = rng.randint(knobs.min_age, knobs.max_age + 1, n)
+    sex = rng.choice(len(SEXES), n)
+    bmi = rng.uniform(knobs.min_bmi, knobs.max_bmi, n)
+    children = rng.randint(0, knobs.max_children + 1, n)
+    smoker = rng.choice(len(SMOKERS), n, p=[knobs.smoker_rate, 1 - knobs.smoker_rate])
+    region = rng.choice(len(REGIONS), n)
+
+    # Multiplied left to right in the original order so rounding is identical
+    charges = BASE_CHARGE * (1 + (age - 18) * 0.02)
+    charges *= 1 + (bmi - 25) * 0.01
+    charges *= 1 + children * 0.1
+    charges *= SMOKER_FACTORS[smoker]
+    charges *= REGION_FACTORS[region]
+    charges *= SEX_FACTORS[sex]
+    charges *= rng.uniform(1 - knobs.noise, 1 + knobs.noise, n)
+
+    return {
+        'age': age,
+        'sex': sex,
+        'bmi': bmi,
+        'children': children,
+        'smoker': smoker,
+        'region': region,
+        'charges': round_charges(charges),
+    }
+
+
+def generate_blocks(rows, seed=DEFAULT_SEED, knobs=None):
+    """Yield (offset, block) pairs covering ``rows`` rows"""
+    knobs = knobs or Knobs()
+    for index, offset in enumerate(range(0, rows, BLOCK_SIZE)):
+        rng = np.random.RandomState(seed if index == 0 else [seed, index])
+        yield offset, generate_block(rng, min(BLOCK_SIZE, rows - offset), knobs)
+
+
+def to_frame(block):
+    import pandas as pd
+    return pd.DataFrame({
+        'age': block['age'],
+        'sex': SEXES[block['sex']],
+        'bmi': block['bmi'],
+        'children': block['children'],
+        'smoker': SMOKERS[block['smoker']],
+        'region': REGIONS[block['region']],
+        'charges': block['charges'],
+    }, columns=COLUMNS)
+
+
+class CSVWriter:
+    """Writes the same bytes as DataFrame.to_csv, about ten times faster with pyarrow
+
+    Arrow prints floats with the same shortest round-trip digits as Python's
+    repr, except that it drops the '.0' of whole numbers (added back here) and
+    switches to exponent notation at different magnitudes (such blocks go
+    through pandas).
+    """
+
+    def __init__(self, path, rows):
+        self._f = open(path, 'wb')
+        self._f.write((','.join(COLUMNS) + '\n').encode())
+        # pyarrow itself is only imported by the first block written
+        self._arrow = importlib.util.find_spec('pyarrow') is not None
+
+    def _float_column(self, values):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        text = pc.cast(pa.array(values), pa.string())
+        return pc.if_else(pa.array(values == np.floor(values)), pc.binary_join_element_wise(text, '.0', ''), text)
+
+    def write(self, offset, block):
+        floats = np.abs(np.concatenate([block['bmi'], block['charges']]))
+        if not self._arrow or not np.all((floats == 0) | ((floats >= 1e-4) & (floats < 1e15))):
+            to_frame(block).to_csv(self._f, header=False, index=False)
+            return
+
+        import pyarrow as pa
+        import pyarrow.csv as pcsv
+        table = pa.table({
+            'age': block['age'],
+            'sex': SEXES[block['sex']],
+            'bmi': self._float_column(block['bmi']),
+            'children': block['children'],
+            'smoker': SMOKERS[block['smoker']],
+            'region': REGIONS[block['region']],
+            'charges': self._float_column(block['charges']),
+        })
+        pcsv.write_csv(table, self._f, pcsv.WriteOptions(include_header=False, quoting_style='none'))
+
+    def close(self):
+        self._f.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, rows):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        self._writer = pq.ParquetWriter(path, pa.schema([
+            ('age', pa.int64()),
+            ('sex', pa.dictionary(pa.int8(), pa.string())),
+            ('bmi', pa.float64()),
+            ('children', pa.int64()),
+            ('smoker', pa.dictionary(pa.int8(), pa.string())),
+            ('region', pa.dictionary(pa.int8(), pa.string())),
+            ('charges', pa.float64()),
+        ]))
+
+    def _labels(self, codes, labels):
+        pa = self._pa
+        return pa.DictionaryArray.from_arrays(codes.astype(np.int8), pa.array(labels.tolist(), pa.string()))
+
+    def write(self, offset, block):
+        pa = self._pa
+        self._writer.write_table(pa.table({
+            'age': block['age'].astype(np.int64),
+            'sex': self._labels(block['sex'], SEXES),
+            'bmi': block['bmi'],
+            'children': block['children'].astype(np.int64),
+            'smoker': self._labels(block['smoker'], SMOKERS),
+            'region': self._labels(block['region'], REGIONS),
+            'charges': block['charges'],
+        }))
+
+    def close(self):
+        self._writer.close()
+
+
+class ColumnarWriter:
+    """Writes the columnar training format (see columnar.py)"""
+
+    def __init__(self, path, rows):
+        from columnar import create_columns
+        # The label indices drawn above are used as the dictionary codes
+        vocabularies = {'sex': SEXES.tolist(), 'smoker': SMOKERS.tolist(), 'region': REGIONS.tolist()}
+        self._columns = create_columns(path, rows, vocabularies)
+
+    def write(self, offset, block):
+        for col, column in self._columns.items():
+            column[offset:offset + len(block[col])] = block[col]
+
+    def close(self):
+        for column in self._columns.values():
+            column.flush()
+
+
+WRITERS = {'csv': CSVWriter, 'parquet': ParquetWriter, 'columnar': ColumnarWriter}
+
+
+def file_format(path, explicit=None):
+    if explicit:
+        return explicit
+    if path.endswith(('.parquet', '.pq')):
+        return 'parquet'
+    if path.endswith('.cols'):
+        return 'columnar'
+    return 'csv'
+
+
+def create_dataset(path, rows=DEFAULT_ROWS, seed=DEFAULT_SEED, knobs=None, output_format=None):
+    """Generate ``rows`` rows into path and return a summary dict
+
+    The file is written next to its destination and renamed into place, so
+    readers never see a partial dataset.
+    """
+    fmt = file_format(path, output_format)
+    tmp_path = f'{path}.tmp'
+    start = time.perf_counter()
+    writer = WRITERS[fmt](tmp_path, rows)
+    try:
+        for offset, block in generate_blocks(rows, seed, knobs):
+            writer.write(offset, block)
+    except BaseException:
+        writer.close()
+        os.remove(tmp_path)
+        raise
+    writer.close()
+    os.replace(tmp_path, path)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'path': path,
+        'format': fmt,
+        'rows': rows,
+        'bytes': os.path.getsize(path),
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed, 1) if elapsed else 0.0,
     }
-    region_factor = region_factors[df.iloc[i]['region']]
-    
-    # Sex factor (minor impact)
-    sex_factor = 1.1 if df.iloc[i]['sex'] == 'male' else 1.0
-    
-    # Calculate final charge
-    charge = base_charge * age_factor * bmi_factor * children_factor * smoker_factor * region_factor * sex_factor
-    
-    # Add some randomness
-    charge *= np.random.uniform(0.8, 1.2)
-    
-    charges.append(round(charge, 2))
-
-df['charges'] = charges
-
-# Save to CSV
-df.to_csv('insurance.csv', index=False)
-
-print("Insurance dataset created successfully!")
-print(f"Dataset shape: {df.shape}")
-print("\nFirst few rows:")
-print(df.head())
-print("\nDataset statistics:")
-print(df.describe())
-print("\nCategorical variables:")
-print(df[['sex', 'smoker', 'region']].value_counts()) 
\ No newline at end of file
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic insurance dataset')
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help='Number of rows')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Random seed')
+    parser.add_argument('--output', default='insurance.csv', help='Output file')
+    parser.add_argument('--format', choices=sorted(WRITERS),
+                        help='Output format (default: from the extension; .parquet, .cols, else csv)')
+    parser.add_argument('--min-age', type=int, default=18)
+    parser.add_argument('--max-age', type=int, default=64)
+    parser.add_argument('--min-bmi', type=float, default=15.0)
+    parser.add_argument('--max-bmi', type=float, default=50.0)
+    parser.add_argument('--max-children', type=int, default=5)
+    parser.add_argument('--smoker-rate', type=float, default=0.2, help='Fraction of smokers')
+    parser.add_argument('--noise', type=float, default=0.2, help='Charges vary uniformly by +/- this fraction')
+    args = parser.parse_args(argv)
+
+    knobs = Knobs(args.min_age, args.max_age, args.min_bmi, args.max_bmi, args.max_children,
+                  args.smoker_rate, args.noise)
+    summary = create_dataset(args.output, args.rows, args.seed, knobs, args.format)
+    print(f"Created {summary['path']} ({summary['format']}): {summary['rows']} rows, "
+          f"{summary['bytes'] / 1e6:.1f} MB in {summary['seconds']}s ({summary['rows_per_s']:.0f} rows/s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import hashlib
+import os
+
+import numpy as np
+
+from columnar import COLUMNAR_SUFFIX, convert_csv, open_columns
+from features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+
+TARGET_COLUMN = 'charges'
+HASH_BLOCK_SIZE = 1 << 20
+# Converted sources kept in the cache; older ones may still be in use by a concurrent run
+DATASET_CACHE_KEEP = 3
+
+
+def hash_source(path, prefix_size=None):
+    """SHA-256 of a file, plus the hash of its first ``prefix_size`` bytes
+
+    The prefix hash tells whether the file only had rows appended since a
+    previous run that saw ``prefix_size`` bytes. Both come from one read.
+    """
+    digest = hashlib.sha256()
+    prefix_digest = None
+    remaining = prefix_size
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if remaining is not None and remaining <= len(block):
+                digest.update(block[:remaining])
+                prefix_digest = digest.copy()
+                digest.update(block[remaining:])
+                remaining = None
+            else:
+                digest.update(block)
+                if remaining is not None:
+                    remaining -= len(block)
+            if not block:
+                break
+    return digest.hexdigest(), prefix_digest.hexdigest() if prefix_digest else None
+
+
+class Dataset:
+    """Encoded training data: feature matrix, target and category vocabularies"""
+
+    def __init__(self, X, y, vocabularies, source_hash=None, source_size=None):
+        self.X = X
+        self.y = y
+        self.vocabularies = vocabularies
+        self.source_hash = source_hash
+        self.source_size = source_size
+
+    def __len__(self):
+        return len(self.y)
+
+    def label_encoders(self):
+        """LabelEncoders equivalent to ones fitted on the source data"""
+        from sklearn.preprocessing import LabelEncoder
+        encoders = {}
+        for col in CATEGORICAL_COLUMNS:
+            encoder = LabelEncoder()
+            encoder.classes_ = np.array(self.vocabularies[col], dtype=object)
+            encoders[col] = encoder
+        return encoders
+
+    @classmethod
+    def load(cls, path, source_hash=None, source_size=None):
+        """Build the feature matrix from a columnar file; the target stays memory-mapped
+
+        X is float32, the precision the forest is fitted and evaluated in, so
+        sklearn uses it without another copy. Categories are recoded to their
+        position in the sorted vocabulary, like LabelEncoder.
+        """
+        meta, columns = open_columns(path)
+        X = np.empty((meta['rows'], len(FEATURE_COLUMNS)), dtype=np.float32)
+        vocabularies = {}
+        for j, col in enumerate(FEATURE_COLUMNS):
+            if col in CATEGORICAL_COLUMNS:
+                labels = meta['vocabularies'][col]
+                vocabularies[col] = sorted(labels)
+                recode = np.array([vocabularies[col].index(label) for label in labels], dtype=np.float32)
+                X[:, j] = recode[columns[col]]
+            else:
+                X[:, j] = columns[col]
+        return cls(X, columns[TARGET_COLUMN], vocabularies, source_hash, source_size)
+
+
+def prune_cache(cache_dir, keep=DATASET_CACHE_KEEP):
+    """Remove all but the ``keep`` most recently written cache files
+
+    Files another process removed meanwhile are skipped, and conversions in
+    progress are never touched.
+    """
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith('dataset-') and name.endswith(COLUMNAR_SUFFIX):
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+    for _, path in sorted(entries, reverse=True)[keep:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def load_dataset(source_path, cache_dir, source_hash=None):
+    """Return the encoded dataset and whether it came from the cache
+
+    A CSV source is converted to a columnar file named after its hash, so an
+    unchanged source is never parsed twice. When a new one is written, only
+    the DATASET_CACHE_KEEP newest cache files are kept; if a concurrent run
+    removes the file this one was about to map, the source is parsed again.
+    A source that is already columnar (e.g. from
+    ``create_dataset.py --output data.cols``) is mapped directly.
+    """
+    if source_hash is None:
+        source_hash, _ = hash_source(source_path)
+    source_size = os.path.getsize(source_path)
+    if source_path.endswith(COLUMNAR_SUFFIX):
+        return Dataset.load(source_path, source_hash, source_size), True
+
+    cache_path = os.path.join(cache_dir, f'dataset-{source_hash}{COLUMNAR_SUFFIX}')
+    if os.path.exists(cache_path):
+        try:
+            # Once mapped, the data stays readable even if the file is removed
+            return Dataset.load(cache_path, source_hash, source_size), True
+        except FileNotFoundError:
+            pass
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Per process, so concurrent runs converting the same source do not share a file
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        convert_csv(source_path, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, cache_path)
+    prune_cache(cache_dir)
+    return Dataset.load(cache_path, source_hash, source_size), False
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+
+from features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS, VALID_REGIONS, VALID_SEXES, VALID_SMOKERS
+
+# Bump when the layout of the exported JSON changes
+ENCODING_FORMAT_VERSION = 1
+
+# Labels the API accepts for each categorical column; the model must know all of them
+API_LABELS = {'sex': VALID_SEXES, 'smoker': VALID_SMOKERS, 'region': VALID_REGIONS}
+
+
+class CategoricalEncoding:
+    """Integer codes for the categorical features, without sklearn
+
+    A code is the label's position in its sorted vocabulary, which is exactly
+    what LabelEncoder assigns, so a model trained on LabelEncoder codes can be
+    served from this table. Single values are encoded with a dict lookup and
+    batches with one pass over the column.
+    """
+
+    def __init__(self, vocabularies):
+        self.vocabularies = {col: list(vocabularies[col]) for col in CATEGORICAL_COLUMNS}
+        self.codes = {
+            col: {label: code for code, label in enumerate(labels)}
+            for col, labels in self.vocabularies.items()
+        }
+
+    @classmethod
+    def from_label_encoders(cls, label_encoders):
+        return cls({col: [str(label) for label in label_encoders[col].classes_] for col in CATEGORICAL_COLUMNS})
+
+    def encode(self, col, value):
+        """Code of a single label"""
+        try:
+            return self.codes[col][value]
+        except KeyError:
+            raise ValueError(f"Unknown {col} category: {value!r}") from None
+
+    def encode_column(self, col, values):
+        """Codes of a sequence of labels as an integer array"""
+        try:
+            return np.fromiter(map(self.codes[col].__getitem__, values), dtype=np.intp, count=len(values))
+        except KeyError as e:
+            raise ValueError(f"Unknown {col} category: {e.args[0]!r}") from None
+
+    def check(self, label_encoders=None, forest=None):
+        """Validate the table against the API, the label encoders and the model
+
+        Raises ValueError if an accepted label has no code, if a code differs
+        from the one LabelEncoder assigns, or if the forest splits a
+        categorical feature on a code outside the vocabulary.
+        """
+        for col, labels in API_LABELS.items():
+            missing = sorted(set(labels) - set(self.codes[col]))
+            if missing:
+                raise ValueError(f"The model has no code for {col} values {missing}")
+
+        if label_encoders is not None:
+            for col, labels in self.vocabularies.items():
+                expected = label_encoders[col].transform(labels)
+                if not np.array_equal(expected, np.arange(len(labels))):
+                    raise ValueError(f"Codes for {col} differ from the label encoder")
+
+        if forest is not None:
+            if forest.n_features != len(FEATURE_COLUMNS):
+                raise ValueError(f"Model expects {forest.n_features} features, not {len(FEATURE_COLUMNS)}")
+            splits = forest.children[0::2] != np.arange(len(forest.feature))
+            for col in CATEGORICAL_COLUMNS:
+                thresholds = forest.threshold[splits & (forest.feature == FEATURE_COLUMNS.index(col))]
+                if len(thresholds) and thresholds.max() >= len(self.vocabularies[col]) - 1:
+                    raise ValueError(f"Model splits {col} beyond its {len(self.vocabularies[col])} codes")
+
+    def to_dict(self):
+        return {
+            'format_version': ENCODING_FORMAT_VERSION,
+            'columns': CATEGORICAL_COLUMNS,
+            'vocabularies': self.vocabularies,
+        }
+
+    def save(self, f):
+        """Write the table as JSON to a binary file object"""
+        f.write(json.dumps(self.to_dict(), indent=2).encode())
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('format_version') != ENCODING_FORMAT_VERSION:
+            raise ValueError(f"Unsupported encoding format in {path}: {data.get('format_version')}")
+        return cls(data['vocabularies'])
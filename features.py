@@ -0,0 +1,264 @@
+import numpy as np
+
+# Model input columns, in the order the forest was trained on
+FEATURE_COLUMNS = ['age', 'sex', 'bmi', 'children', 'smoker', 'region']
+CATEGORICAL_COLUMNS = ['sex', 'smoker', 'region']
+
+VALID_SEXES = ['male', 'female']
+VALID_SMOKERS = ['yes', 'no']
+VALID_REGIONS = ['southwest', 'southeast', 'northwest', 'northeast']
+
+AGE_RANGE = (18, 100)
+BMI_RANGE = (10, 50)
+CHILDREN_RANGE = (0, 10)
+
+AGE_ERROR = "Age must be between 18 and 100"
+SEX_ERROR = "Sex must be 'male' or 'female'"
+BMI_ERROR = "BMI must be between 10 and 50"
+CHILDREN_ERROR = "Children must be between 0 and 10"
+SMOKER_ERROR = "Smoker must be 'yes' or 'no'"
+REGION_ERROR = f"Region must be one of: {', '.join(VALID_REGIONS)}"
+
+
+# Single-row validation schema in check order: (field, conversion or None for
+# categoricals, numeric range or valid labels, error message)
+FEATURE_SCHEMA = [
+    ('age', float, AGE_RANGE, AGE_ERROR),
+    ('sex', None, VALID_SEXES, SEX_ERROR),
+    ('bmi', float, BMI_RANGE, BMI_ERROR),
+    ('children', int, CHILDREN_RANGE, CHILDREN_ERROR),
+    ('smoker', None, VALID_SMOKERS, SMOKER_ERROR),
+    ('region', None, VALID_REGIONS, REGION_ERROR),
+]
+
+
+class RequestValidator:
+    """Single-row validator compiled once from FEATURE_SCHEMA
+
+    Each field becomes one closure with its bounds or label set bound as
+    locals, so a request runs six calls instead of re-reading module globals
+    and scanning lists. Accepts and rejects exactly what validate_features()
+    does, with the same messages.
+    """
+
+    def __init__(self, schema=FEATURE_SCHEMA):
+        self.fields = tuple(field for field, _, _, _ in schema)
+        self._checks = tuple(self._compile(*spec) for spec in schema)
+
+    @staticmethod
+    def _compile(field, convert, allowed, message):
+        if convert is None:
+            labels = frozenset(allowed)
+
+            def check(data):
+                value = data[field]
+                # The type test keeps unhashable values out of the set lookup;
+                # only strings could equal a label anyway
+                if not (isinstance(value, str) and value in labels):
+                    raise ValueError(message)
+                return value
+        else:
+            low, high = allowed
+
+            def check(data):
+                value = convert(data[field])
+                if not (low <= value <= high):
+                    raise ValueError(message)
+                return value
+        return check
+
+    def missing(self, data):
+        """Return the first required field missing from a request, or None"""
+        for field in self.fields:
+            if field not in data:
+                return field
+        return None
+
+    def validate(self, data):
+        """Return the typed feature values; raises ValueError/TypeError like validate_features()"""
+        return tuple([check(data) for check in self._checks])
+
+
+def find_missing_field(data):
+    """Return the first required field missing from a request, or None"""
+    for field in FEATURE_COLUMNS:
+        if field not in data:
+            return field
+    return None
+
+
+def validate_features(data):
+    """Validate a single applicant and return its typed feature values
+
+    Raises ValueError/TypeError with a user-facing message on invalid input.
+    """
+    age = float(data['age'])
+    if not (AGE_RANGE[0] <= age <= AGE_RANGE[1]):
+        raise ValueError(AGE_ERROR)
+
+    sex = data['sex']
+    if sex not in VALID_SEXES:
+        raise ValueError(SEX_ERROR)
+
+    bmi = float(data['bmi'])
+    if not (BMI_RANGE[0] <= bmi <= BMI_RANGE[1]):
+        raise ValueError(BMI_ERROR)
+
+    children = int(data['children'])
+    if not (CHILDREN_RANGE[0] <= children <= CHILDREN_RANGE[1]):
+        raise ValueError(CHILDREN_ERROR)
+
+    smoker = data['smoker']
+    if smoker not in VALID_SMOKERS:
+        raise ValueError(SMOKER_ERROR)
+
+    region = data['region']
+    if region not in VALID_REGIONS:
+        raise ValueError(REGION_ERROR)
+
+    return age, sex, bmi, children, smoker, region
+
+
+def _convert_column(values, dtype, convert):
+    """Convert a column of raw JSON values, collecting per-row conversion errors"""
+    # Fast path: one C-level conversion for the whole column. NumPy turns None
+    # into NaN for floats, so leave those columns to the per-row path below to
+    # keep the same error messages as the single-row endpoint.
+    if None not in values:
+        try:
+            return np.fromiter(values, dtype=dtype, count=len(values)), {}
+        except (ValueError, TypeError, OverflowError):
+            pass
+
+    column = np.zeros(len(values), dtype=dtype)
+    errors = {}
+    for i, value in enumerate(values):
+        try:
+            value = convert(value)
+        except (ValueError, TypeError, OverflowError) as e:
+            errors[i] = str(e)
+            continue
+        try:
+            column[i] = value
+        except OverflowError:
+            # Beyond the column dtype, hence beyond any range check; clamp so
+            # the row gets the range message the single-row check gives
+            limits = np.iinfo(dtype)
+            column[i] = limits.max if value > 0 else limits.min
+    return column, errors
+
+
+def _check_range(column, bounds, message, errors):
+    """Record a range error for every row whose value falls outside bounds"""
+    low, high = bounds
+    # NaN fails both comparisons, matching the single-row check
+    bad = ~((column >= low) & (column <= high))
+    for i in np.flatnonzero(bad):
+        errors.setdefault(int(i), message)
+
+
+def _check_choices(values, choices, message, errors):
+    """Record an error for every row whose value is not one of choices"""
+    for i, value in enumerate(values):
+        if i not in errors and not (isinstance(value, str) and value in choices):
+            errors[i] = message
+
+
+def validate_batch(records):
+    """Validate a list of applicants column-wise
+
+    Returns (columns, errors) where columns maps each feature name to an array
+    (numeric) or list (categorical) of values for every row, and errors maps the
+    index of each rejected row to an (error, message) pair. Rows report the same
+    first failure as validate_features() would.
+    """
+    errors = {}
+
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            errors[i] = ('Invalid record', 'Each applicant must be a JSON object')
+            continue
+        missing = find_missing_field(record)
+        if missing is not None:
+            errors[i] = ('Missing field', f'Missing required field: {missing}')
+
+    rows = [record if i not in errors else {} for i, record in enumerate(records)]
+    raw = {col: [row.get(col, 0 if col not in CATEGORICAL_COLUMNS else '') for row in rows]
+           for col in FEATURE_COLUMNS}
+    return validate_columns(raw, errors)
+
+
+def validate_columns(raw, errors=None):
+    """Validate applicants given as one sequence of raw values per feature
+
+    Used by validate_batch() and for tabular input such as CSV chunks, where
+    the values are already laid out column by column. Returns (columns,
+    errors) like validate_batch(); rows already in ``errors`` are skipped.
+    """
+    errors = {} if errors is None else errors
+
+    # Validation errors are collected in the same order validate_features()
+    # checks the fields, so setdefault keeps only the first failure per row.
+    validation = {i: None for i in errors}
+
+    age, conversion_errors = _convert_column(raw['age'], np.float64, float)
+    for i, message in conversion_errors.items():
+        validation.setdefault(i, message)
+    _check_range(age, AGE_RANGE, AGE_ERROR, validation)
+
+    _check_choices(raw['sex'], VALID_SEXES, SEX_ERROR, validation)
+
+    bmi, conversion_errors = _convert_column(raw['bmi'], np.float64, float)
+    for i, message in conversion_errors.items():
+        validation.setdefault(i, message)
+    _check_range(bmi, BMI_RANGE, BMI_ERROR, validation)
+
+    children, conversion_errors = _convert_column(raw['children'], np.int64, int)
+    for i, message in conversion_errors.items():
+        validation.setdefault(i, message)
+    _check_range(children, CHILDREN_RANGE, CHILDREN_ERROR, validation)
+
+    _check_choices(raw['smoker'], VALID_SMOKERS, SMOKER_ERROR, validation)
+    _check_choices(raw['region'], VALID_REGIONS, REGION_ERROR, validation)
+
+    for i, message in validation.items():
+        if i not in errors:
+            errors[i] = ('Validation error', message)
+
+    columns = {
+        'age': age,
+        'sex': raw['sex'],
+        'bmi': bmi,
+        'children': children,
+        'smoker': raw['smoker'],
+        'region': raw['region'],
+    }
+    return columns, errors
+
+
+def encode_row(encoding, age, sex, bmi, children, smoker, region):
+    """Feature row of one validated applicant, in FEATURE_COLUMNS order"""
+    return [
+        age,
+        encoding.encode('sex', sex),
+        bmi,
+        children,
+        encoding.encode('smoker', smoker),
+        encoding.encode('region', region),
+    ]
+
+
+def encode_batch(columns, encoding, rows):
+    """Build the model feature matrix for the given row indices
+
+    Categorical columns are encoded with one pass over each column of the
+    CategoricalEncoding table.
+    """
+    X = np.empty((len(rows), len(FEATURE_COLUMNS)), dtype=np.float64)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        values = columns[col]
+        if col in CATEGORICAL_COLUMNS:
+            X[:, j] = encoding.encode_column(col, np.asarray(values, dtype=object)[rows])
+        else:
+            X[:, j] = values[rows]
+    return X
@@ -0,0 +1,123 @@
+import json
+import os
+
+import numpy as np
+
+from features import AGE_RANGE, BMI_RANGE, CHILDREN_RANGE
+
+# Grid points scored per predict() call while building the table
+BUILD_CHUNK_SIZE = 65536
+
+
+def _axis(bounds, step):
+    """Evenly spaced grid points covering bounds, always including both ends"""
+    low, high = bounds
+    count = int(np.ceil((high - low) / step)) + 1
+    return np.linspace(low, low + (count - 1) * step, count)
+
+
+def _coordinate(values, low, step, size):
+    """Lower grid index and interpolation weight along one axis"""
+    position = (values - low) / step
+    lower = np.clip(np.floor(position), 0, size - 2).astype(np.intp)
+    weight = np.clip(position - lower, 0.0, 1.0)
+    return lower, weight
+
+
+class PredictionGrid:
+    """Precomputed model outputs over the discrete feature space
+
+    Sex, smoker, region and children are enumerated exactly. Age and BMI are
+    sampled on a regular grid and answered by bilinear interpolation. The
+    table is a single float32 .npy file that is memory-mapped on load, so every
+    worker process shares one copy through the page cache.
+
+    ``predict`` takes the same encoded feature matrix as the forest:
+    [age, sex, bmi, children, smoker, region].
+    """
+
+    def __init__(self, table, age_axis, bmi_axis, max_error=None, mean_error=None):
+        self.table = table
+        self.age_min, self.age_step = float(age_axis[0]), float(age_axis[1] - age_axis[0])
+        self.bmi_min, self.bmi_step = float(bmi_axis[0]), float(bmi_axis[1] - bmi_axis[0])
+        self.n_sex, self.n_smoker, self.n_region, self.n_children, self.n_age, self.n_bmi = table.shape
+        self.max_error = max_error
+        self.mean_error = mean_error
+        # (category block, age, bmi) view used for indexing
+        self.blocks = table.reshape(-1, self.n_age, self.n_bmi)
+
+    @classmethod
+    def build(cls, predict, encoding, path, age_step=1.0, bmi_step=0.5):
+        """Score every grid point with predict() and write the table to path"""
+        age_axis = _axis(AGE_RANGE, age_step)
+        bmi_axis = _axis(BMI_RANGE, bmi_step)
+        children_axis = np.arange(CHILDREN_RANGE[0], CHILDREN_RANGE[1] + 1)
+        shape = (
+            len(encoding.vocabularies['sex']),
+            len(encoding.vocabularies['smoker']),
+            len(encoding.vocabularies['region']),
+            len(children_axis),
+            len(age_axis),
+            len(bmi_axis),
+        )
+
+        # Write into a temporary memory-mapped file so the table never has to
+        # be held in memory as a whole, then move it into place
+        tmp_path = f"{path}.tmp"
+        table = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32, shape=shape)
+        flat = table.reshape(-1)
+        for start in range(0, flat.size, BUILD_CHUNK_SIZE):
+            points = np.arange(start, min(start + BUILD_CHUNK_SIZE, flat.size))
+            sex, smoker, region, children, age, bmi = np.unravel_index(points, shape)
+            X = np.column_stack([
+                age_axis[age], sex, bmi_axis[bmi], children_axis[children], smoker, region
+            ]).astype(np.float64)
+            flat[start:start + len(X)] = predict(X)
+        table.flush()
+        del table, flat
+
+        with open(f"{path}.json", 'w') as f:
+            json.dump({'age_axis': age_axis.tolist(), 'bmi_axis': bmi_axis.tolist()}, f)
+        os.replace(tmp_path, path)
+        return cls.load(path)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a table written by build()"""
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        table = np.load(path, mmap_mode='r')
+        return cls(table, meta['age_axis'], meta['bmi_axis'], meta.get('max_error'), meta.get('mean_error'))
+
+    def record_error(self, path, predict, X):
+        """Measure the deviation from predict() on X and store it with the table
+
+        The forest fits individual training rows closely, so the maximum error
+        is dominated by narrow spikes between BMI grid points; the mean error
+        is recorded alongside it.
+        """
+        X = np.asarray(X, dtype=np.float64)
+        error = np.abs(self.predict(X) - predict(X))
+        self.max_error = float(np.max(error, initial=0.0))
+        self.mean_error = float(np.mean(error)) if len(error) else 0.0
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        meta['max_error'] = self.max_error
+        meta['mean_error'] = self.mean_error
+        with open(f"{path}.json", 'w') as f:
+            json.dump(meta, f)
+        return self.max_error, self.mean_error
+
+    def predict(self, X):
+        """Look up and interpolate predictions for an encoded feature matrix"""
+        X = np.asarray(X, dtype=np.float64)
+        age, sex, bmi, children, smoker, region = X.T
+        block = (((sex.astype(np.intp) * self.n_smoker + smoker.astype(np.intp)) * self.n_region
+                  + region.astype(np.intp)) * self.n_children + children.astype(np.intp))
+
+        i, ta = _coordinate(age, self.age_min, self.age_step, self.n_age)
+        j, tb = _coordinate(bmi, self.bmi_min, self.bmi_step, self.n_bmi)
+
+        blocks = self.blocks
+        return ((blocks[block, i, j] * (1 - tb) + blocks[block, i, j + 1] * tb) * (1 - ta)
+                + (blocks[block, i + 1, j] * (1 - tb) + blocks[block, i + 1, j + 1] * tb) * ta)
@@ -1,13 +1,21 @@
-import multiprocessing
 import os
+import sys
+
+# The config file is loaded before gunicorn puts the app directory on sys.path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from concurrency import (WORKER_SLOT_VAR, assign_worker_slot, default_workers,  # noqa: E402
+                         limit_native_threads)
 
 # Server socket
 bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# Worker processes; python concurrency.py tune recommends WORKERS and
+# INFERENCE_THREADS for the host
+workers = int(os.environ.get('WORKERS') or default_workers())
+# Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker and serve asgi:app
+# for the async entry point with micro-batched predictions
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
@@ -43,4 +51,41 @@ limit_request_fields = 100
 limit_request_field_size = 8190
 
 # Performance
-worker_tmp_dir = '/dev/shm' 
\ No newline at end of file
+worker_tmp_dir = '/dev/shm'
+
+# Cap every worker's BLAS/OpenMP pools at INFERENCE_THREADS before the app
+# (and NumPy) is imported, so workers x threads never oversubscribe the host
+limit_native_threads(int(os.environ.get('INFERENCE_THREADS', '1')))
+
+# Prometheus multiprocess mode: every worker writes its samples to this
+# directory and /metrics aggregates them. It must be set before the app
+# (and prometheus_client) is imported; on_starting clears out the previous run.
+prometheus_multiproc_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-multiproc')
+os.makedirs(prometheus_multiproc_dir, exist_ok=True)
+
+def on_starting(server):
+    # Runs once in the master, unlike this file, which gunicorn reloads on
+    # SIGHUP while workers still write their samples. With preload_app the
+    # master has already loaded the app, so its own files are kept.
+    own_suffix = f'_{os.getpid()}.db'
+    for name in os.listdir(prometheus_multiproc_dir):
+        if name.endswith('.db') and not name.endswith(own_suffix):
+            os.remove(os.path.join(prometheus_multiproc_dir, name))
+
+# Per-process files (logs, profiles) are named after the worker slot, not the
+# pid, so recycling a worker every max_requests does not leave a new set behind
+os.environ[WORKER_SLOT_VAR] = 'master'
+pre_fork = assign_worker_slot
+
+def post_fork(server, worker):
+    os.environ[WORKER_SLOT_VAR] = f'worker{worker.slot}'
+
+def worker_exit(server, worker):
+    # Runs in the exiting worker, unlike atexit handlers when gunicorn stops it
+    profiler = sys.modules.get('profiler')
+    if profiler is not None:
+        profiler.dump_running()
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid) 
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""Logging off the request path
+
+Request threads only put records on a bounded queue. A writer thread per
+process formats them and appends them to that process's own log file in
+batches, so gunicorn workers never share a file and rotation never renames
+a file another process is writing. Routine success logs can be sampled;
+warnings and errors are always kept.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+from logging.handlers import RotatingFileHandler
+
+from concurrency import worker_slot
+
+# Written to the queue to stop the writer
+_STOP = None
+
+
+def process_log_path(path, slot=None):
+    """Log file of one process: logs/app.log becomes e.g. logs/app.worker0.log
+
+    ``slot`` defaults to worker_slot(), so a recycled gunicorn worker's
+    successor appends to the same file and rotation set.
+    """
+    root, ext = os.path.splitext(path)
+    return f'{root}.{slot or worker_slot()}{ext}'
+
+
+def should_sample(rate):
+    """Whether to keep a routine log line logged at ``rate`` (0 to 1)"""
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class QueueLogHandler(logging.Handler):
+    """Hand records to a writer thread instead of writing them
+
+    A record is queued as it is and only formatted by the writer. When the
+    queue is full, records below WARNING are dropped and counted in
+    ``dropped``; warnings and errors wait up to ``put_timeout`` seconds for
+    room and are dropped too if the writer is stuck. The queue, writer thread
+    and file are created per process on first use, so the handler can be
+    set up before gunicorn forks its workers.
+    """
+
+    def __init__(self, path, max_bytes=10240000, backup_count=10, queue_size=10000, batch_size=256,
+                 per_process=True, put_timeout=0.5, level=logging.NOTSET):
+        super().__init__(level)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.per_process = per_process
+        self.put_timeout = put_timeout
+        self.dropped = 0
+        # Records that could not be formatted or written
+        self.write_errors = 0
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    def _start(self):
+        """Open this process's file and start its writer; call with the handler lock held"""
+        path = process_log_path(self.path) if self.per_process else self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Only the writer thread of this process touches the file, so rollover is safe
+        file = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backup_count)
+        file.setFormatter(self.formatter)
+        self._queue = queue.Queue(self.queue_size)
+        self._thread = threading.Thread(target=self._write, args=(self._queue, file),
+                                        name='log-writer', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def emit(self, record):
+        if self._pid != os.getpid():
+            self._start()
+        if record.exc_info and not record.exc_text:
+            # Tracebacks reference live frames; render them while they are accurate
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.WARNING:
+                self.dropped += 1
+                return
+            # A stalled disk must not hold request threads for longer than this
+            try:
+                self._queue.put(record, timeout=self.put_timeout)
+            except queue.Full:
+                self.dropped += 1
+
+    def _write(self, records, file):
+        """Writer thread: append queued records in batches with one write and flush each"""
+        while True:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is not _STOP:
+                    try:
+                        lines.append(file.format(record) + file.terminator)
+                    except Exception:
+                        self.write_errors += 1
+            try:
+                if lines:
+                    if self.max_bytes and file.stream.tell() >= self.max_bytes:
+                        file.doRollover()
+                    file.stream.write(''.join(lines))
+                    file.stream.flush()
+            except Exception:
+                self.write_errors += 1
+            if _STOP in batch:
+                file.close()
+                return
+
+    def close(self):
+        """Write what is queued and stop the writer; logging.shutdown() calls this at exit"""
+        if self._pid == os.getpid() and self._thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=5)
+                self._thread.join(5)
+            except queue.Full:
+                pass
+        self._pid = None
+        super().close()
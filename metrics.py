@@ -0,0 +1,91 @@
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+                               Histogram, generate_latest, multiprocess)
+
+# Metrics are module level so every part of the service (Flask app, ASGI entry
+# point, training process) records into the same series. Flask is only
+# imported by init_app(), so a training run can record without it. Under gunicorn,
+# PROMETHEUS_MULTIPROC_DIR is set before this module is imported (see
+# gunicorn.conf.py) and each process writes its samples there; /metrics then
+# aggregates all of them.
+
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 10000)
+MODEL_BUCKETS = STAGE_BUCKETS + (0.25, 0.5, 1.0, 2.5)
+SHADOW_DIFFERENCE_BUCKETS = (0.01, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request duration',
+                            ['method', 'endpoint'], buckets=REQUEST_BUCKETS)
+
+PREDICTIONS = Counter('predictions_total', 'Total predictions made', ['engine'])
+STAGE_LATENCY = Histogram('prediction_stage_duration_seconds', 'Time spent in each stage of a prediction',
+                          ['stage'], buckets=STAGE_BUCKETS)
+PARSE = STAGE_LATENCY.labels('parse')
+VALIDATE = STAGE_LATENCY.labels('validate')
+ENCODE = STAGE_LATENCY.labels('encode')
+PREDICT = STAGE_LATENCY.labels('predict')
+SERIALIZE = STAGE_LATENCY.labels('serialize')
+
+BATCH_SIZE = Histogram('prediction_batch_size', 'Rows scored per model call', ['source'],
+                       buckets=BATCH_SIZE_BUCKETS)
+
+# Per model of the registry; role is 'primary' or 'shadow'
+MODEL_PREDICT_LATENCY = Histogram('model_predict_duration_seconds', 'Model call duration per registry model',
+                                  ['model', 'role'], buckets=MODEL_BUCKETS)
+SHADOW_DIFFERENCE = Histogram('shadow_prediction_difference_usd',
+                              'Absolute difference between shadow and primary predictions',
+                              buckets=SHADOW_DIFFERENCE_BUCKETS)
+SHADOW_DROPPED = Counter('shadow_requests_dropped_total', 'Shadow scoring skipped because the queue was full')
+
+RATE_LIMITED = Counter('rate_limited_requests_total', 'Requests rejected by the rate limiter', ['endpoint'])
+
+CACHE_LOOKUPS = Counter('prediction_cache_lookups_total', 'Prediction cache lookups', ['result'])
+CACHE_HITS = CACHE_LOOKUPS.labels('hit')
+CACHE_MISSES = CACHE_LOOKUPS.labels('miss')
+
+MODEL_LOAD_SECONDS = Gauge('model_load_duration_seconds', 'Duration of the most recent model load',
+                           multiprocess_mode='mostrecent')
+TRAINING_SECONDS = Gauge('model_training_duration_seconds', 'Duration of the most recent training run',
+                         multiprocess_mode='mostrecent')
+
+
+def init_app(app):
+    """Count and time every request handled by a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if 'metrics_start' in g:
+            # The URL rule keeps the label set bounded (e.g. /train/<job_id>)
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe_request(request.method, endpoint, response.status_code, time.perf_counter() - g.metrics_start)
+        return response
+
+
+def observe_request(method, endpoint, status, duration):
+    REQUEST_COUNT.labels(method, endpoint, str(status)).inc()
+    REQUEST_LATENCY.labels(method, endpoint).observe(duration)
+
+
+def latest():
+    """Exposition of all metrics, aggregated across processes in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop the live gauges of an exited worker; call from gunicorn's child_exit hook"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
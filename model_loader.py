@@ -0,0 +1,101 @@
+"""Change-aware loading of model artifacts
+
+Both entry points check their artifacts on every request. Reading them
+every time is what app.py used to do; instead a FileWatcher stat()s the
+files at most every few milliseconds and a reload happens only when a file
+was actually replaced or rewritten.
+"""
+import os
+import threading
+import time
+
+# Marker of a ChangeAwareLoader that has not loaded yet
+_UNLOADED = object()
+
+
+def file_signature(path):
+    """(inode, mtime in ns, size) of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class FileWatcher:
+    """Change marker of a set of files, stat()ed at most every ``interval_ms``
+
+    The marker is the file_signature() of every path, so an atomic rename as
+    well as an in-place rewrite changes it. Between checks the previous
+    marker is returned without touching the filesystem; ``refresh`` forces a
+    check, e.g. right after publishing in the same process. ``checks`` counts
+    the checks made so far.
+    """
+
+    def __init__(self, paths, interval_ms=0):
+        self.paths = list(paths)
+        self.interval = interval_ms / 1000
+        self.checks = 0
+        self._checked = None
+        self._signature = None
+
+    def signature(self, refresh=False):
+        now = time.monotonic()
+        if refresh or self._checked is None or now - self._checked >= self.interval:
+            self._signature = tuple(file_signature(path) for path in self.paths)
+            self._checked = now
+            self.checks += 1
+        return self._signature
+
+
+class ChangeAwareLoader:
+    """A value loaded from files, loaded again only when they change
+
+    ``load()`` runs on first use and whenever the FileWatcher marker of
+    ``paths`` differs from the one it last ran at. With ``together``, the
+    files are published as a set, one rename after the other, and a reload
+    waits until two checks in a row see the same marker, so a model is not
+    paired with the encoders of a publish still in progress; a ``refresh``
+    after publishing in the same process loads at once. A load during which the
+    files change again is discarded, and they are read again on the next
+    call that sees them changed. If it raises, the previous value is kept
+    and the files are not read again until they change.
+    """
+
+    def __init__(self, paths, load, interval_ms=0, together=False):
+        self.watcher = FileWatcher(paths, interval_ms)
+        self.together = together
+        self._load = load
+        self._lock = threading.Lock()
+        self._loaded_at = _UNLOADED
+        # (marker, check) at which a changed marker was first seen, with together
+        self._pending = None
+        self.value = None
+        self.loads = 0
+
+    def _changed(self, signature):
+        return self._loaded_at is _UNLOADED or signature != self._loaded_at
+
+    def _settled(self, signature, refresh):
+        """Whether a changed marker can be loaded: with together, once a later check saw it too"""
+        if not self.together or refresh or self._loaded_at is _UNLOADED:
+            return True
+        if self._pending is None or self._pending[0] != signature:
+            self._pending = (signature, self.watcher.checks)
+            return False
+        return self.watcher.checks > self._pending[1]
+
+    def get(self, refresh=False):
+        """The loaded value, reloaded first if the files changed since the last load"""
+        signature = self.watcher.signature(refresh)
+        if self._changed(signature):
+            with self._lock:
+                if self._changed(signature) and self._settled(signature, refresh):
+                    try:
+                        value = self._load()
+                        if self.watcher.signature(refresh=True) == signature:
+                            self.value = value
+                            self.loads += 1
+                    finally:
+                        self._loaded_at = signature
+        return self.value
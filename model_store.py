@@ -0,0 +1,369 @@
+import contextlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from concurrency import inference_jobs
+from encoding import CategoricalEncoding
+from model_loader import FileWatcher
+from tree_engine import CompiledForest
+from grid import PredictionGrid
+
+# Artifact file names inside a version directory
+MODEL_FILE = 'model.pkl'
+ENCODERS_FILE = 'label_encoders.pkl'
+ENCODING_FILE = 'encoding.json'
+FOREST_FILE = 'forest.bin'
+GRID_FILE = 'grid.npy'
+TRAINING_FILE = 'training.json'
+
+# Job statuses after which a training job no longer runs
+FINAL_JOB_STATUSES = ('succeeded', 'failed')
+
+
+def process_alive(pid):
+    """Whether a process with this id exists on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def write_atomic(path, write):
+    """Write a file via a temporary file and rename, so readers never see it half-written
+
+    ``write`` is called with a binary file object.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class LoadedModel:
+    """A fully loaded artifact set, swapped into place as a single reference
+
+    When a compiled forest is available the sklearn pickle is only unpickled
+    if something asks for ``model``, so serving workers never hold a private
+    copy of the full forest and never import sklearn.
+    """
+
+    def __init__(self, version, encoding, forest=None, grid=None, model=None, model_path=None, forest_path=None,
+                 threads=1, parallel_min_rows=1000):
+        self.version = version
+        self.encoding = encoding
+        self.forest = forest
+        self.grid = grid
+        self._model = model
+        self._model_path = model_path
+        self._forest_path = forest_path
+        self._walker = None
+        # sklearn calls on at least parallel_min_rows rows may use this many threads
+        self.threads = threads
+        self.parallel_min_rows = parallel_min_rows
+        # Set by the ModelRegistry that loaded it
+        self.name = None
+        self.latency = {}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with open(self._model_path, 'rb') as f:
+                model = pickle.load(f)
+            # Pickled with the training parallelism; predict() picks it per call
+            model.n_jobs = None
+            self._model = model
+        return self._model
+
+    @property
+    def engine(self):
+        if self.grid is not None:
+            return 'grid'
+        if self.forest is not None:
+            return 'compiled'
+        return 'sklearn'
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by this version, counted against the registry's budget
+
+        An unpickled sklearn model is counted at the size of its pickle.
+        """
+        total = sum(forest.nbytes for forest in (self.forest, self._walker) if forest is not None)
+        if self.grid is not None:
+            total += self.grid.table.nbytes
+        if self._model is not None and self._model_path is not None and os.path.exists(self._model_path):
+            total += os.path.getsize(self._model_path)
+        return total
+
+    def predict(self, features):
+        """Score a feature matrix with the most specialised engine available"""
+        if self.grid is not None:
+            return self.grid.predict(features)
+        if self.forest is not None:
+            return self.forest.predict(features)
+        jobs = inference_jobs(len(features), self.threads, self.parallel_min_rows)
+        if jobs == 1:
+            return self.model.predict(features)
+        from joblib import parallel_backend
+        with parallel_backend('threading', n_jobs=jobs):
+            return self.model.predict(features)
+
+    def _tree_walker(self):
+        """Compiled forest for explanations and quantiles, which always walk the trees
+
+        When not serving from the compiled forest, it is memory-mapped from the
+        version on first use, or exported from the sklearn model if the
+        version has none.
+        """
+        if self.forest is not None:
+            return self.forest
+        if self._walker is None:
+            if self._forest_path is not None and os.path.exists(self._forest_path):
+                self._walker = CompiledForest.load(self._forest_path)
+            else:
+                self._walker = CompiledForest.from_sklearn(self.model)
+        return self._walker
+
+    @property
+    def has_quantiles(self):
+        """Whether score() can return quantiles
+
+        Leaf quantiles are fitted by training and stored in the version's
+        forest.bin; a forest exported from the sklearn model has none.
+        """
+        if self.forest is None and (self._forest_path is None or not os.path.exists(self._forest_path)):
+            return False
+        return self._tree_walker().leaf_quantiles is not None
+
+    def score(self, features, explain=False, quantiles=None):
+        """(predictions, explanation, quantile values) of a feature matrix, see CompiledForest.score()
+
+        Also used in grid mode, where the predictions come from the forest.
+        """
+        return self._tree_walker().score(features, explain, quantiles)
+
+    def explain(self, features):
+        """(predictions, bias, contributions) of a feature matrix, see CompiledForest.explain()"""
+        return self._tree_walker().explain(features)
+
+
+class ModelStore:
+    """Versioned model artifacts under one directory
+
+    Every version lives in its own directory and the CURRENT file names the
+    published one. A version is written to a staging directory, renamed into
+    place and only then published by atomically replacing CURRENT, so a reader
+    always finds a complete artifact set. Workers notice a new version by
+    stat()ing CURRENT, at most every ``check_interval_ms``, which is far
+    cheaper than reading any artifact.
+
+    Training job status files live under ``jobs/`` so any worker can answer a
+    status request for a job started by another, and the parsed training
+    dataset is cached under ``datasets/``. At most one job runs at a time;
+    ``jobs/ACTIVE`` names it and the process running it, which is assumed
+    to be on this host.
+    """
+
+    def __init__(self, root, check_interval_ms=0):
+        self.root = root
+        self.current_path = os.path.join(root, 'CURRENT')
+        self._watcher = FileWatcher([self.current_path], check_interval_ms)
+        self.jobs_dir = os.path.join(root, 'jobs')
+        self.active_job_path = os.path.join(self.jobs_dir, 'ACTIVE')
+        self.datasets_dir = os.path.join(root, 'datasets')
+
+    def new_version(self):
+        """Return a fresh, chronologically sortable version id"""
+        return f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+    def version_dir(self, version):
+        return os.path.join(self.root, version)
+
+    def staging_dir(self, version):
+        """Create and return the directory a new version is written into"""
+        path = os.path.join(self.root, f'.staging-{version}')
+        os.makedirs(path)
+        return path
+
+    def publish(self, version):
+        """Move a staged version into place and make it the current one"""
+        os.rename(os.path.join(self.root, f'.staging-{version}'), self.version_dir(version))
+        write_atomic(self.current_path, lambda f: f.write(version.encode()))
+
+    def current_version(self):
+        """Name of the published version, or None if nothing was published yet"""
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def generation(self, refresh=False):
+        """Cheap change marker for CURRENT, or None if it does not exist
+
+        Between checks the last marker is returned; ``refresh`` forces a stat().
+        """
+        return self._watcher.signature(refresh)[0]
+
+    def load(self, version, engine='compiled', grid_mode=False, threads=1, parallel_min_rows=1000):
+        """Load a version's serving artifacts into a LoadedModel, see LoadedModel for the thread budget"""
+        path = self.version_dir(version)
+        encoding_path = os.path.join(path, ENCODING_FILE)
+        if os.path.exists(encoding_path):
+            encoding = CategoricalEncoding.load(encoding_path)
+        else:
+            # Versions published before the encoding table existed
+            with open(os.path.join(path, ENCODERS_FILE), 'rb') as f:
+                encoding = CategoricalEncoding.from_label_encoders(pickle.load(f))
+        forest_path = os.path.join(path, FOREST_FILE)
+        loaded = LoadedModel(version, encoding, model_path=os.path.join(path, MODEL_FILE), forest_path=forest_path,
+                             threads=threads, parallel_min_rows=parallel_min_rows)
+
+        if engine == 'compiled':
+            if os.path.exists(forest_path):
+                loaded.forest = CompiledForest.load(forest_path)
+            else:
+                loaded.forest = CompiledForest.from_sklearn(loaded.model)
+
+        grid_path = os.path.join(path, GRID_FILE)
+        if grid_mode and os.path.exists(grid_path):
+            loaded.grid = PredictionGrid.load(grid_path)
+
+        return loaded
+
+    def training_info(self, version):
+        """How a version was trained (source hash, rows, trees), or None if not recorded"""
+        try:
+            with open(os.path.join(self.version_dir(version), TRAINING_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def versions(self):
+        """Names of all complete versions, oldest first"""
+        try:
+            names = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            name for name in names
+            if not name.startswith('.') and name not in ('CURRENT', 'jobs', 'datasets')
+            and os.path.isdir(os.path.join(self.root, name))
+        )
+
+    def prune(self, keep):
+        """Delete all but the newest ``keep`` versions, never the current one"""
+        current = self.current_version()
+        versions = self.versions()
+        for version in versions[:-keep] if keep > 0 else versions:
+            if version != current:
+                shutil.rmtree(self.version_dir(version), ignore_errors=True)
+
+    def _job_path(self, job_id):
+        if not job_id.isalnum():
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+
+    def create_job(self, settings):
+        """Record a queued training job and return its id"""
+        job_id = uuid.uuid4().hex
+        self._write_job(job_id, {
+            'job_id': job_id,
+            'status': 'queued',
+            'created_at': time.time(),
+            'settings': settings,
+        })
+        return job_id
+
+    @contextlib.contextmanager
+    def _jobs_lock(self):
+        """Serialize job starts across the processes sharing this store"""
+        os.makedirs(self.jobs_dir, exist_ok=True)
+        with open(os.path.join(self.jobs_dir, '.lock'), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def start_job(self, settings, launch):
+        """Queue a training job and launch it, unless one is active already
+
+        ``launch(job_id)`` starts the process that runs the job and returns
+        its pid. Returns (job_id, started): the new job and True, or the
+        active job and False.
+        """
+        with self._jobs_lock():
+            active = self.active_job()
+            if active is not None:
+                return active, False
+            job_id = self.create_job(settings)
+            try:
+                pid = launch(job_id)
+            except Exception as e:
+                self.fail_job(job_id, f"Training process could not be started: {str(e)}")
+                raise
+            write_atomic(self.active_job_path, lambda f: f.write(json.dumps({'job_id': job_id, 'pid': pid}).encode()))
+        return job_id, True
+
+    def active_job(self):
+        """Id of the queued or running training job, or None
+
+        A job whose process is gone without recording a final status is
+        marked failed and no longer active.
+        """
+        try:
+            with open(self.active_job_path) as f:
+                active = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        job = self.read_job(active['job_id'])
+        if job is None or job['status'] in FINAL_JOB_STATUSES:
+            return None
+        if not process_alive(active['pid']):
+            self.fail_job(active['job_id'], 'Training process exited without recording a status')
+            return None
+        return active['job_id']
+
+    def fail_job(self, job_id, error):
+        """Mark a job failed unless it recorded a final status itself"""
+        job = self.read_job(job_id)
+        if job is not None and job['status'] not in FINAL_JOB_STATUSES:
+            self.update_job(job_id, status='failed', finished_at=time.time(), error=error)
+
+    def update_job(self, job_id, **fields):
+        job = self.read_job(job_id) or {'job_id': job_id}
+        job.update(fields)
+        self._write_job(job_id, job)
+        return job
+
+    def read_job(self, job_id):
+        """Return a job's status record, or None if it does not exist"""
+        try:
+            with open(self._job_path(job_id)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_job(self, job_id, job):
+        write_atomic(self._job_path(job_id), lambda f: f.write(json.dumps(job).encode()))
@@ -0,0 +1,39 @@
+"""No-op stand-in for the metrics module, used when ENABLE_METRICS is false
+
+It has the same names as metrics, so callers record the same way either way,
+without importing prometheus_client or timing anything.
+"""
+from contextlib import nullcontext
+
+
+class NullMetric:
+    """Accepts every recording call of a prometheus_client metric and drops it"""
+
+    def labels(self, *labelvalues, **labelkwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+    def set(self, value):
+        pass
+
+    def time(self):
+        return nullcontext()
+
+
+REQUEST_COUNT = REQUEST_LATENCY = NullMetric()
+PREDICTIONS = NullMetric()
+STAGE_LATENCY = PARSE = VALIDATE = ENCODE = PREDICT = SERIALIZE = NullMetric()
+BATCH_SIZE = NullMetric()
+MODEL_PREDICT_LATENCY = SHADOW_DIFFERENCE = SHADOW_DROPPED = NullMetric()
+RATE_LIMITED = NullMetric()
+CACHE_LOOKUPS = CACHE_HITS = CACHE_MISSES = NullMetric()
+MODEL_LOAD_SECONDS = TRAINING_SECONDS = NullMetric()
+
+
+def observe_request(method, endpoint, status, duration):
+    pass
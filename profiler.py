@@ -0,0 +1,293 @@
+"""Low-overhead diagnostics for a running worker
+
+SamplingProfiler looks at every thread's stack on a timer and counts the
+stacks it sees, in the collapsed format flamegraph.pl and speedscope read.
+AdaptiveTraceSampler makes Sentry trace only a small share of requests,
+plus all of them on an endpoint that was recently slow or failing, and
+sends only the traces of requests that were slow or failed.
+
+Merge the per-worker profiles written to PROFILER_OUTPUT_DIR with:
+    python profiler.py profiles/*.folded > profile.folded
+    flamegraph.pl profile.folded > profile.svg
+"""
+import argparse
+import atexit
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from concurrency import worker_slot
+from model_store import write_atomic
+
+# Stacks beyond this many distinct ones are counted under one entry
+MAX_STACKS = 50000
+TRUNCATED_STACK = ('[truncated]', ())
+
+# Profilers sampling in this process, dumped by dump_running()
+_running = set()
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler for the threads of one process
+
+    A daemon thread wakes ``hz`` times per second and counts the current
+    stack of every other thread, keyed by its code objects; frames are only
+    turned into ``thread;frame;frame`` text on export. Each sample holds the
+    GIL only for the walk over the stacks, so the cost grows with ``hz`` and
+    not with the request rate. The thread is started
+    per process on first use, so the profiler can be created before gunicorn
+    forks. With ``output_dir`` set, each process writes its counts to
+    ``profile.<slot>.folded`` (see concurrency.worker_slot()) every
+    ``dump_interval`` seconds and at exit; gunicorn's worker_exit hook calls
+    dump_running(). A worker that takes over a recycled worker's slot adds
+    its counts to the ones already in the file.
+    """
+
+    def __init__(self, hz=100, max_depth=64, output_dir=None, dump_interval=60):
+        self.interval = 1.0 / hz
+        self.max_depth = max_depth
+        self.output_dir = output_dir
+        self.dump_interval = dump_interval
+        self.samples = 0
+        # Time spent taking samples, during which request threads wait for the GIL
+        self.sample_seconds = 0.0
+        self._started = None
+        self._counts = Counter()
+        # Collapsed text of the slot's file when this process started sampling
+        self._inherited = ''
+        self._labels = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = None
+        self._thread = None
+
+    def ensure_running(self):
+        """Start sampling in this process unless it already runs"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._start()
+
+    def _start(self):
+        # Samples taken before a fork belong to the parent
+        self._counts = Counter()
+        self.samples = 0
+        self.sample_seconds = 0.0
+        self._started = time.perf_counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._stop,), name='profiler', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+        _running.add(self)
+        if self.output_dir:
+            try:
+                with open(self._path()) as f:
+                    self._inherited = f.read()
+            except FileNotFoundError:
+                self._inherited = ''
+            # Outside gunicorn; a worker is dumped by the worker_exit hook
+            atexit.register(self.dump)
+
+    def stop(self):
+        """Stop sampling; the counts are kept"""
+        if self._pid == os.getpid():
+            self._stop.set()
+            self._thread.join()
+        _running.discard(self)
+        self._pid = None
+
+    def _run(self, stop):
+        me = threading.get_ident()
+        next_dump = time.monotonic() + self.dump_interval
+        while not stop.wait(self.interval):
+            start = time.perf_counter()
+            self.sample(me)
+            self.sample_seconds += time.perf_counter() - start
+            if self.output_dir and time.monotonic() >= next_dump:
+                self.dump()
+                next_dump = time.monotonic() + self.dump_interval
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            # ';' separates frames in the collapsed format
+            label = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+            self._labels[code] = label
+        return label
+
+    def _thread_name(self, ident):
+        name = self._names.get(ident)
+        if name is None:
+            self._names = {thread.ident: thread.name.replace(';', ':') for thread in threading.enumerate()}
+            name = self._names.get(ident, 'thread')
+        return name
+
+    def sample(self, skip=None):
+        """Record the current stack of every thread except ``skip``"""
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            codes = []
+            while frame is not None:
+                codes.append(frame.f_code)
+                frame = frame.f_back
+            # Leaf first; a deep stack keeps its root frames
+            stacks.append((self._thread_name(ident), tuple(codes[-self.max_depth:])))
+        with self._lock:
+            for stack in stacks:
+                if stack not in self._counts and len(self._counts) >= MAX_STACKS:
+                    stack = TRUNCATED_STACK
+                self._counts[stack] += 1
+            self.samples += 1
+
+    def collapsed(self, reset=False):
+        """Counted stacks as collapsed-stack text, one 'thread;frame;frame count' line each"""
+        with self._lock:
+            counts = self._counts.copy()
+            if reset:
+                self._counts = Counter()
+                self._inherited = ''
+        lines = Counter()
+        for (name, codes), count in counts.items():
+            lines[';'.join([name, *(self._label(code) for code in reversed(codes))])] += count
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(lines.items()))
+
+    def _path(self):
+        return os.path.join(self.output_dir, f'profile.{worker_slot()}.folded')
+
+    def dump(self):
+        """Write the slot's counts to ``profile.<slot>.folded`` in the output directory"""
+        if not self.output_dir:
+            return None
+        path = self._path()
+        text = self.collapsed()
+        if self._inherited:
+            text = merge_collapsed([self._inherited, text])
+        write_atomic(path, lambda f: f.write(text.encode()))
+        return path
+
+    def overhead_percent(self):
+        """Share of wall-clock time spent sampling since the profiler started"""
+        if self._started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._started
+        return round(self.sample_seconds / elapsed * 100, 4) if elapsed else 0.0
+
+    def stats(self):
+        return {
+            'running': self._pid == os.getpid(),
+            'hz': round(1.0 / self.interval, 2),
+            'samples': self.samples,
+            'stacks': len(self._counts),
+            'overhead_percent': self.overhead_percent(),
+        }
+
+
+def dump_running():
+    """Dump every profiler sampling in this process; call from gunicorn's worker_exit hook"""
+    for profiler in list(_running):
+        if profiler._pid == os.getpid():
+            profiler.dump()
+
+
+def merge_collapsed(texts):
+    """Sum the counts of several collapsed-stack profiles into one"""
+    counts = Counter()
+    for text in texts:
+        for line in text.splitlines():
+            stack, _, count = line.rpartition(' ')
+            if stack:
+                counts[stack] += int(count)
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items()))
+
+
+def _seconds(value):
+    """Seconds since the epoch of a Sentry event timestamp"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    return float(value)
+
+
+class AdaptiveTraceSampler:
+    """Sentry trace sampling that keeps full traces for slow or failing requests
+
+    Head: a request is traced at ``base_rate``, and always on a path that
+    had a request slower than ``slow_ms`` or failing with a 5xx within the
+    last ``window`` seconds. Tail: a trace taken only because its path was
+    flagged is sent if the request itself was slow or failed, otherwise
+    with ``base_rate``. Call record() for every finished request.
+    """
+
+    def __init__(self, base_rate=0.01, slow_ms=250, window=60, max_paths=1000):
+        self.base_rate = base_rate
+        self.slow = slow_ms / 1000
+        self.window = window
+        self.max_paths = max_paths
+        self._flagged = {}
+        self._local = threading.local()
+
+    def record(self, path, seconds, status):
+        """Flag ``path`` for full tracing if this request was slow or failed"""
+        if seconds >= self.slow or status >= 500:
+            now = time.monotonic()
+            if len(self._flagged) >= self.max_paths:
+                self._flagged = {p: until for p, until in self._flagged.items() if until > now}
+                if len(self._flagged) >= self.max_paths:
+                    return
+            self._flagged[path] = now + self.window
+
+    def traces_sampler(self, sampling_context):
+        """Sentry ``traces_sampler``: head sampling rate of a new transaction"""
+        environ = sampling_context.get('wsgi_environ') or {}
+        until = self._flagged.get(environ.get('PATH_INFO'))
+        # Remembered for before_send_transaction(), which runs on the same thread
+        self._local.flagged = until is not None and until > time.monotonic()
+        if self._local.flagged:
+            return 1.0
+        return self.base_rate
+
+    def before_send_transaction(self, event, hint):
+        """Sentry ``before_send_transaction``: drop fast, successful traces taken only because of a flag"""
+        if not getattr(self._local, 'flagged', False):
+            return event
+        self._local.flagged = False
+        status = event.get('contexts', {}).get('trace', {}).get('status')
+        if status not in (None, 'ok'):
+            return event
+        try:
+            if _seconds(event['timestamp']) - _seconds(event['start_timestamp']) >= self.slow:
+                return event
+        except (KeyError, TypeError, ValueError):
+            return event
+        return event if random.random() < self.base_rate else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Merge per-worker collapsed-stack profiles')
+    parser.add_argument('profiles', nargs='+', help='profile.<pid>.folded files')
+    parser.add_argument('--output', help='Write the merged profile here instead of stdout')
+    args = parser.parse_args(argv)
+
+    texts = []
+    for path in args.profiles:
+        with open(path) as f:
+            texts.append(f.read())
+    merged = merge_collapsed(texts)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(merged)
+    else:
+        sys.stdout.write(merged)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
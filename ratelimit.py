@@ -0,0 +1,130 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from cache import LocalSharedCache, connect_shared_store
+
+
+class TokenBucketLimiter:
+    """In-process token buckets, one per key
+
+    A bucket holds up to ``limit`` tokens and refills at ``limit / window``
+    tokens per second; each request takes one. Checking a key is a dict
+    lookup and a little arithmetic under a lock. The least recently used
+    buckets are dropped beyond ``max_keys`` so memory stays bounded.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        """Take a token for key; return 0 if allowed, else seconds until one is available"""
+        now = time.monotonic()
+        rate = limit / window
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = limit
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens = min(limit, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counter shared by all workers through Redis
+
+    Requests are counted per fixed window with INCR/EXPIRE, and the previous
+    window's count is weighted by how much of it still overlaps the sliding
+    window. One pipelined round trip per request.
+    """
+
+    def __init__(self, client, prefix='ratelimit'):
+        self.client = client
+        self.prefix = prefix
+
+    def hit(self, key, limit, window):
+        """Count a request for key; return 0 if allowed, else seconds to wait"""
+        now = time.time()
+        index = int(now // window)
+        elapsed = now - index * window
+        current_key = f'{self.prefix}:{key}:{index}'
+
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(math.ceil(window * 2)))
+        pipe.get(f'{self.prefix}:{key}:{index - 1}')
+        count, _, previous = pipe.execute()
+        previous = int(previous or 0)
+
+        remaining = window - elapsed
+        if count + previous * remaining / window <= limit:
+            return 0.0
+        # Rejected requests are counted too, so the retry adds one more
+        if count < limit:
+            # Allowed once enough of the previous window has slid out
+            return remaining - (limit - count - 1) * window / previous
+        # Wait for this window to become the previous one and decay enough
+        return remaining + window * (1 - (limit - 1) / count)
+
+
+class RateLimiter:
+    """Token bucket fast path with an optional shared sliding window
+
+    The in-process bucket rejects bursts without any network call. Requests
+    it lets through are also counted in the shared window, so the limit holds
+    across all gunicorn workers. Like the prediction cache, the shared tier
+    fails open: if it is unreachable requests are only limited per worker.
+    """
+
+    def __init__(self, local, shared=None, logger=None):
+        self.local = local
+        self.shared = shared
+        self.logger = logger
+        self._shared_failed = False
+
+    def hit(self, key, limit, window):
+        """Return 0 if the request is allowed, else the Retry-After delay in seconds"""
+        retry_after = self.local.hit(key, limit, window)
+        if retry_after or self.shared is None:
+            return retry_after
+        try:
+            retry_after = self.shared.hit(key, limit, window)
+        except Exception as e:
+            if not self._shared_failed and self.logger is not None:
+                self.logger.warning(f"Shared rate limit store unavailable, limiting per worker: {str(e)}")
+            self._shared_failed = True
+            return 0.0
+        self._shared_failed = False
+        return retry_after
+
+
+def connect_limit_store(storage_url):
+    """Client for RATELIMIT_STORAGE_URL: 'memory://' (per worker), 'local://' or a redis URL"""
+    if storage_url.startswith('memory://'):
+        return None
+    if storage_url.startswith('local://'):
+        return LocalSharedCache()
+    return connect_shared_store('redis', storage_url)
+
+
+def create_rate_limiter(app):
+    """Build the rate limiter described by the app config, or None if disabled"""
+    if not app.config['RATELIMIT_ENABLED']:
+        return None
+    client = connect_limit_store(app.config['RATELIMIT_STORAGE_URL'])
+    return RateLimiter(
+        TokenBucketLimiter(),
+        SlidingWindowLimiter(client) if client is not None else None,
+        logger=app.logger
+    )
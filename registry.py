@@ -0,0 +1,265 @@
+"""Several model stores served side by side
+
+A request picks a model with ``?model=name`` or ``?model=name@version``;
+without one it gets the published version of the default store. Versions
+are loaded on first use and kept in an LRU bounded by a memory budget, and
+a ShadowScorer can score the same requests with a second model on a
+background thread to compare it against the primary before promoting it.
+"""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import null_metrics
+
+DEFAULT_MODEL = 'default'
+
+
+def parse_stores(value):
+    """Model directories of the MODEL_REGISTRY setting: 'name=dir,name=dir'"""
+    stores = {}
+    for entry in (value or '').split(','):
+        if not entry.strip():
+            continue
+        name, sep, path = entry.partition('=')
+        name, path = name.strip(), path.strip()
+        if not sep or not name or not path or '@' in name:
+            raise ValueError(f"Invalid MODEL_REGISTRY entry: {entry!r} (expected name=directory)")
+        stores[name] = path
+    return stores
+
+
+def parse_spec(spec):
+    """(name, version) of a model spec such as 'candidate' or 'candidate@<version>'
+
+    The version is None for the published one; an empty name is the default model.
+    """
+    name, _, version = (spec or '').partition('@')
+    return name or DEFAULT_MODEL, version or None
+
+
+class ModelRegistry:
+    """Named ModelStores, each loaded lazily per version
+
+    ``load(store, version)`` turns a version into a LoadedModel. The published
+    version of every store is found the same way the single-model service
+    always has, by stat()ing its CURRENT file, and stays pinned in memory.
+    Other versions are evicted least recently used first once the loaded
+    models exceed ``memory_budget`` bytes. Load and call durations are
+    recorded in ``metrics``, the metrics module or null_metrics.
+    """
+
+    def __init__(self, stores, load, default=DEFAULT_MODEL, memory_budget=None, logger=None,
+                 metrics=null_metrics):
+        if default not in stores:
+            raise ValueError(f"Unknown default model: {default}")
+        self.stores = stores
+        self.default = default
+        self.memory_budget = memory_budget
+        self.logger = logger
+        self.metrics = metrics
+        self._load = load
+        self._lock = threading.Lock()
+        self._published = {}
+        self._loaded = OrderedDict()
+
+    def _store(self, name):
+        store = self.stores.get(name)
+        if store is None:
+            raise KeyError(f"Unknown model: {name}")
+        return store
+
+    def published(self, name=None, refresh=False):
+        """Published version of a model, reloaded if it changed; None if nothing is published
+
+        A version that fails to load is not retried until the next publish;
+        the previous one keeps serving meanwhile. ``refresh`` checks CURRENT
+        even if the store checked it moments ago.
+        """
+        name = name or self.default
+        store = self._store(name)
+        generation = store.generation(refresh)
+        if generation is None:
+            return None
+        entry = self._published.get(name)
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        with self._lock:
+            entry = self._published.get(name)
+            if entry is not None and entry[0] == generation:
+                return entry[1]
+            previous = entry[1] if entry is not None else None
+            version = store.current_version()
+            if version is None:
+                # CURRENT was removed or emptied since generation() saw it
+                return None
+            try:
+                loaded = self._get(name, version)
+            except Exception:
+                self._published[name] = (generation, previous)
+                raise
+            self._published[name] = (generation, loaded)
+            if previous is not None and previous is not loaded:
+                # In-flight requests keep their reference; the registry lets go of it
+                self._loaded.pop((name, previous.version), None)
+            self._evict()
+            return loaded
+
+    def get(self, spec=None):
+        """Model for a spec like 'name' or 'name@version', see parse_spec()
+
+        Raises KeyError for an unknown model or version.
+        """
+        name, version = parse_spec(spec)
+        if version is None:
+            return self.published(name)
+        with self._lock:
+            loaded = self._get(name, version)
+            self._evict()
+            return loaded
+
+    def _get(self, name, version):
+        """Loaded model of a version, loading it if needed; call with the lock held"""
+        key = (name, version)
+        loaded = self._loaded.get(key)
+        if loaded is None:
+            store = self._store(name)
+            # Only names listed by the store, so a request cannot point outside it
+            if version not in store.versions():
+                raise KeyError(f"Unknown model version: {name}@{version}")
+            start = time.perf_counter()
+            loaded = self._load(store, version)
+            loaded.name = name
+            self._loaded[key] = loaded
+            self.metrics.MODEL_LOAD_SECONDS.set(time.perf_counter() - start)
+            if self.logger is not None:
+                self.logger.info(f"Model {name}@{version} loaded ({loaded.engine} engine, {loaded.nbytes} bytes)")
+        self._loaded.move_to_end(key)
+        return loaded
+
+    def _evict(self):
+        """Drop least recently used versions beyond the memory budget, never a published one"""
+        if self.memory_budget is None:
+            return
+        pinned = {id(entry[1]) for entry in self._published.values() if entry[1] is not None}
+        total = sum(loaded.nbytes for loaded in self._loaded.values())
+        for key, loaded in list(self._loaded.items()):
+            if total <= self.memory_budget:
+                break
+            if id(loaded) not in pinned:
+                del self._loaded[key]
+                total -= loaded.nbytes
+                if self.logger is not None:
+                    self.logger.info(f"Model {key[0]}@{key[1]} evicted from the registry")
+
+    def observe(self, loaded, role, seconds):
+        """Record the duration of one model call; role is 'primary' or 'shadow'"""
+        self.metrics.MODEL_PREDICT_LATENCY.labels(loaded.name or self.default, role).observe(seconds)
+        with self._lock:
+            counts = loaded.latency.setdefault(role, [0, 0.0])
+            counts[0] += 1
+            counts[1] += seconds
+
+    @contextmanager
+    def timed(self, loaded, role='primary'):
+        """Time a model call made inside the block, see observe()"""
+        start = time.perf_counter()
+        yield
+        self.observe(loaded, role, time.perf_counter() - start)
+
+    def stats(self):
+        """Loaded versions with their size and mean call latency, for /health"""
+        with self._lock:
+            published = {id(entry[1]) for entry in self._published.values() if entry[1] is not None}
+            models = {
+                f'{name}@{version}': {
+                    'engine': loaded.engine,
+                    'bytes': loaded.nbytes,
+                    'published': id(loaded) in published,
+                    'latency': {
+                        role: {'calls': calls, 'mean_ms': round(seconds / calls * 1000, 4)}
+                        for role, (calls, seconds) in loaded.latency.items()
+                    },
+                }
+                for (name, version), loaded in self._loaded.items()
+            }
+        return {
+            'default': self.default,
+            'names': sorted(self.stores),
+            'memory_budget_bytes': self.memory_budget,
+            'loaded_bytes': sum(model['bytes'] for model in models.values()),
+            'loaded': models,
+        }
+
+
+class ShadowScorer:
+    """Score requests again with a shadow model, off the request path
+
+    Work is handed to a single background thread after the primary response
+    is complete, so shadow latency never adds to it. At most ``max_pending``
+    requests wait for the thread; beyond that they are not shadowed. Each
+    shadow call records its latency and how far it lands from the primary.
+    """
+
+    def __init__(self, registry, spec, max_pending=100, logger=None):
+        self.registry = registry
+        self.spec = spec
+        self.max_pending = max_pending
+        self.logger = logger
+        # Threads start on first submit, so this is safe to create before gunicorn forks
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.scored = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, primary, encode, predictions):
+        """Queue shadow scoring of rows the primary model predicted as ``predictions``
+
+        ``encode(encoding)`` builds the feature matrix with the shadow model's
+        encoding, which need not match the primary's.
+        """
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                self.registry.metrics.SHADOW_DROPPED.inc()
+                return
+            self._pending += 1
+        self._executor.submit(self._score, primary, encode, predictions)
+
+    def _score(self, primary, encode, predictions):
+        try:
+            shadow = self.registry.get(self.spec)
+            if shadow is None or shadow is primary:
+                return
+            features = encode(shadow.encoding)
+            start = time.perf_counter()
+            shadow_predictions = shadow.predict(features)
+            self.registry.observe(shadow, 'shadow', time.perf_counter() - start)
+            for difference in np.abs(shadow_predictions - np.asarray(predictions, dtype=np.float64)).tolist():
+                self.registry.metrics.SHADOW_DIFFERENCE.observe(difference)
+            with self._lock:
+                self.scored += 1
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            if self.logger is not None:
+                self.logger.warning(f"Shadow scoring with {self.spec} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self):
+        return {
+            'model': self.spec,
+            'scored': self.scored,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'pending': self._pending,
+        }
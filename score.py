@@ -0,0 +1,277 @@
+"""Bulk scoring of applicant files with the published model
+
+Reads a CSV or Parquet file in fixed-size chunks, validates, encodes and
+scores every chunk in a pool of worker processes, and streams the results to
+the output file in input order, so memory use does not grow with file size.
+
+Examples:
+    python score.py policies.csv scored.csv
+    python score.py policies.parquet scored.parquet --chunk-size 200000 --workers 8
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from codec import parse_quantiles
+from config import config
+from features import FEATURE_COLUMNS, FEATURE_SCHEMA, encode_batch, validate_columns
+from model_store import ModelStore
+
+DEFAULT_CHUNK_SIZE = 100000
+
+logger = logging.getLogger(__name__)
+
+# The model of the current process, loaded once per worker by load_model()
+_model = None
+_usd_to_inr = None
+_explain = False
+_quantiles = None
+
+
+def resolve_version(model_dir, version=None):
+    """The version to score with: ``version``, or the one published in model_dir"""
+    version = version or ModelStore(model_dir).current_version()
+    if version is None:
+        raise RuntimeError(f"No published model in {model_dir}; run python training.py first")
+    return version
+
+
+def load_model(model_dir, version, engine, usd_to_inr, explain=False, quantiles=None):
+    """Load the model version to score with (process pool initializer)"""
+    global _model, _usd_to_inr, _explain, _quantiles
+    _model = ModelStore(model_dir).load(resolve_version(model_dir, version), engine=engine)
+    _usd_to_inr = usd_to_inr
+    _explain = explain
+    _quantiles = quantiles
+    return _model.version
+
+
+def score_chunk(chunk):
+    """Append prediction and error columns to a chunk of applicants"""
+    missing = [col for col in FEATURE_COLUMNS if col not in chunk.columns]
+    if missing:
+        raise ValueError(f"Input is missing columns: {', '.join(missing)}")
+
+    if _quantiles is not None and not _model.has_quantiles:
+        raise ValueError(f"Model version {_model.version} has no leaf quantiles; retrain it to add them")
+
+    columns, errors = validate_columns({col: chunk[col].to_numpy() for col in FEATURE_COLUMNS})
+    valid = np.ones(len(chunk), dtype=bool)
+    valid[list(errors)] = False
+    rows = np.flatnonzero(valid)
+
+    predictions_usd = np.full(len(chunk), np.nan)
+    bias = np.nan
+    contributions = np.full((len(chunk), len(FEATURE_COLUMNS)), np.nan) if _explain else None
+    quantile_values = np.full((len(chunk), len(_quantiles)), np.nan) if _quantiles is not None else None
+    if len(rows):
+        features = encode_batch(columns, _model.encoding, rows)
+        if _explain or _quantiles is not None:
+            predictions_usd[rows], explained, scored_quantiles = _model.score(features, _explain, _quantiles)
+            if _explain:
+                bias, contributions[rows] = explained
+            if _quantiles is not None:
+                quantile_values[rows] = scored_quantiles
+        else:
+            predictions_usd[rows] = _model.predict(features)
+
+    error = np.full(len(chunk), '', dtype=object)
+    for i, (_, message) in errors.items():
+        error[i] = message
+
+    chunk = chunk.copy()
+    chunk['predicted_charges_usd'] = predictions_usd.round(2)
+    chunk['predicted_charges_inr'] = (predictions_usd * _usd_to_inr).round(2)
+    if _explain:
+        chunk['baseline_usd'] = np.where(valid, np.round(bias, 2), np.nan)
+        for j, col in enumerate(FEATURE_COLUMNS):
+            chunk[f'contribution_{col}_usd'] = contributions[:, j].round(2)
+    if _quantiles is not None:
+        for j, level in enumerate(_quantiles):
+            chunk[f'quantile_{level:g}_usd'] = quantile_values[:, j].round(2)
+    chunk['error'] = error
+    return chunk
+
+
+def file_format(path, explicit=None):
+    if explicit:
+        return explicit
+    return 'parquet' if path.endswith(('.parquet', '.pq')) else 'csv'
+
+
+def read_chunks(path, fmt, chunk_size):
+    """Yield DataFrames of at most chunk_size rows"""
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+
+def parquet_schema(chunk):
+    """Output schema of a scored file, fixed from its first chunk
+
+    A column's type must not depend on which rows a chunk happens to hold:
+    an integer column turns float as soon as a chunk has a missing value,
+    and a numeric one turns object once it has a typo. The numeric feature
+    columns and every other numeric column are therefore written as
+    float64, and all remaining columns as strings.
+    """
+    import pyarrow as pa
+    kinds = {field: kind for field, kind, _, _ in FEATURE_SCHEMA}
+    fields = []
+    for col in chunk.columns:
+        if col in kinds:
+            numeric = kinds[col] is not None
+        else:
+            numeric = pd.api.types.is_numeric_dtype(chunk[col]) and not pd.api.types.is_bool_dtype(chunk[col])
+        fields.append(pa.field(col, pa.float64() if numeric else pa.string()))
+    return pa.schema(fields)
+
+
+def conform(chunk, schema):
+    """Convert a chunk's columns to the types of ``schema``; values that do not fit become null"""
+    import pyarrow as pa
+    columns = {}
+    for field in schema:
+        values = chunk[field.name]
+        if field.type == pa.float64():
+            columns[field.name] = pd.to_numeric(values, errors='coerce').astype(np.float64)
+        else:
+            columns[field.name] = values.astype(object).where(values.isna(), values.astype(str))
+    return pa.Table.from_pandas(pd.DataFrame(columns), schema=schema, preserve_index=False)
+
+
+class ChunkWriter:
+    """Append scored chunks to a CSV or Parquet file as they arrive"""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self._writer = None
+        self._header = True
+
+    def write(self, chunk):
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            if self._writer is None:
+                schema = parquet_schema(chunk)
+                self._writer = pq.ParquetWriter(self.path, schema)
+            self._writer.write_table(conform(chunk, self._writer.schema))
+        else:
+            chunk.to_csv(self.path, mode='w' if self._header else 'a', header=self._header, index=False)
+            self._header = False
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def score_file(input_path, output_path, model_dir, version=None, engine='compiled', usd_to_inr=83.0,
+               chunk_size=DEFAULT_CHUNK_SIZE, workers=None, input_format=None, output_format=None,
+               explain=False, quantiles=None):
+    """Score every row of input_path into output_path and return a summary dict
+
+    With ``explain``, the baseline and every feature's contribution to each
+    prediction are added as columns, and with ``quantiles`` (levels in
+    [0, 1]) one column per prediction quantile.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = read_chunks(input_path, file_format(input_path, input_format), chunk_size)
+    writer = ChunkWriter(output_path, file_format(output_path, output_format))
+    model_args = (model_dir, version, engine, usd_to_inr, explain, quantiles)
+
+    rows = 0
+    rejected = 0
+    start = time.perf_counter()
+
+    def write(scored):
+        nonlocal rows, rejected
+        writer.write(scored)
+        rows += len(scored)
+        rejected += int((scored['error'] != '').sum())
+
+    try:
+        if workers == 1:
+            version = load_model(*model_args)
+            for chunk in chunks:
+                write(score_chunk(chunk))
+        else:
+            # Only the workers load the model; every one of them gets the same version
+            version = resolve_version(model_dir, version)
+            model_args = (model_dir, version, *model_args[2:])
+            with ProcessPoolExecutor(max_workers=workers, initializer=load_model, initargs=model_args) as pool:
+                # Keep a bounded number of chunks in flight and write them in
+                # input order, so memory stays flat however large the file is
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(pool.submit(score_chunk, chunk))
+                    if len(pending) >= workers * 2:
+                        write(pending.popleft().result())
+                while pending:
+                    write(pending.popleft().result())
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'version': version,
+        'rows': rows,
+        'rejected': rejected,
+        'seconds': round(elapsed, 3),
+        'rows_per_s': round(rows / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a CSV or Parquet file of applicants')
+    parser.add_argument('input', help='Input file with the columns ' + ', '.join(FEATURE_COLUMNS))
+    parser.add_argument('output', help='Output file; the input columns plus predictions and errors')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'),
+                        help='Configuration name for MODEL_DIR, INFERENCE_ENGINE and USD_TO_INR_RATE')
+    parser.add_argument('--model-dir', help='Model store directory (default: MODEL_DIR from config)')
+    parser.add_argument('--version', help='Model version to score with (default: the current one)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per chunk')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--input-format', choices=['csv', 'parquet'], help='Default: from the file extension')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], help='Default: from the file extension')
+    parser.add_argument('--explain', action='store_true',
+                        help='Add the baseline and per-feature contribution columns to every prediction')
+    parser.add_argument('--quantiles', help='Comma-separated quantile levels to add as columns, e.g. 0.05,0.95')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+    settings = config[args.config]
+    try:
+        quantiles = parse_quantiles(args.quantiles, settings.PREDICTION_QUANTILES)
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = score_file(
+        args.input, args.output,
+        model_dir=args.model_dir or settings.MODEL_DIR,
+        version=args.version,
+        engine=settings.INFERENCE_ENGINE,
+        usd_to_inr=settings.USD_TO_INR_RATE,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        explain=args.explain,
+        quantiles=quantiles,
+    )
+    logger.info(f"Scored {summary['rows']} rows ({summary['rejected']} rejected) with model "
+                f"{summary['version']} in {summary['seconds']}s: {summary['rows_per_s']} rows/s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -110,6 +110,31 @@ def test_api():
     except Exception as e:
         print(f"✗ Error testing invalid data: {e}")
     
+    # Test 4: Batch prediction
+    print("\n4. Testing batch prediction endpoint...")
+    batch = [test_case['data'] for test_case in test_cases] + [invalid_data]
+    
+    try:
+        response = requests.post(
+            f"{base_url}/predict/batch",
+            json=batch,
+            headers={'Content-Type': 'application/json'}
+        )
+        
+        if response.status_code == 200:
+            result = response.json()
+            print(f"✓ Batch scored: {result['count'] - result['errors']} of {result['count']} applicants")
+            for row in result['results']:
+                if row['success']:
+                    print(f"   ✓ Row {row['index']}: ₹{row['predicted_charges_inr']:,.2f}")
+                else:
+                    print(f"   ✓ Row {row['index']} rejected: {row['message']}")
+        else:
+            print(f"✗ Batch request failed: {response.status_code}")
+            
+    except Exception as e:
+        print(f"✗ Error testing batch prediction: {e}")
+    
     print("\n" + "=" * 40)
     print("API testing completed!")
 
@@ -0,0 +1,104 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app_production import app
+
+_popen = subprocess.Popen
+
+
+class FakeTraining:
+    """Stands in for the training.py process /train launches"""
+
+    def __init__(self, code):
+        self.code = code
+        self.processes = []
+
+    def __call__(self, args, **kwargs):
+        process = _popen([sys.executable, '-c', self.code], **kwargs)
+        self.processes.append(process)
+        return process
+
+    def stop(self):
+        for process in self.processes:
+            process.kill()
+            process.wait()
+
+
+@pytest.fixture
+def training(monkeypatch):
+    def launch(code):
+        fake = FakeTraining(code)
+        monkeypatch.setattr(subprocess, 'Popen', fake)
+        fakes.append(fake)
+        return fake
+
+    fakes = []
+    yield launch
+    for fake in fakes:
+        fake.stop()
+    # Reaps the processes so the next test can start a job
+    app.test_client().get('/health')
+
+
+def test_train_runs_one_job_at_a_time(training):
+    fake = training('import time; time.sleep(60)')
+    client = app.test_client()
+    response = client.post('/train')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+
+    response = client.post('/train')
+    assert response.status_code == 409
+    assert response.get_json()['job_id'] == job_id
+    assert len(fake.processes) == 1
+
+    fake.stop()
+    job = client.get(f'/train/{job_id}').get_json()
+    assert job['status'] == 'failed'
+    assert 'exited with code' in job['error']
+    assert client.post('/train').status_code == 202
+
+
+def test_job_of_a_process_that_exits_without_a_status_fails(training):
+    fake = training('import sys; sys.exit(3)')
+    client = app.test_client()
+    job_id = client.post('/train').get_json()['job_id']
+    fake.processes[0].wait()
+    job = client.get(f'/train/{job_id}').get_json()
+    assert job['status'] == 'failed'
+    assert 'exited with code 3' in job['error']
+
+
+def test_train_requires_the_admin_token_when_set(training, monkeypatch):
+    training('pass')
+    monkeypatch.setitem(app.config, 'ADMIN_TOKEN', 's3cret')
+    client = app.test_client()
+    assert client.post('/train').status_code == 403
+    assert client.post('/train', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.post('/train', headers={'X-Admin-Token': 's3cret'}).status_code == 202
+
+
+def test_train_is_rate_limited():
+    assert app.view_functions['train'].rate_limit == (10, 3600)
+
+
+def test_disabled_metrics_do_not_load_prometheus_client():
+    code = ('import sys; from app_production import app; '
+            "assert 'prometheus_client' not in sys.modules, 'loaded'; "
+            "assert app.test_client().get('/metrics').status_code == 404")
+    subprocess.run([sys.executable, '-c', code], env={**os.environ, 'ENABLE_METRICS': 'false'},
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+
+
+def test_explanation_adds_up_to_the_prediction():
+    applicant = {'age': 52, 'sex': 'female', 'bmi': 33.4, 'children': 2, 'smoker': 'yes', 'region': 'northwest'}
+    client = app.test_client()
+    body = client.post('/predict?explain=true', json=applicant).get_json()
+    explanation = body['explanation']
+    assert set(explanation['contributions_usd']) == {'age', 'sex', 'bmi', 'children', 'smoker', 'region'}
+    total = explanation['baseline_usd'] + sum(explanation['contributions_usd'].values())
+    assert total == pytest.approx(body['predicted_charges_usd'], abs=0.05)
+    assert client.post('/predict', json=applicant).get_json()['predicted_charges_usd'] == body['predicted_charges_usd']
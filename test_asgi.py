@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from app_production import app as flask_app
+
+GOOD = json.dumps({'age': 30, 'sex': 'male', 'bmi': 25.123, 'children': 0, 'smoker': 'no',
+                   'region': 'southeast'}).encode()
+
+
+async def request(path, body=b'', content_type=b'application/json', query_string=b'', method='POST'):
+    """Drive the ASGI app through one request and return (status, body)"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'query_string': query_string, 'root_path': '',
+        'headers': [(b'content-type', content_type)] if content_type else [],
+        'client': ('127.0.0.1', 1), 'server': ('localhost', 80), 'scheme': 'http', 'http_version': '1.1',
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi.app(scope, receive, send)
+    [start] = [message for message in sent if message['type'] == 'http.response.start']
+    return start['status'], b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body')
+
+
+def call(*args, **kwargs):
+    return asyncio.run(request(*args, **kwargs))
+
+
+@pytest.mark.parametrize('body, content_type, query_string', [
+    (GOOD, b'application/json', b''),
+    (GOOD, b'application/json', b'explain=true'),
+    (GOOD, b'application/json', b'quantiles=true'),
+    (b'{bad', b'application/json', b''),
+    (b'{}', b'application/json', b''),
+    (json.dumps({'age': 30}).encode(), b'application/json', b''),
+    (json.dumps({**json.loads(GOOD), 'region': 'mars'}).encode(), b'application/json', b''),
+    (GOOD, b'text/plain', b''),
+    (GOOD, None, b''),
+])
+def test_predict_matches_the_flask_view(body, content_type, query_string):
+    status, data = call('/predict', body, content_type, query_string)
+    kwargs = {'data': body}
+    if content_type:
+        kwargs['content_type'] = content_type.decode()
+    response = flask_app.test_client().post('/predict?' + query_string.decode(), **kwargs)
+    assert status == response.status_code
+    assert json.loads(data) == response.get_json()
+
+
+def test_concurrent_predictions_are_batched():
+    bodies = [json.dumps({**json.loads(GOOD), 'age': age}).encode() for age in range(40, 48)]
+
+    async def main():
+        return await asyncio.gather(*(request('/predict', body) for body in bodies))
+
+    before = asgi.app.batcher.stats()
+    results = asyncio.run(main())
+    after = asgi.app.batcher.stats()
+    assert [status for status, _ in results] == [200] * len(bodies)
+    for body, (_, data) in zip(bodies, results):
+        expected = flask_app.test_client().post('/predict', data=body, content_type='application/json')
+        assert json.loads(data) == expected.get_json()
+    assert after['rows'] - before['rows'] == len(bodies)
+    assert after['batches'] - before['batches'] < len(bodies)
+
+
+def test_other_routes_are_delegated_to_flask():
+    status, data = call('/health', method='GET', content_type=None)
+    assert status == 200
+    assert json.loads(data).keys() == flask_app.test_client().get('/health').get_json().keys()
@@ -0,0 +1,118 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from batching import MicroBatcher
+
+
+class RecordingModel:
+    def __init__(self, offset=0.0, error=None):
+        self.offset = offset
+        self.error = error
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append(len(X))
+        if self.error is not None:
+            raise self.error
+        return X.sum(axis=1) + self.offset
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_concurrent_rows_share_one_call():
+    model = RecordingModel()
+    batcher = MicroBatcher(max_batch_size=64, max_wait_us=50000)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(model, [i, 1.0]) for i in range(10)))
+
+    assert run(main()) == [i + 1.0 for i in range(10)]
+    assert model.calls == [10]
+    assert batcher.stats() == {'batches': 1, 'rows': 10, 'mean_batch_size': 10.0}
+
+
+def test_batches_are_capped():
+    model = RecordingModel()
+    batcher = MicroBatcher(max_batch_size=4, max_wait_us=50000)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(model, [i]) for i in range(10)))
+
+    assert run(main()) == list(range(10))
+    assert model.calls == [4, 4, 2]
+
+
+def test_a_lone_request_waits_at_most_max_wait():
+    model = RecordingModel()
+    batcher = MicroBatcher(max_batch_size=64, max_wait_us=1000)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await batcher.submit(model, [2.0])
+        return result, loop.time() - start
+
+    result, elapsed = run(main())
+    assert result == 2.0
+    assert elapsed < 0.5
+
+
+def test_models_are_never_mixed_in_one_call():
+    old, new = RecordingModel(offset=0.0), RecordingModel(offset=100.0)
+    batcher = MicroBatcher(max_wait_us=50000)
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(old if i % 2 else new, [i]) for i in range(6)))
+
+    assert run(main()) == [100.0, 1.0, 102.0, 3.0, 104.0, 5.0]
+    assert old.calls == [3] and new.calls == [3]
+
+
+def test_errors_reach_every_caller_of_the_batch():
+    failing, healthy = RecordingModel(error=ValueError('bad row')), RecordingModel()
+    batcher = MicroBatcher(max_wait_us=50000)
+
+    async def main():
+        return await asyncio.gather(batcher.submit(failing, [1]), batcher.submit(failing, [2]),
+                                    batcher.submit(healthy, [3]), return_exceptions=True)
+
+    first, second, third = run(main())
+    assert isinstance(first, ValueError) and isinstance(second, ValueError)
+    assert third == 3
+
+
+def test_observe_sees_every_model_call():
+    model = RecordingModel()
+    seen = []
+    batcher = MicroBatcher(max_wait_us=50000, observe=lambda model, seconds: seen.append((model, seconds)))
+
+    async def main():
+        await asyncio.gather(*(batcher.submit(model, [i]) for i in range(3)))
+
+    run(main())
+    assert [m for m, _ in seen] == [model]
+    assert seen[0][1] >= 0
+
+
+def test_batcher_restarts_on_a_new_event_loop():
+    model = RecordingModel()
+    batcher = MicroBatcher(max_wait_us=1000)
+    assert run(batcher.submit(model, [1.0])) == 1.0
+    assert run(batcher.submit(model, [2.0])) == 2.0
+    assert np.sum(model.calls) == 2
+
+
+@pytest.mark.parametrize('max_batch_size', [1, 3])
+def test_results_follow_their_rows(max_batch_size):
+    model = RecordingModel()
+    batcher = MicroBatcher(max_batch_size=max_batch_size, max_wait_us=20000)
+    rows = np.random.RandomState(0).uniform(size=(25, 6))
+
+    async def main():
+        return await asyncio.gather(*(batcher.submit(model, row) for row in rows))
+
+    assert np.allclose(run(main()), rows.sum(axis=1))
@@ -0,0 +1,101 @@
+import pytest
+
+import cache
+from cache import LRUCache, LocalSharedCache, PredictionCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+class BrokenStore:
+    def get(self, key):
+        raise ConnectionError('down')
+
+    def set(self, key, value, ex=None):
+        raise ConnectionError('down')
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(max_size=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c')) == (1, 3)
+    assert len(lru) == 2
+    assert (lru.hits, lru.misses) == (3, 1)
+
+
+def test_lru_expires_entries(clock):
+    lru = LRUCache(ttl=10)
+    lru.set('a', 1)
+    clock.now += 9.9
+    assert lru.get('a') == 1
+    clock.now += 0.1
+    assert lru.get('a') is None
+    assert len(lru) == 0
+
+
+def test_local_shared_cache(clock):
+    store = LocalSharedCache()
+    store.set('a', 1.5, ex=5)
+    assert store.get('a') == b'1.5'
+    clock.now += 5
+    assert store.get('a') is None
+
+    assert [store.incr('n'), store.incr('n')] == [1, 2]
+    store.expire('n', 1)
+    clock.now += 1
+    assert store.incr('n') == 1
+
+    pipe = store.pipeline()
+    pipe.incr('m')
+    pipe.get('m')
+    assert pipe.execute() == [1, b'1']
+
+
+def test_key_is_exact():
+    predictions = PredictionCache(LRUCache())
+    key = predictions.key('v1', 30, 'male', 25.0, 1, 'no', 'southwest')
+    # Values that validate to the same floats share a key
+    assert key == predictions.key('v1', 30.0, 'male', 25, 1, 'no', 'southwest')
+    assert key != predictions.key('v2', 30, 'male', 25.0, 1, 'no', 'southwest')
+    # Any other BMI, however close, is scored on its own
+    assert key != predictions.key('v1', 30, 'male', 25.001, 1, 'no', 'southwest')
+    assert key != predictions.key('v1', 30, 'male', 25.0000000000001, 1, 'no', 'southwest')
+
+
+def test_shared_tier_fills_local_tier():
+    shared = LocalSharedCache()
+    writer = PredictionCache(LRUCache(), shared)
+    reader = PredictionCache(LRUCache(), shared)
+    writer.set('k', 1234.5678)
+    assert reader.get('k') == 1234.5678
+    assert reader.local.get('k') == 1234.5678
+    assert reader.get('missing') is None
+    assert (reader.shared_hits, reader.shared_misses) == (1, 1)
+
+
+def test_shared_tier_fails_open():
+    predictions = PredictionCache(LRUCache(), BrokenStore())
+    predictions.set('k', 1.0)
+    assert predictions.get('k') == 1.0
+    assert predictions.get('other') is None
+    assert predictions.shared_errors == 2
+    assert predictions.stats()['hit_ratio'] == 0.5
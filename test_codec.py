@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from flask import Flask, jsonify
+
+from codec import STATIC_ERRORS, ResponseCodec, explanation, loads
+
+AMOUNTS = [0.0, -0.0, 0.125, 1.005, 2.675, 1234.5678, 16884.924, -3.14159, 1e-7, 0.5e-2, 123456789.987654,
+           1e15 + 0.3, 1e16, 1e22, float('nan'), float('inf'), -float('inf')]
+USD_TO_INR = 83.0
+
+
+@pytest.fixture(params=['compact', 'debug', 'unsorted'])
+def app(request):
+    app = Flask(__name__)
+    if request.param == 'debug':
+        app.debug = True
+    elif request.param == 'unsorted':
+        app.json.sort_keys = False
+    with app.app_context():
+        yield app
+
+
+def test_error_bodies_match_jsonify(app):
+    codec = ResponseCodec(app)
+    for error, message in [*STATIC_ERRORS, ('Validation error', "could not convert string to float: 'x'")]:
+        expected = jsonify({'success': False, 'error': error, 'message': message})
+        assert codec.error(error, message) == expected.get_data()
+        assert codec.mimetype == expected.mimetype
+
+
+def test_prediction_bodies_match_jsonify(app):
+    codec = ResponseCodec(app)
+    rng = np.random.RandomState(0)
+    for usd in [*AMOUNTS, *rng.uniform(0, 60000, 500), *np.round(rng.uniform(0, 100, 200), 3)]:
+        # What the view returned before the codec: np.float64 amounts rounded with round(x, 2)
+        usd = np.float64(usd)
+        inr = usd * USD_TO_INR
+        expected = jsonify({
+            'success': True,
+            'predicted_charges_usd': round(usd, 2),
+            'predicted_charges_inr': round(inr, 2),
+            'message': 'Prediction successful'
+        }).get_data()
+        assert codec.prediction(usd, inr) == expected, usd
+
+
+def test_prediction_with_extra_fields_matches_jsonify(app):
+    codec = ResponseCodec(app)
+    extra = {'explanation': explanation(np.float64(1000.004), np.array([1.115, -2.5, 3.0, 0.0, 4.445, -0.001]))}
+    usd = np.float64(4321.987)
+    expected = jsonify({
+        'success': True,
+        'predicted_charges_usd': round(usd, 2),
+        'predicted_charges_inr': round(usd * USD_TO_INR, 2),
+        **extra,
+        'message': 'Prediction successful'
+    }).get_data()
+    assert codec.prediction(usd, usd * USD_TO_INR, extra) == expected
+
+
+@pytest.mark.parametrize('body', [
+    b'{"age": 30, "bmi": 25.5}', b'{"age": NaN}', b'{"children": 100000000000000000000000}', b'[1, 2.5, "x"]',
+    b'{"region": "\\ud800"}',
+])
+def test_loads_accepts_what_json_accepts(body):
+    assert repr(loads(body)) == repr(loads(body, fast=False))
+
+
+def test_loads_rejects_invalid_json():
+    with pytest.raises(ValueError):
+        loads(b'{bad')
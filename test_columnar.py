@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import CATEGORY, SCHEMA, convert_csv, open_columns
+from create_dataset import create_dataset
+
+REPO_DATASET = os.path.join(os.path.dirname(__file__), 'insurance.csv')
+CSV_HEADER = 'age,sex,bmi,children,smoker,region,charges\n'
+
+
+def decoded(path):
+    """The columnar file at path as a DataFrame with labels in place of codes"""
+    meta, columns = open_columns(path)
+    frame = {}
+    for col, kind in meta['schema'].items():
+        values = np.asarray(columns[col])
+        if kind == CATEGORY:
+            values = np.array(meta['vocabularies'][col], dtype=object)[values]
+        frame[col] = values
+    return meta, pd.DataFrame(frame)
+
+
+def expected(csv_path):
+    frame = pd.read_csv(csv_path)
+    return frame.astype({col: kind for col, kind in SCHEMA.items() if kind != CATEGORY})
+
+
+@pytest.mark.parametrize('chunk_size', [1000000, 97])
+def test_round_trip(tmp_path, chunk_size):
+    csv_path = tmp_path / 'insurance.csv'
+    create_dataset(str(csv_path), rows=1000, seed=3)
+    path = tmp_path / 'insurance.cols'
+    assert convert_csv(csv_path, path, chunk_size=chunk_size) == 1000
+    meta, frame = decoded(path)
+    assert meta['rows'] == 1000
+    pd.testing.assert_frame_equal(frame, expected(csv_path))
+
+
+def test_repo_dataset_round_trip(tmp_path):
+    path = tmp_path / 'insurance.cols'
+    convert_csv(REPO_DATASET, path)
+    pd.testing.assert_frame_equal(decoded(path)[1], expected(REPO_DATASET))
+
+
+def test_whole_floats_and_blank_lines(tmp_path):
+    csv_path = tmp_path / 'exported.csv'
+    csv_path.write_text(CSV_HEADER
+                        + '19.0,female,27.9,0.0,yes,southwest,16884.924\n'
+                        + '\n'
+                        + '18,male,33.77,1,no,southeast,1725.5523\n'
+                        + '\n\n'
+                        + '28.0,male,33,3,no,northwest,4449.462')
+    path = tmp_path / 'exported.cols'
+    assert convert_csv(csv_path, path, chunk_size=2) == 3
+    meta, frame = decoded(path)
+    assert meta['rows'] == 3
+    assert all(len(column) == 3 for column in open_columns(path)[1].values())
+    pd.testing.assert_frame_equal(frame, expected(csv_path))
+    assert frame['age'].tolist() == [19, 18, 28]
+
+
+@pytest.mark.parametrize('age', ['30.5', '40000', 'nan', 'inf'])
+def test_rejects_values_an_integer_column_cannot_hold(tmp_path, age):
+    csv_path = tmp_path / 'bad.csv'
+    csv_path.write_text(CSV_HEADER + f'{age},male,30.1,1,no,southwest,1000.0\n')
+    with pytest.raises(ValueError, match='does not fit in int16'):
+        convert_csv(csv_path, tmp_path / 'bad.cols')
+
+
+def test_generated_columnar_matches_csv(tmp_path):
+    create_dataset(str(tmp_path / 'data.csv'), rows=500, seed=5)
+    create_dataset(str(tmp_path / 'data.cols'), rows=500, seed=5)
+    pd.testing.assert_frame_equal(decoded(tmp_path / 'data.cols')[1], expected(tmp_path / 'data.csv'))
@@ -0,0 +1,74 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import concurrency
+from concurrency import (NATIVE_THREAD_VARS, WORKER_SLOT_VAR, assign_worker_slot, inference_jobs, recommend,
+                         thread_env, worker_slot)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_thread_env_caps_every_pool():
+    env = thread_env(2, {'PATH': '/bin', 'OMP_NUM_THREADS': '8'})
+    assert env['PATH'] == '/bin'
+    assert all(env[var] == '2' for var in NATIVE_THREAD_VARS)
+    assert thread_env(-1, {'PATH': '/bin'}) == {'PATH': '/bin'}
+
+
+def test_inference_jobs():
+    assert inference_jobs(1, 4, 1000) == 1
+    assert inference_jobs(5000, 4, 1000) == 4
+    assert inference_jobs(5000, 1, 1000) == 1
+
+
+def run_python(code, **env):
+    clean = {key: value for key, value in os.environ.items() if key not in NATIVE_THREAD_VARS}
+    return subprocess.run([sys.executable, '-c', code], env={**clean, **env}, cwd=HERE, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def test_limit_native_threads_caps_pools_already_loaded():
+    pytest.importorskip('threadpoolctl')
+    code = ('import numpy; from threadpoolctl import threadpool_info; '
+            'from concurrency import limit_native_threads; limit_native_threads(1); '
+            'import os; print(os.environ["OMP_NUM_THREADS"], {pool["num_threads"] for pool in threadpool_info()})')
+    assert run_python(code) in ('1 {1}', '1 set()')
+
+
+def test_limit_native_threads_keeps_the_operators_setting():
+    code = ('from concurrency import limit_native_threads; limit_native_threads(1); '
+            'import os; print(os.environ["OMP_NUM_THREADS"], os.environ["MKL_NUM_THREADS"])')
+    assert run_python(code, OMP_NUM_THREADS='3') == '3 1'
+
+
+def test_worker_slot(monkeypatch):
+    monkeypatch.delenv(WORKER_SLOT_VAR, raising=False)
+    assert worker_slot() == str(os.getpid())
+    monkeypatch.setenv(WORKER_SLOT_VAR, 'worker4')
+    assert worker_slot() == 'worker4'
+
+
+def test_assign_worker_slot_reuses_the_lowest_free_slot():
+    server = SimpleNamespace(WORKERS={101: SimpleNamespace(slot=0), 102: SimpleNamespace(slot=2),
+                                      103: SimpleNamespace()})
+    worker = SimpleNamespace()
+    assign_worker_slot(server, worker)
+    assert worker.slot == 1
+
+
+def test_recommend_prefers_throughput_within_the_p99_tolerance():
+    results = [
+        {'workers': 4, 'threads': 1, 'throughput_rows_per_s': 1000, 'p99_ms': 2.0},
+        {'workers': 8, 'threads': 1, 'throughput_rows_per_s': 1500, 'p99_ms': 2.9},
+        {'workers': 16, 'threads': 1, 'throughput_rows_per_s': 1800, 'p99_ms': 3.1},
+    ]
+    assert recommend(results)['workers'] == 8
+
+
+def test_counts():
+    assert concurrency._counts('4,1,4,0,2') == [1, 2, 4]
+
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import create_dataset
+from create_dataset import DEFAULT_ROWS, DEFAULT_SEED
+
+
+def original_dataset(path, n_samples=DEFAULT_ROWS, seed=DEFAULT_SEED):
+    """The per-row generator create_dataset.py started out as, writing to path"""
+    np.random.seed(seed)
+    age = np.random.randint(18, 65, n_samples)
+    sex = np.random.choice(['male', 'female'], n_samples)
+    bmi = np.random.uniform(15, 50, n_samples)
+    children = np.random.randint(0, 6, n_samples)
+    smoker = np.random.choice(['yes', 'no'], n_samples, p=[0.2, 0.8])
+    region = np.random.choice(['southwest', 'southeast', 'northwest', 'northeast'], n_samples)
+    df = pd.DataFrame({'age': age, 'sex': sex, 'bmi': bmi, 'children': children, 'smoker': smoker,
+                       'region': region})
+
+    region_factors = {'southwest': 1.0, 'southeast': 1.1, 'northwest': 1.05, 'northeast': 1.15}
+    charges = []
+    for i in range(n_samples):
+        age_factor = 1 + (df.iloc[i]['age'] - 18) * 0.02
+        bmi_factor = 1 + (df.iloc[i]['bmi'] - 25) * 0.01
+        children_factor = 1 + df.iloc[i]['children'] * 0.1
+        smoker_factor = 3.0 if df.iloc[i]['smoker'] == 'yes' else 1.0
+        region_factor = region_factors[df.iloc[i]['region']]
+        sex_factor = 1.1 if df.iloc[i]['sex'] == 'male' else 1.0
+        charge = 250 * age_factor * bmi_factor * children_factor * smoker_factor * region_factor * sex_factor
+        charge *= np.random.uniform(0.8, 1.2)
+        charges.append(round(charge, 2))
+    df['charges'] = charges
+    df.to_csv(path, index=False)
+
+
+def counted(func, calls):
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+@pytest.fixture(scope='module')
+def original(tmp_path_factory):
+    path = tmp_path_factory.mktemp('original') / 'insurance.csv'
+    original_dataset(path)
+    return path.read_bytes()
+
+
+def test_defaults_reproduce_the_original(tmp_path, original):
+    path = tmp_path / 'insurance.csv'
+    create_dataset.create_dataset(str(path))
+    assert path.read_bytes() == original
+
+
+def test_pandas_writer_reproduces_the_original(tmp_path, original, monkeypatch):
+    # Without pyarrow every block goes through DataFrame.to_csv
+    find_spec = create_dataset.importlib.util.find_spec
+    monkeypatch.setattr(create_dataset.importlib.util, 'find_spec',
+                        lambda name, *args: None if name == 'pyarrow' else find_spec(name, *args))
+    calls = []
+    monkeypatch.setattr(pd.DataFrame, 'to_csv', counted(pd.DataFrame.to_csv, calls))
+    path = tmp_path / 'insurance.csv'
+    create_dataset.create_dataset(str(path))
+    assert path.read_bytes() == original
+    assert calls
+
+
+def test_round_charges_matches_python_round():
+    rng = np.random.RandomState(0)
+    charges = np.concatenate([rng.uniform(0, 5000, 100000), np.arange(0, 100, 0.005)])
+    assert create_dataset.round_charges(charges).tolist() == [round(float(c), 2) for c in charges]
+
+
+def test_blocks_depend_only_on_seed_and_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_dataset, 'BLOCK_SIZE', 100)
+    create_dataset.create_dataset(str(tmp_path / 'a.csv'), rows=250, seed=9)
+    create_dataset.create_dataset(str(tmp_path / 'b.csv'), rows=250, seed=9)
+    create_dataset.create_dataset(str(tmp_path / 'c.csv'), rows=250, seed=10)
+    first = (tmp_path / 'a.csv').read_bytes()
+    assert first == (tmp_path / 'b.csv').read_bytes()
+    assert first != (tmp_path / 'c.csv').read_bytes()
+    assert first.count(b'\n') == 251
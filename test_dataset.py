@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dataset
+from dataset import hash_source, load_dataset, prune_cache
+from features import CATEGORICAL_COLUMNS, FEATURE_COLUMNS
+
+SOURCE = os.environ['DATASET_PATH']
+
+
+@pytest.mark.parametrize('prefix_size', [0, 5, 16, 17, 768])
+def test_hash_source_hashes_the_prefix_in_the_same_read(tmp_path, monkeypatch, prefix_size):
+    monkeypatch.setattr(dataset, 'HASH_BLOCK_SIZE', 16)
+    content = bytes(range(256)) * 3
+    path = tmp_path / 'data.csv'
+    path.write_bytes(content)
+    full, prefix = hash_source(str(path), prefix_size)
+    assert full == hashlib.sha256(content).hexdigest()
+    assert prefix == hashlib.sha256(content[:prefix_size]).hexdigest()
+    assert hash_source(str(path)) == (full, None)
+
+
+def test_hash_source_without_the_prefix(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_bytes(b'short')
+    assert hash_source(str(path), 100)[1] is None
+
+
+def test_load_dataset_parses_once(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    parsed, cached = load_dataset(SOURCE, cache_dir)
+    assert not cached
+    again, cached = load_dataset(SOURCE, cache_dir)
+    assert cached
+    assert np.array_equal(parsed.X, again.X) and np.array_equal(parsed.y, again.y)
+    assert len(os.listdir(cache_dir)) == 1
+
+    frame = pd.read_csv(SOURCE)
+    for col in CATEGORICAL_COLUMNS:
+        vocabulary = sorted(frame[col].unique())
+        assert again.vocabularies[col] == vocabulary
+        frame[col] = frame[col].map(vocabulary.index)
+    assert again.X.dtype == np.float32
+    assert np.array_equal(again.X, frame[FEATURE_COLUMNS].to_numpy(np.float32))
+    assert np.allclose(again.y, frame['charges'])
+    assert again.source_size == os.path.getsize(SOURCE)
+
+
+def test_a_changed_source_gets_a_new_cache_file(tmp_path):
+    source = tmp_path / 'data.csv'
+    source.write_text(open(SOURCE).read())
+    cache_dir = str(tmp_path / 'cache')
+    first, _ = load_dataset(str(source), cache_dir)
+    with open(source, 'a') as f:
+        f.write('40,male,30.0,2,no,northeast,7000.0\n')
+    second, cached = load_dataset(str(source), cache_dir)
+    assert not cached
+    assert len(second) == len(first) + 1
+    assert second.source_hash != first.source_hash
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_prune_cache_keeps_the_newest_files(tmp_path):
+    for i in range(5):
+        path = tmp_path / f'dataset-{i}.cols'
+        path.write_bytes(b'')
+        os.utime(path, (i, i))
+    (tmp_path / 'dataset-9.cols.123.tmp').write_bytes(b'')
+    prune_cache(str(tmp_path), keep=3)
+    assert sorted(os.listdir(tmp_path)) == ['dataset-2.cols', 'dataset-3.cols', 'dataset-4.cols',
+                                            'dataset-9.cols.123.tmp']
+
+
+def test_a_cache_file_removed_before_mapping_is_parsed_again(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    load_dataset(SOURCE, cache_dir)
+    load = dataset.Dataset.load
+    calls = []
+
+    def removed_once(path, *args):
+        calls.append(path)
+        if len(calls) == 1:
+            raise FileNotFoundError(path)
+        return load(path, *args)
+
+    monkeypatch.setattr(dataset.Dataset, 'load', removed_once)
+    parsed, cached = load_dataset(SOURCE, cache_dir)
+    assert not cached and len(calls) == 2
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import LabelEncoder
+
+from encoding import CategoricalEncoding
+from features import VALID_REGIONS, VALID_SEXES, VALID_SMOKERS
+from tree_engine import CompiledForest
+
+LABELS = {'sex': VALID_SEXES, 'smoker': VALID_SMOKERS, 'region': VALID_REGIONS}
+
+
+@pytest.fixture(scope='module')
+def label_encoders():
+    return {col: LabelEncoder().fit(labels) for col, labels in LABELS.items()}
+
+
+@pytest.fixture(scope='module')
+def encoding(label_encoders):
+    return CategoricalEncoding.from_label_encoders(label_encoders)
+
+
+def test_codes_match_label_encoder(encoding, label_encoders):
+    for col, labels in LABELS.items():
+        values = [labels[i % len(labels)] for i in range(10)]
+        expected = label_encoders[col].transform(values)
+        assert [encoding.encode(col, value) for value in values] == expected.tolist()
+        assert encoding.encode_column(col, values).tolist() == expected.tolist()
+
+
+def test_unknown_labels_raise(encoding):
+    with pytest.raises(ValueError, match="Unknown region category: 'mars'"):
+        encoding.encode('region', 'mars')
+    with pytest.raises(ValueError, match="Unknown sex category: 'other'"):
+        encoding.encode_column('sex', ['male', 'other'])
+
+
+def test_save_and_load(encoding, tmp_path):
+    path = tmp_path / 'encoding.json'
+    with open(path, 'wb') as f:
+        encoding.save(f)
+    assert CategoricalEncoding.load(str(path)).vocabularies == encoding.vocabularies
+
+
+def test_load_rejects_another_format(encoding, tmp_path):
+    buffer = io.BytesIO()
+    encoding.save(buffer)
+    path = tmp_path / 'encoding.json'
+    path.write_bytes(buffer.getvalue().replace(b'"format_version": 1', b'"format_version": 2'))
+    with pytest.raises(ValueError, match='Unsupported encoding format'):
+        CategoricalEncoding.load(str(path))
+
+
+def test_check_accepts_a_matching_model(encoding, label_encoders, sklearn_forest):
+    encoding.check(label_encoders, CompiledForest.from_sklearn(sklearn_forest))
+
+
+def test_check_requires_every_api_label(encoding):
+    vocabularies = {**encoding.vocabularies, 'region': ['northeast', 'northwest', 'southeast']}
+    with pytest.raises(ValueError, match=r"no code for region values \['southwest'\]"):
+        CategoricalEncoding(vocabularies).check()
+
+
+def test_check_compares_codes_with_the_label_encoder(encoding, label_encoders):
+    vocabularies = {**encoding.vocabularies, 'smoker': ['yes', 'no']}
+    with pytest.raises(ValueError, match='Codes for smoker differ'):
+        CategoricalEncoding(vocabularies).check(label_encoders)
+
+
+def test_check_rejects_splits_beyond_the_vocabulary(encoding, insurance_rows):
+    X, _ = insurance_rows
+    X = X.copy()
+    region = X[:, 5].copy()
+    X[:, 5] = region * 2
+    model = RandomForestRegressor(n_estimators=2, random_state=0).fit(X, region * 1000)
+    with pytest.raises(ValueError, match='Model splits region beyond its 4 codes'):
+        encoding.check(forest=CompiledForest.from_sklearn(model))
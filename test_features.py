@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from features import (FEATURE_COLUMNS, RequestValidator, find_missing_field, validate_batch, validate_columns,
+                      validate_features)
+
+VALID = {'age': 30, 'sex': 'male', 'bmi': 25.5, 'children': 1, 'smoker': 'no', 'region': 'southwest'}
+
+ODD_VALUES = [
+    None, True, False, '', 'abc', ' 4 ', '3', '2.5', '1e2', 'nan', 'inf', 2.5, 0.5, -1, 1.9999999,
+    float('nan'), float('inf'), -float('inf'), 1e20, 10 ** 20, -10 ** 20, 2 ** 63, 2 ** 63 - 1, 10 ** 400,
+    [1], {}, 'male', 'yes', 'southwest',
+]
+
+
+def single_row_error(record):
+    """The (error, message) /predict gives a record, or None if it is accepted"""
+    missing = find_missing_field(record)
+    if missing is not None:
+        return 'Missing field', f'Missing required field: {missing}'
+    try:
+        validate_features(record)
+    except (ValueError, TypeError, OverflowError) as e:
+        return 'Validation error', str(e)
+    return None
+
+
+def invalid_records():
+    for field in FEATURE_COLUMNS:
+        for value in ODD_VALUES:
+            yield dict(VALID, **{field: value})
+        yield {key: value for key, value in VALID.items() if key != field}
+    # The first failing field in check order is reported
+    yield dict(VALID, age=5, sex='other', children='many')
+    yield dict(VALID, bmi='heavy', smoker=None)
+
+
+def test_batch_errors_match_single_row():
+    records = list(invalid_records())
+    # Valid rows in between keep the column fast paths in play
+    batch = [record for pair in zip(records, [VALID] * len(records)) for record in pair]
+    columns, errors = validate_batch(batch)
+    for i, record in enumerate(records):
+        assert errors.get(2 * i) == single_row_error(record), record
+        assert 2 * i + 1 not in errors
+
+
+def test_batch_values_match_single_row():
+    records = [VALID, dict(VALID, age='45', bmi='31.25', children=2.0), dict(VALID, children=True)]
+    columns, errors = validate_batch(records)
+    assert errors == {}
+    for i, record in enumerate(records):
+        assert tuple(columns[col][i] for col in FEATURE_COLUMNS) == validate_features(record)
+
+
+def test_batch_rejects_non_objects():
+    _, errors = validate_batch([VALID, [], 'applicant'])
+    assert errors == {1: ('Invalid record', 'Each applicant must be a JSON object'),
+                      2: ('Invalid record', 'Each applicant must be a JSON object')}
+
+
+@pytest.mark.parametrize('field', ['age', 'bmi', 'children'])
+def test_columns_match_single_row(field):
+    """Tabular input, e.g. CSV chunks parsed as strings, fails like a JSON request with the same strings"""
+    values = ['40', '', 'abc', 'nan', '1e400', '99999999999999999999', '-3', '7.5']
+    raw = {col: [str(VALID[col])] * len(values) for col in FEATURE_COLUMNS}
+    raw[field] = values
+    _, errors = validate_columns(raw)
+    for i, value in enumerate(values):
+        assert errors.get(i) == single_row_error(dict(VALID, **{field: value})), value
+
+
+def test_column_types():
+    columns, _ = validate_batch([VALID, VALID])
+    assert columns['age'].dtype == np.float64
+    assert columns['bmi'].dtype == np.float64
+    assert columns['children'].dtype == np.int64
+
+
+def outcome(validate, record):
+    try:
+        return validate(record)
+    except (ValueError, TypeError, OverflowError) as e:
+        return type(e), str(e)
+
+
+def test_request_validator_matches_validate_features():
+    validator = RequestValidator()
+    records = [VALID, dict(VALID, age='45', bmi='31.25', children=2.0), dict(VALID, children=True),
+               *(record for record in invalid_records() if find_missing_field(record) is None)]
+    for record in records:
+        assert outcome(validator.validate, record) == outcome(validate_features, record), record
+
+
+def test_request_validator_reports_the_first_missing_field():
+    validator = RequestValidator()
+    for record in invalid_records():
+        assert validator.missing(record) == find_missing_field(record)
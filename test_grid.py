@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from encoding import CategoricalEncoding
+from grid import PredictionGrid
+
+ENCODING = CategoricalEncoding({
+    'sex': ['female', 'male'],
+    'smoker': ['no', 'yes'],
+    'region': ['northeast', 'northwest', 'southeast', 'southwest'],
+})
+
+
+def bilinear(X):
+    """A model the grid can represent exactly: bilinear in age and BMI within each category block"""
+    age, sex, bmi, children, smoker, region = np.asarray(X, dtype=np.float64).T
+    return 1000 + 20 * age + 3 * bmi + 0.25 * age * bmi + 500 * sex + 7000 * smoker + 100 * region + 40 * children
+
+
+@pytest.fixture(scope='module')
+def grid_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp('grid') / 'grid.npy'
+    PredictionGrid.build(bilinear, ENCODING, str(path), age_step=2.0, bmi_step=0.5)
+    return str(path)
+
+
+def random_rows(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return np.column_stack([
+        rng.uniform(18, 100, n), rng.randint(0, 2, n), rng.uniform(10, 50, n),
+        rng.randint(0, 11, n), rng.randint(0, 2, n), rng.randint(0, 4, n),
+    ]).astype(np.float64)
+
+
+def test_interpolates_between_grid_points(grid_path):
+    grid = PredictionGrid.load(grid_path)
+    assert grid.table.shape == (2, 2, 4, 11, 42, 81)
+    assert isinstance(grid.table, np.memmap)
+    X = random_rows(5000)
+    assert np.allclose(grid.predict(X), bilinear(X), rtol=1e-6)
+
+
+def test_range_ends_are_exact(grid_path):
+    grid = PredictionGrid.load(grid_path)
+    X = random_rows(8)
+    X[:, 0] = [18, 100, 18, 100, 59, 18, 100, 60]
+    X[:, 2] = [10, 50, 50, 10, 10, 33.5, 17.25, 50]
+    assert np.allclose(grid.predict(X), bilinear(X), rtol=1e-6)
+
+
+def test_record_error_is_stored_with_the_table(grid_path):
+    grid = PredictionGrid.load(grid_path)
+    X = random_rows(200, seed=1)
+    max_error, mean_error = grid.record_error(grid_path, lambda X: bilinear(X) + 1.0, X)
+    assert max_error == pytest.approx(1.0, abs=0.01)
+    assert mean_error == pytest.approx(1.0, abs=0.01)
+    reloaded = PredictionGrid.load(grid_path)
+    assert (reloaded.max_error, reloaded.mean_error) == (max_error, mean_error)
@@ -0,0 +1,104 @@
+import logging
+import os
+import threading
+
+import log_pipeline
+from concurrency import WORKER_SLOT_VAR
+from log_pipeline import QueueLogHandler, process_log_path, should_sample
+
+
+def make_logger(handler):
+    handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logger = logging.Logger('test_log_pipeline')
+    logger.addHandler(handler)
+    return logger
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+def test_process_log_path():
+    assert process_log_path('logs/app.log', 'worker3') == os.path.join('logs', 'app.worker3.log')
+    assert process_log_path('app', 'master') == 'app.master'
+
+
+def test_should_sample(monkeypatch):
+    monkeypatch.setattr(log_pipeline.random, 'random', lambda: 0.25)
+    assert should_sample(1.0) and should_sample(0.5)
+    assert not should_sample(0.25) and not should_sample(0.0)
+
+
+def test_records_are_written_in_order(tmp_path):
+    handler = QueueLogHandler(str(tmp_path / 'app.log'), per_process=False, batch_size=7)
+    logger = make_logger(handler)
+    for i in range(100):
+        logger.info(f'request {i}')
+    handler.close()
+    assert read_lines(tmp_path / 'app.log') == [f'INFO request {i}' for i in range(100)]
+
+
+def test_each_process_has_its_own_file(tmp_path, monkeypatch):
+    monkeypatch.setenv(WORKER_SLOT_VAR, 'worker2')
+    handler = QueueLogHandler(str(tmp_path / 'app.log'))
+    make_logger(handler).info('hello')
+    handler.close()
+    assert os.listdir(tmp_path) == ['app.worker2.log']
+
+
+def test_tracebacks_are_rendered_when_logged(tmp_path):
+    handler = QueueLogHandler(str(tmp_path / 'app.log'), per_process=False)
+    logger = make_logger(handler)
+    try:
+        raise ValueError('bad input')
+    except ValueError:
+        logger.exception('failed')
+    handler.close()
+    text = '\n'.join(read_lines(tmp_path / 'app.log'))
+    assert 'ERROR failed' in text and 'ValueError: bad input' in text
+
+
+def test_full_queue_drops_routine_records_but_keeps_warnings(tmp_path, monkeypatch):
+    release = threading.Event()
+    handler = QueueLogHandler(str(tmp_path / 'app.log'), per_process=False, queue_size=2, put_timeout=5)
+    write = handler._write
+
+    def stalled(records, file):
+        release.wait()
+        write(records, file)
+
+    monkeypatch.setattr(handler, '_write', stalled)
+    logger = make_logger(handler)
+    logger.info('first')
+    logger.info('second')
+    logger.info('dropped')
+    assert handler.dropped == 1
+
+    # A warning waits for room instead of being dropped
+    threading.Timer(0.1, release.set).start()
+    logger.warning('kept')
+    handler.close()
+    assert handler.dropped == 1
+    assert read_lines(tmp_path / 'app.log') == ['INFO first', 'INFO second', 'WARNING kept']
+
+
+def test_records_that_fail_to_format_are_counted(tmp_path):
+    handler = QueueLogHandler(str(tmp_path / 'app.log'), per_process=False)
+    logger = make_logger(handler)
+    logger.info('%d items', 'many')
+    logger.info('fine')
+    handler.close()
+    assert handler.write_errors == 1
+    assert read_lines(tmp_path / 'app.log') == ['INFO fine']
+
+
+def test_files_rotate(tmp_path):
+    handler = QueueLogHandler(str(tmp_path / 'app.log'), per_process=False, max_bytes=500, backup_count=2,
+                              batch_size=1)
+    logger = make_logger(handler)
+    for i in range(200):
+        logger.info(f'request {i:04d}')
+    handler.close()
+    assert sorted(os.listdir(tmp_path)) == ['app.log', 'app.log.1', 'app.log.2']
+    assert read_lines(tmp_path / 'app.log')[-1] == 'INFO request 0199'
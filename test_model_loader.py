@@ -0,0 +1,117 @@
+import os
+
+from model_loader import ChangeAwareLoader
+
+
+def publish(path, text):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def read_all(paths):
+    def load():
+        values = []
+        for path in paths:
+            with open(path) as f:
+                values.append(f.read())
+        return tuple(values)
+    return load
+
+
+def test_reloads_only_when_files_change(tmp_path):
+    path = str(tmp_path / 'model')
+    publish(path, 'v1')
+    loader = ChangeAwareLoader([path], read_all([path]))
+    assert loader.get() == ('v1',)
+    assert loader.get() == ('v1',)
+    assert loader.loads == 1
+    publish(path, 'v2')
+    assert loader.get() == ('v2',)
+    assert loader.loads == 2
+
+
+def together_loader(tmp_path):
+    paths = [str(tmp_path / 'model'), str(tmp_path / 'encoders')]
+    for path in paths:
+        publish(path, 'v1')
+    loader = ChangeAwareLoader(paths, read_all(paths), together=True)
+    assert loader.get() == ('v1', 'v1')
+    return paths, loader
+
+
+def test_together_waits_for_the_files_to_settle(tmp_path):
+    paths, loader = together_loader(tmp_path)
+    # Half published: the model of v2 is not paired with the encoders of v1
+    publish(paths[0], 'v2')
+    assert loader.get() == ('v1', 'v1')
+    publish(paths[1], 'v2')
+    assert loader.get() == ('v1', 'v1')
+    assert loader.get() == ('v2', 'v2')
+    assert loader.loads == 2
+
+
+def test_together_reloads_when_one_file_changes(tmp_path):
+    paths, loader = together_loader(tmp_path)
+    publish(paths[1], 'v2')
+    assert loader.get() == ('v1', 'v1')
+    assert loader.get() == ('v1', 'v2')
+
+
+def test_together_waits_for_a_later_check(tmp_path):
+    paths, loader = together_loader(tmp_path)
+    loader.watcher.interval = 60
+    publish(paths[0], 'v2')
+    publish(paths[1], 'v2')
+    loader.watcher.signature(refresh=True)
+    # Calls between two checks see the same marker without a new look at the files
+    assert loader.get() == ('v1', 'v1')
+    assert loader.get() == ('v1', 'v1')
+    loader.watcher.signature(refresh=True)
+    assert loader.get() == ('v2', 'v2')
+
+
+def test_refresh_loads_a_published_set_at_once(tmp_path):
+    paths, loader = together_loader(tmp_path)
+    for path in paths:
+        publish(path, 'v2')
+    assert loader.get(refresh=True) == ('v2', 'v2')
+
+
+def test_load_raced_by_a_publish_is_discarded(tmp_path):
+    path = str(tmp_path / 'model')
+    publish(path, 'v1')
+
+    def load():
+        with open(path) as f:
+            value = f.read()
+        if value == 'v1':
+            publish(path, 'v2')
+        return value
+
+    loader = ChangeAwareLoader([path], load)
+    assert loader.get() is None
+    assert loader.get() == 'v2'
+
+
+def test_failed_load_keeps_the_previous_value(tmp_path):
+    path = str(tmp_path / 'model')
+    publish(path, 'v1')
+    fail = []
+
+    def load():
+        if fail:
+            raise ValueError('corrupt')
+        with open(path) as f:
+            return f.read()
+
+    loader = ChangeAwareLoader([path], load)
+    assert loader.get() == 'v1'
+    fail.append(True)
+    publish(path, 'v2')
+    try:
+        loader.get()
+    except ValueError:
+        pass
+    assert loader.get() == 'v1'
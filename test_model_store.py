@@ -0,0 +1,140 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from model_store import ModelStore, process_alive, write_atomic
+
+
+def stage(store, version):
+    path = store.staging_dir(version)
+    with open(os.path.join(path, 'model.pkl'), 'w') as f:
+        f.write(version)
+    return path
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def test_publish_makes_a_version_current(tmp_path):
+    store = ModelStore(str(tmp_path))
+    assert store.current_version() is None
+    stage(store, 'v1')
+    assert store.versions() == []
+    store.publish('v1')
+    assert store.current_version() == 'v1'
+    assert store.versions() == ['v1']
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.')]
+
+
+def test_generation_changes_on_publish(tmp_path):
+    store = ModelStore(str(tmp_path))
+    assert store.generation() is None
+    stage(store, 'v1')
+    store.publish('v1')
+    first = store.generation(refresh=True)
+    stage(store, 'v2')
+    store.publish('v2')
+    assert store.generation(refresh=True) != first
+
+
+def test_prune_keeps_the_newest_and_the_current_version(tmp_path):
+    store = ModelStore(str(tmp_path))
+    for version in ('v1', 'v2', 'v3', 'v4'):
+        stage(store, version)
+        store.publish(version)
+    # Roll back to an old version, as an operator might
+    write_atomic(store.current_path, lambda f: f.write(b'v1'))
+    os.makedirs(store.jobs_dir)
+    store.prune(2)
+    assert store.versions() == ['v1', 'v3', 'v4']
+    assert os.path.isdir(store.jobs_dir)
+
+
+def test_write_atomic_replaces_the_whole_file(tmp_path):
+    path = str(tmp_path / 'sub' / 'file')
+    write_atomic(path, lambda f: f.write(b'first'))
+    write_atomic(path, lambda f: f.write(b'second'))
+    with open(path, 'rb') as f:
+        assert f.read() == b'second'
+    assert os.listdir(tmp_path / 'sub') == ['file']
+
+
+def test_write_atomic_keeps_the_old_file_on_error(tmp_path):
+    path = str(tmp_path / 'file')
+    write_atomic(path, lambda f: f.write(b'first'))
+
+    def fail(f):
+        f.write(b'partial')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        write_atomic(path, fail)
+    with open(path, 'rb') as f:
+        assert f.read() == b'first'
+    assert os.listdir(tmp_path) == ['file']
+
+
+def test_one_job_at_a_time(tmp_path):
+    store = ModelStore(str(tmp_path))
+    job_id, started = store.start_job({'n': 1}, lambda job_id: os.getpid())
+    assert started
+    assert store.read_job(job_id)['status'] == 'queued'
+    assert store.read_job(job_id)['settings'] == {'n': 1}
+
+    launched = []
+    assert store.start_job({}, launched.append) == (job_id, False)
+    assert launched == []
+
+    store.update_job(job_id, status='succeeded')
+    second, started = store.start_job({}, lambda job_id: os.getpid())
+    assert started and second != job_id
+
+
+def test_job_of_a_dead_process_fails(tmp_path):
+    store = ModelStore(str(tmp_path))
+    job_id, _ = store.start_job({}, lambda job_id: exited_pid())
+    store.update_job(job_id, status='running')
+    assert store.active_job() is None
+    job = store.read_job(job_id)
+    assert job['status'] == 'failed'
+    assert 'without recording a status' in job['error']
+    assert store.start_job({}, lambda job_id: os.getpid())[1]
+
+
+def test_fail_job_keeps_a_final_status(tmp_path):
+    store = ModelStore(str(tmp_path))
+    job_id = store.create_job({})
+    store.update_job(job_id, status='succeeded', version='v1')
+    store.fail_job(job_id, 'gone')
+    assert store.read_job(job_id)['status'] == 'succeeded'
+
+
+def test_failed_launch_fails_the_job(tmp_path):
+    store = ModelStore(str(tmp_path))
+
+    def launch(job_id):
+        raise OSError('no such interpreter')
+
+    with pytest.raises(OSError):
+        store.start_job({}, launch)
+    [name] = [name for name in os.listdir(store.jobs_dir) if name.endswith('.json')]
+    job = store.read_job(name[:-len('.json')])
+    assert job['status'] == 'failed'
+    assert store.active_job() is None
+
+
+def test_process_alive():
+    assert process_alive(os.getpid())
+    assert not process_alive(exited_pid())
+
+
+def test_job_ids_are_checked(tmp_path):
+    store = ModelStore(str(tmp_path))
+    assert store.read_job('../CURRENT') is None
+    with pytest.raises(ValueError):
+        store.update_job('../CURRENT', status='failed')
@@ -0,0 +1,141 @@
+import atexit
+import os
+import threading
+
+import pytest
+
+import profiler
+from concurrency import WORKER_SLOT_VAR
+from profiler import AdaptiveTraceSampler, SamplingProfiler, merge_collapsed
+
+
+def busy_wait(stop):
+    while not stop.is_set():
+        stop.wait(0.001)
+
+
+@pytest.fixture
+def busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_wait, args=(stop,), name='busy;worker')
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def test_sample_counts_the_stacks_of_other_threads(busy_thread):
+    sampler = SamplingProfiler()
+    for _ in range(5):
+        sampler.sample(skip=threading.get_ident())
+    lines = sampler.collapsed().splitlines()
+    [busy] = [line for line in lines if line.startswith('busy:worker;')]
+    stack, count = busy.rsplit(' ', 1)
+    assert int(count) == 5
+    assert 'busy_wait (test_profiler.py:' in stack
+    assert not any('test_sample_counts' in line for line in lines)
+    assert sampler.stats()['samples'] == 5
+
+
+def test_collapsed_reset(busy_thread):
+    sampler = SamplingProfiler()
+    sampler.sample()
+    assert sampler.collapsed(reset=True)
+    assert sampler.collapsed() == ''
+
+
+def test_distinct_stacks_are_capped(busy_thread, monkeypatch):
+    monkeypatch.setattr(profiler, 'MAX_STACKS', 1)
+    sampler = SamplingProfiler()
+    sampler.sample()
+    sampler.sample()
+    assert '[truncated]' in sampler.collapsed()
+
+
+def test_running_profiler_dumps_and_adds_to_its_slot(tmp_path, monkeypatch, busy_thread):
+    monkeypatch.setenv(WORKER_SLOT_VAR, 'worker1')
+    (tmp_path / 'profile.worker1.folded').write_text('earlier;frame 7\n')
+    sampler = SamplingProfiler(hz=1000, output_dir=str(tmp_path))
+    sampler.ensure_running()
+    try:
+        while sampler.samples < 5:
+            threading.Event().wait(0.01)
+    finally:
+        sampler.stop()
+        atexit.unregister(sampler.dump)
+    path = sampler.dump()
+    assert path == os.path.join(str(tmp_path), 'profile.worker1.folded')
+    with open(path) as f:
+        text = f.read()
+    assert 'earlier;frame 7\n' in text
+    assert 'busy:worker;' in text
+    assert sampler.stats()['running'] is False
+
+
+def test_merge_collapsed():
+    merged = merge_collapsed(['a;b 2\nc 1\n', 'a;b 3\n\nd;e f 4\n'])
+    assert merged == 'a;b 5\nc 1\nd;e f 4\n'
+
+
+def test_merge_cli(tmp_path):
+    (tmp_path / 'one.folded').write_text('a;b 2\n')
+    (tmp_path / 'two.folded').write_text('a;b 1\n')
+    output = tmp_path / 'merged.folded'
+    profiler.main([str(tmp_path / 'one.folded'), str(tmp_path / 'two.folded'), '--output', str(output)])
+    assert output.read_text() == 'a;b 3\n'
+
+
+def transaction(path, sampler, seconds, status='ok'):
+    """Run a request through the sampler's hooks; the event if it is sent, else None"""
+    rate = sampler.traces_sampler({'wsgi_environ': {'PATH_INFO': path}})
+    event = {'timestamp': 100.0 + seconds, 'start_timestamp': 100.0, 'contexts': {'trace': {'status': status}}}
+    return rate, sampler.before_send_transaction(event, {})
+
+
+def test_slow_or_failing_paths_are_traced_in_full(monkeypatch):
+    monkeypatch.setattr(profiler.random, 'random', lambda: 0.5)
+    sampler = AdaptiveTraceSampler(base_rate=0.01, slow_ms=250)
+    assert transaction('/predict', sampler, 0.01)[0] == 0.01
+
+    sampler.record('/predict', 0.3, 200)
+    sampler.record('/health', 0.01, 503)
+    sampler.record('/train', 0.01, 404)
+    assert transaction('/health', sampler, 0.01, 'internal_error')[0] == 1.0
+    assert transaction('/train', sampler, 0.01)[0] == 0.01
+
+    # On a flagged path, slow or failed requests are sent and fast ones mostly dropped
+    rate, event = transaction('/predict', sampler, 0.3)
+    assert rate == 1.0 and event is not None
+    assert transaction('/predict', sampler, 0.01, 'internal_error')[1] is not None
+    assert transaction('/predict', sampler, 0.01)[1] is None
+
+
+def test_flags_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profiler.time, 'monotonic', lambda: now[0])
+    sampler = AdaptiveTraceSampler(base_rate=0.0, window=60)
+    sampler.record('/predict', 1.0, 200)
+    assert transaction('/predict', sampler, 0.01)[0] == 1.0
+    now[0] += 61
+    assert transaction('/predict', sampler, 0.01)[0] == 0.0
+
+
+def test_flagged_paths_are_bounded(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(profiler.time, 'monotonic', lambda: now[0])
+    sampler = AdaptiveTraceSampler(window=60, max_paths=2)
+    sampler.record('/a', 1.0, 200)
+    sampler.record('/b', 1.0, 200)
+    sampler.record('/c', 1.0, 200)
+    assert set(sampler._flagged) == {'/a', '/b'}
+    now[0] += 61
+    sampler.record('/c', 1.0, 200)
+    assert set(sampler._flagged) == {'/c'}
+
+
+def test_event_timestamps_may_be_iso_strings():
+    sampler = AdaptiveTraceSampler(base_rate=0.0, slow_ms=250)
+    sampler.record('/predict', 1.0, 200)
+    sampler.traces_sampler({'wsgi_environ': {'PATH_INFO': '/predict'}})
+    event = {'timestamp': '2026-01-01T00:00:00.500000Z', 'start_timestamp': '2026-01-01T00:00:00Z'}
+    assert sampler.before_send_transaction(event, {}) is event
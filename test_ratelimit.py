@@ -0,0 +1,92 @@
+import pytest
+
+import cache
+import ratelimit
+from cache import LocalSharedCache
+from ratelimit import RateLimiter, SlidingWindowLimiter, TokenBucketLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        # Start of a 60 s window
+        self.now = 6000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, 'time', clock)
+    monkeypatch.setattr(cache, 'time', clock)
+    return clock
+
+
+class BrokenLimiter:
+    def hit(self, key, limit, window):
+        raise ConnectionError('down')
+
+
+def test_token_bucket_allows_a_burst_then_refills(clock):
+    limiter = TokenBucketLimiter()
+    assert [limiter.hit('a', 3, 60) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.hit('a', 3, 60) == pytest.approx(20.0)
+    assert limiter.hit('b', 3, 60) == 0.0
+    clock.now += 20
+    assert limiter.hit('a', 3, 60) == 0.0
+    assert limiter.hit('a', 3, 60) == pytest.approx(20.0)
+
+
+def test_token_bucket_bounds_its_keys(clock):
+    limiter = TokenBucketLimiter(max_keys=2)
+    for key in ('a', 'b', 'c'):
+        limiter.hit(key, 1, 60)
+    # 'a' was dropped, so it starts with a full bucket again
+    assert limiter.hit('a', 1, 60) == 0.0
+    assert limiter.hit('c', 1, 60) > 0
+
+
+def test_sliding_window_counts_across_limiters(clock):
+    store = LocalSharedCache()
+    workers = [SlidingWindowLimiter(store), SlidingWindowLimiter(store)]
+    assert [workers[i % 2].hit('a', 4, 60) for i in range(4)] == [0.0] * 4
+    # The 5 requests of this window weigh on the next one until it is 24 s old
+    retry_after = workers[0].hit('a', 4, 60)
+    assert retry_after == pytest.approx(84.0)
+    clock.now += retry_after
+    assert workers[1].hit('a', 4, 60) == 0.0
+
+
+def test_sliding_window_weights_the_previous_window(clock):
+    limiter = SlidingWindowLimiter(LocalSharedCache())
+    for _ in range(4):
+        limiter.hit('a', 4, 60)
+    # Half of the previous window still overlaps: 2 of its 4 requests count
+    clock.now += 90
+    assert [limiter.hit('a', 4, 60) for _ in range(2)] == [0.0, 0.0]
+    retry_after = limiter.hit('a', 4, 60)
+    assert retry_after == pytest.approx(30.0)
+    clock.now += retry_after
+    assert limiter.hit('a', 4, 60) == 0.0
+    # Rejected requests count, so retrying early pushes the next slot back
+    assert limiter.hit('a', 4, 60) > 0
+    assert limiter.hit('a', 4, 60) > retry_after
+
+
+def test_rate_limiter_checks_the_local_bucket_first(clock):
+    store = LocalSharedCache()
+    limiter = RateLimiter(TokenBucketLimiter(), SlidingWindowLimiter(store))
+    assert limiter.hit('a', 1, 60) == 0.0
+    assert limiter.hit('a', 1, 60) > 0
+    # The rejected request never reached the shared window
+    assert store.get('ratelimit:a:100') == b'1'
+
+
+def test_rate_limiter_fails_open(clock):
+    limiter = RateLimiter(TokenBucketLimiter(), BrokenLimiter())
+    assert limiter.hit('a', 1, 60) == 0.0
+    assert limiter.hit('a', 1, 60) > 0
@@ -0,0 +1,182 @@
+import os
+
+import numpy as np
+import pytest
+
+from model_store import ModelStore
+from registry import DEFAULT_MODEL, ModelRegistry, ShadowScorer, parse_spec, parse_stores
+
+
+class FakeModel:
+    """Stands in for a LoadedModel; predicts the offset of its version for every row"""
+
+    engine = 'fake'
+    nbytes = 100
+
+    def __init__(self, version, offset):
+        self.version = version
+        self.offset = offset
+        self.encoding = offset
+        self.name = None
+        self.latency = {}
+
+    def predict(self, X):
+        return np.full(len(X), float(self.offset))
+
+
+def publish(store, version, offset=0):
+    with open(os.path.join(store.staging_dir(version), 'offset'), 'w') as f:
+        f.write(str(offset))
+    store.publish(version)
+
+
+# Versions loaded by load(), in order
+loads = []
+
+
+def load(store, version):
+    loads.append(version)
+    with open(os.path.join(store.version_dir(version), 'offset')) as f:
+        offset = int(f.read())
+    if offset < 0:
+        raise RuntimeError(f"Cannot load {version}")
+    return FakeModel(version, offset)
+
+
+@pytest.fixture
+def stores(tmp_path):
+    loads.clear()
+    return {DEFAULT_MODEL: ModelStore(str(tmp_path / 'default')), 'candidate': ModelStore(str(tmp_path / 'candidate'))}
+
+
+def test_parse_stores():
+    assert parse_stores(' a=/models/a, b=/models/b ,') == {'a': '/models/a', 'b': '/models/b'}
+    assert parse_stores('') == {}
+    for value in ('a', 'a=', '=dir', 'a@1=dir'):
+        with pytest.raises(ValueError):
+            parse_stores(value)
+
+
+def test_parse_spec():
+    assert parse_spec(None) == (DEFAULT_MODEL, None)
+    assert parse_spec('candidate') == ('candidate', None)
+    assert parse_spec('candidate@v2') == ('candidate', 'v2')
+    assert parse_spec('@v2') == (DEFAULT_MODEL, 'v2')
+
+
+def test_published_versions_load_once(stores):
+    registry = ModelRegistry(stores, load)
+    assert registry.published() is None
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    first = registry.published(refresh=True)
+    assert first.version == 'v1' and first.name == DEFAULT_MODEL
+    assert registry.published(refresh=True) is first
+
+    publish(stores[DEFAULT_MODEL], 'v2', 2)
+    second = registry.published(refresh=True)
+    assert second.version == 'v2'
+    assert loads == ['v1', 'v2']
+    # The replaced version is let go of
+    assert list(registry.stats()['loaded']) == ['default@v2']
+
+
+def test_a_version_that_fails_to_load_keeps_the_previous_one(stores):
+    registry = ModelRegistry(stores, load)
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    first = registry.published(refresh=True)
+    publish(stores[DEFAULT_MODEL], 'v2', -1)
+    with pytest.raises(RuntimeError):
+        registry.published(refresh=True)
+    # Not retried until the next publish
+    assert registry.published(refresh=True) is first
+    assert loads == ['v1', 'v2']
+
+
+def test_get_by_spec(stores):
+    registry = ModelRegistry(stores, load)
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    publish(stores['candidate'], 'c1', 10)
+    publish(stores['candidate'], 'c2', 20)
+    assert registry.get().offset == 1
+    assert registry.get('candidate').offset == 20
+    assert registry.get('candidate@c1').offset == 10
+    assert registry.get('candidate@c1') is registry.get('candidate@c1')
+    for spec in ('other', 'candidate@c3', 'candidate@../default/v1'):
+        with pytest.raises(KeyError):
+            registry.get(spec)
+
+
+def test_memory_budget_evicts_the_least_recently_used(stores):
+    registry = ModelRegistry(stores, load, memory_budget=250)
+    for version in ('v1', 'v2', 'v3'):
+        publish(stores['candidate'], version, 0)
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    registry.get()
+    registry.get('candidate@v1')
+    registry.get('candidate@v2')
+    # Over budget: the published model stays, the oldest other version goes
+    assert sorted(registry.stats()['loaded']) == ['candidate@v2', 'default@v1']
+    registry.get('candidate@v1')
+    assert sorted(registry.stats()['loaded']) == ['candidate@v1', 'default@v1']
+    assert registry.stats()['loaded_bytes'] == 200
+
+
+def test_timed_records_latency_per_role(stores):
+    registry = ModelRegistry(stores, load)
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    model = registry.get()
+    with registry.timed(model):
+        pass
+    registry.observe(model, 'shadow', 0.5)
+    latency = registry.stats()['loaded']['default@v1']['latency']
+    assert latency['primary']['calls'] == 1
+    assert latency['shadow'] == {'calls': 1, 'mean_ms': 500.0}
+
+
+def shadow_scorer(stores, max_pending=100):
+    registry = ModelRegistry(stores, load)
+    publish(stores[DEFAULT_MODEL], 'v1', 1)
+    publish(stores['candidate'], 'c1', 10)
+    return registry, ShadowScorer(registry, 'candidate', max_pending)
+
+
+def test_shadow_scores_off_the_request_path(stores):
+    registry, shadow = shadow_scorer(stores)
+    primary = registry.get()
+    encodings = []
+
+    def encode(encoding):
+        encodings.append(encoding)
+        return np.zeros((3, 6))
+
+    shadow.submit(primary, encode, [1.0, 1.0, 1.0])
+    shadow._executor.shutdown(wait=True)
+    assert encodings == [10]
+    assert shadow.stats() == {'model': 'candidate', 'scored': 1, 'dropped': 0, 'failed': 0, 'pending': 0}
+    assert registry.stats()['loaded']['candidate@c1']['latency']['shadow']['calls'] == 1
+
+
+def test_shadow_drops_requests_beyond_max_pending(stores):
+    registry, shadow = shadow_scorer(stores, max_pending=0)
+    shadow.submit(registry.get(), lambda encoding: np.zeros((1, 6)), [1.0])
+    shadow._executor.shutdown(wait=True)
+    assert shadow.stats()['dropped'] == 1 and shadow.stats()['scored'] == 0
+
+
+def test_shadow_failures_are_counted(stores):
+    registry, shadow = shadow_scorer(stores)
+
+    def encode(encoding):
+        raise ValueError('no code for a label')
+
+    shadow.submit(registry.get(), encode, [1.0])
+    shadow._executor.shutdown(wait=True)
+    assert shadow.stats()['failed'] == 1 and shadow.stats()['pending'] == 0
+
+
+def test_shadow_skips_the_primary_itself(stores):
+    registry, _ = shadow_scorer(stores)
+    shadow = ShadowScorer(registry, DEFAULT_MODEL)
+    shadow.submit(registry.get(), lambda encoding: np.zeros((1, 6)), [1.0])
+    shadow._executor.shutdown(wait=True)
+    assert shadow.stats()['scored'] == 0 and shadow.stats()['failed'] == 0
@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+import score
+from app_production import app
+from features import FEATURE_COLUMNS
+
+APPLICANTS = pd.DataFrame({
+    'id': range(8),
+    'age': [19, 45, 'forty', 60, 33, 150, 27, 52],
+    'sex': ['female', 'male', 'male', 'female', 'other', 'male', 'female', 'male'],
+    'bmi': [27.9, 31.2, 22.0, 40.5, 25.0, 30.0, 18.5, 35.1],
+    'children': [0, 2, 1, 3, 0, 1, 0, 4],
+    'smoker': ['yes', 'no', 'no', 'yes', 'no', 'no', 'yes', 'no'],
+    'region': ['southwest', 'northeast', 'southeast', 'northwest', 'southwest', 'northeast', 'southeast',
+               'northwest'],
+})
+INVALID = [2, 4, 5]
+
+
+@pytest.fixture(scope='module')
+def model_dir():
+    # Importing the app trained and published a model in the test store
+    assert app.current_model() is not None
+    return os.environ['MODEL_DIR']
+
+
+@pytest.fixture
+def applicants_csv(tmp_path):
+    path = str(tmp_path / 'applicants.csv')
+    APPLICANTS.to_csv(path, index=False)
+    return path
+
+
+def expected_usd(row):
+    response = app.test_client().post('/predict', json={col: row[col] for col in FEATURE_COLUMNS})
+    return response.get_json()['predicted_charges_usd']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_scores_every_row_in_order(model_dir, applicants_csv, tmp_path, workers):
+    output = str(tmp_path / 'scored.csv')
+    summary = score.score_file(applicants_csv, output, model_dir, chunk_size=3, workers=workers)
+    assert summary['rows'] == len(APPLICANTS)
+    assert summary['rejected'] == len(INVALID)
+    assert summary['version'] == app.current_model().version
+
+    scored = pd.read_csv(output, keep_default_na=False)
+    assert scored['id'].tolist() == APPLICANTS['id'].tolist()
+    for i, row in APPLICANTS.iterrows():
+        if i in INVALID:
+            assert scored['error'][i] != ''
+            assert scored['predicted_charges_usd'][i] == ''
+        else:
+            assert scored['error'][i] == ''
+            assert float(scored['predicted_charges_usd'][i]) == pytest.approx(expected_usd(row), abs=0.01)
+
+
+def test_explain_columns_add_up(model_dir, applicants_csv, tmp_path):
+    output = str(tmp_path / 'scored.csv')
+    score.score_file(applicants_csv, output, model_dir, workers=1, explain=True)
+    scored = pd.read_csv(output).drop(index=INVALID)
+    contributions = scored[[f'contribution_{col}_usd' for col in FEATURE_COLUMNS]].sum(axis=1)
+    assert np.allclose(scored['baseline_usd'] + contributions, scored['predicted_charges_usd'], atol=0.1)
+
+
+def test_parquet_schema_does_not_depend_on_the_chunk(model_dir, applicants_csv, tmp_path):
+    output = str(tmp_path / 'scored.parquet')
+    # The first chunk has only integer ages, the second a typo
+    score.score_file(applicants_csv, output, model_dir, chunk_size=2, workers=1)
+    table = pq.read_table(output)
+    assert str(table.schema.field('age').type) == 'double'
+    assert str(table.schema.field('id').type) == 'double'
+    assert str(table.schema.field('error').type) == 'string'
+    ages = table.column('age').to_pylist()
+    assert ages[2] is None and ages[:2] == [19.0, 45.0]
+
+
+def test_missing_columns_are_reported(model_dir, tmp_path):
+    path = str(tmp_path / 'applicants.csv')
+    APPLICANTS.drop(columns=['bmi', 'region']).to_csv(path, index=False)
+    with pytest.raises(ValueError, match='missing columns: bmi, region'):
+        score.score_file(path, str(tmp_path / 'scored.csv'), model_dir, workers=1)
+
+
+def test_no_published_model(tmp_path):
+    with pytest.raises(RuntimeError, match='No published model'):
+        score.resolve_version(str(tmp_path))
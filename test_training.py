@@ -0,0 +1,85 @@
+import pytest
+
+import training
+from config import config
+from model_store import ModelStore
+
+with open(config['testing'].DATASET_PATH) as f:
+    LINES = f.readlines()
+# The test sources start with the first 1000 rows and have the rest appended
+INITIAL_ROWS, APPENDED_ROWS = LINES[:1001], LINES[1001:]
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(training, 'N_ESTIMATORS', 10)
+    source = tmp_path / 'insurance.csv'
+    source.write_text(''.join(INITIAL_ROWS))
+    return {
+        **{key: getattr(config['testing'], key) for key in training.TRAINING_SETTINGS},
+        'DATASET_PATH': str(source),
+        'MODEL_DIR': str(tmp_path / 'models'),
+        'TRAIN_WARM_START_TREES': 5,
+        'TRAIN_MAX_TREES': 20,
+        'ENABLE_METRICS': False,
+    }
+
+
+def append_rows(settings, rows):
+    with open(settings['DATASET_PATH'], 'a') as f:
+        f.writelines(rows)
+
+
+def train(settings, **kwargs):
+    report = {}
+    version = training.train_and_publish(settings, report=report, **kwargs)
+    return version, report, ModelStore(settings['MODEL_DIR']).training_info(version)
+
+
+def test_appended_rows_grow_the_current_forest(settings):
+    first, report, _ = train(settings)
+    assert report['mode'] == 'full' and not report['dataset_cached']
+
+    append_rows(settings, APPENDED_ROWS[:100])
+    second, report, info = train(settings)
+    assert report['mode'] == 'warm_start'
+    assert report['n_estimators'] == 15
+    assert report['rows'] == 1100
+    assert info['parent_version'] == first
+    model = ModelStore(settings['MODEL_DIR']).load(second, engine='sklearn').model
+    assert len(model.estimators_) == 15
+
+
+def test_unchanged_source_is_read_from_the_cache(settings):
+    train(settings)
+    _, report, _ = train(settings)
+    assert report['dataset_cached']
+    # Nothing was appended, so there is nothing to warm start on
+    assert report['mode'] == 'full'
+
+
+def test_edited_rows_retrain_from_scratch(settings):
+    train(settings)
+    # The first row's age changes from 19 to 20 along with the appended rows
+    edited = [INITIAL_ROWS[0], '20' + INITIAL_ROWS[1][2:], *INITIAL_ROWS[2:], *APPENDED_ROWS[:10]]
+    with open(settings['DATASET_PATH'], 'w') as f:
+        f.writelines(edited)
+    _, report, info = train(settings)
+    assert report['mode'] == 'full'
+    assert info['parent_version'] is None
+
+
+def test_warm_start_stops_at_the_tree_limit(settings):
+    train(settings)
+    for start in (0, 10, 20):
+        append_rows(settings, APPENDED_ROWS[start:start + 10])
+        _, report, _ = train(settings)
+    # 10 + 5 + 5 trees reach TRAIN_MAX_TREES; the third update retrains
+    assert report['mode'] == 'full' and report['n_estimators'] == 10
+
+
+def test_full_forces_a_retrain(settings):
+    train(settings)
+    append_rows(settings, APPENDED_ROWS[:10])
+    _, report, _ = train(settings, full=True)
+    assert report['mode'] == 'full'
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from tree_engine import CompiledForest, PARITY_TOLERANCE
+
+
+@pytest.fixture(scope='module')
+def forest(sklearn_forest):
+    return CompiledForest.from_sklearn(sklearn_forest)
+
+
+def edge_rows(model, X):
+    """Rows with one feature set exactly at, and just above, a split threshold of the forest"""
+    rows = []
+    rng = np.random.RandomState(0)
+    for estimator in model.estimators_[:5]:
+        tree = estimator.tree_
+        for node in np.flatnonzero(tree.children_left != -1)[:40]:
+            row = X[rng.randint(len(X))].copy()
+            threshold = np.float32(tree.threshold[node])
+            for value in (threshold, np.nextafter(threshold, np.float32(np.inf))):
+                row[tree.feature[node]] = value
+                rows.append(row.copy())
+    return np.array(rows)
+
+
+def test_predict_matches_sklearn(sklearn_forest, forest, insurance_rows):
+    X, _ = insurance_rows
+    X = np.vstack([X, edge_rows(sklearn_forest, X)])
+    assert np.max(np.abs(forest.predict(X) - sklearn_forest.predict(X))) <= PARITY_TOLERANCE
+    for row in X[:50]:
+        assert forest.predict(row[None, :])[0] == pytest.approx(sklearn_forest.predict(row[None, :])[0],
+                                                                abs=PARITY_TOLERANCE)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_save_and_load(tmp_path, forest, insurance_rows, compact):
+    X, _ = insurance_rows
+    if compact:
+        forest = forest.compact(1.0)
+    path = tmp_path / 'forest.bin'
+    forest.save(path)
+    loaded = CompiledForest.load(path)
+    for name in ('feature', 'threshold', 'children', 'value', 'roots'):
+        assert getattr(loaded, name).dtype == getattr(forest, name).dtype
+    assert np.array_equal(loaded.predict(X), forest.predict(X))
+
+
+def test_compact_keeps_every_split(sklearn_forest, forest, insurance_rows):
+    X, _ = insurance_rows
+    X = np.vstack([X, edge_rows(sklearn_forest, X)])
+    compacted = forest.compact()
+    assert compacted.threshold.dtype == np.float32 and compacted.value.dtype == np.float32
+    assert compacted.children.dtype == np.uint16 and compacted.feature.dtype == np.uint8
+    # Only the float32 leaf values can move a prediction
+    expected = sklearn_forest.predict(X)
+    assert np.allclose(compacted.predict(X), expected, rtol=1e-6, atol=0)
+    assert compacted.predict(X[:1])[0] == pytest.approx(expected[0], rel=1e-6)
+
+
+@pytest.mark.parametrize('tolerance', [1.0, 25.0])
+def test_compact_merges_within_tolerance(sklearn_forest, forest, insurance_rows, tolerance):
+    X, _ = insurance_rows
+    compacted = forest.compact(tolerance)
+    assert compacted.node_count < forest.node_count
+    error = np.max(np.abs(compacted.predict(X) - sklearn_forest.predict(X)))
+    assert error <= tolerance + 1e-6 * np.max(np.abs(forest.value))
+
+
+def test_explanation_adds_up(forest, insurance_rows):
+    X, _ = insurance_rows
+    predictions, bias, contributions = forest.explain(X[:200])
+    assert np.allclose(bias + contributions.sum(axis=1), predictions)
+
+
+def per_node_quantiles(forest, X, y, points):
+    """Reference leaf quantiles computed one node at a time"""
+    leaves = forest._leaves(np.asarray(X, dtype=np.float32))
+    table = np.repeat(np.asarray(forest.value, dtype=np.float32)[:, None], points, axis=1)
+    levels = (np.arange(points) + 0.5) / points
+    for node in np.unique(leaves):
+        targets = np.sort(np.repeat(y, forest.n_trees)[leaves.ravel() == node])
+        table[node] = targets[np.minimum((levels * len(targets)).astype(np.intp), len(targets) - 1)]
+    return table
+
+
+def test_leaf_quantiles_cover_leaves_only(sklearn_forest, insurance_rows):
+    X, y = insurance_rows
+    forest = CompiledForest.from_sklearn(sklearn_forest)
+    forest.fit_leaf_quantiles(X, y, points=8)
+    leaves = np.asarray(forest.children).reshape(-1, 2)[:, 0] == np.arange(forest.node_count)
+    assert len(forest.leaf_quantiles) == np.count_nonzero(leaves)
+
+    # A forest saved with a row for every node scores the same quantiles
+    legacy = CompiledForest.from_sklearn(sklearn_forest)
+    legacy.leaf_quantiles = per_node_quantiles(legacy, X, y, 8)
+    levels = (0.1, 0.5, 0.9)
+    _, _, quantiles = forest.score(X[:300], quantiles=levels)
+    _, _, expected = legacy.score(X[:300], quantiles=levels)
+    assert np.array_equal(quantiles, expected)
+
+
+def test_score_without_quantiles_raises(forest, insurance_rows):
+    X, _ = insurance_rows
+    with pytest.raises(ValueError):
+        forest.score(X[:2], quantiles=(0.5,))
+
+
+def test_quantiles_are_ordered(sklearn_forest, insurance_rows):
+    X, y = insurance_rows
+    forest = CompiledForest.from_sklearn(sklearn_forest)
+    forest.fit_leaf_quantiles(X, y, points=16)
+    _, _, quantiles = forest.score(X[:500], quantiles=(0.05, 0.5, 0.95))
+    assert np.all(np.diff(quantiles, axis=1) >= 0)
+    # Leaf quantiles are stored as float32
+    assert np.float32(y.min()) <= quantiles.min() and quantiles.max() <= np.float32(y.max())
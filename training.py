@@ -0,0 +1,299 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import sys
+import time
+import traceback
+import warnings
+
+from concurrency import limit_native_threads
+from dataset import hash_source, load_dataset
+from encoding import CategoricalEncoding
+from grid import PredictionGrid
+from model_store import (ModelStore, write_atomic, MODEL_FILE, ENCODERS_FILE,
+                         ENCODING_FILE, FOREST_FILE, GRID_FILE, TRAINING_FILE)
+from tree_engine import CompiledForest, PARITY_TOLERANCE, compaction_report
+
+warnings.filterwarnings('ignore')
+
+# Config keys a training run needs; they are copied into the job record so a
+# background run uses exactly the settings of the app that started it
+TRAINING_SETTINGS = [
+    'DATASET_PATH', 'MODEL_DIR', 'MODEL_PATH', 'ENCODERS_PATH', 'MODEL_KEEP_VERSIONS',
+    'GRID_MODE', 'GRID_AGE_STEP', 'GRID_BMI_STEP',
+    'TRAIN_N_JOBS', 'TRAIN_WARM_START', 'TRAIN_WARM_START_TREES', 'TRAIN_MAX_TREES',
+    'FOREST_COMPACT', 'FOREST_MERGE_TOLERANCE', 'FOREST_COMPACT_MAX_ERROR', 'QUANTILE_POINTS',
+    'ENABLE_METRICS',
+]
+
+# Random forest hyperparameters of a full training run
+N_ESTIMATORS = 100
+MAX_DEPTH = 10
+RANDOM_STATE = 1
+
+# The compiled forest is compared with sklearn on at most this many evenly
+# spaced training rows, so publishing stays fast on large datasets
+PARITY_CHECK_ROWS = 20000
+
+# Leaf quantiles are fitted on at most this many evenly spaced training rows
+QUANTILE_FIT_ROWS = 100000
+
+logger = logging.getLogger(__name__)
+
+
+def training_settings(app_config):
+    """Extract the training settings from a Flask config mapping"""
+    return {key: app_config[key] for key in TRAINING_SETTINGS}
+
+
+def fit_model(X, y, n_jobs=1):
+    """Train a new Random Forest model on an encoded feature matrix"""
+    # Imported here so serving processes never load the training stack
+    from sklearn.ensemble import RandomForestRegressor
+
+    model = RandomForestRegressor(n_estimators=N_ESTIMATORS, max_depth=MAX_DEPTH,
+                                  random_state=RANDOM_STATE, n_jobs=n_jobs)
+    model.fit(X, y)
+    return model
+
+
+def grow_model(model, X, y, extra_trees, n_jobs=1):
+    """Add trees fitted on the updated dataset to an existing forest"""
+    model.set_params(warm_start=True, n_estimators=model.n_estimators + extra_trees, n_jobs=n_jobs)
+    model.fit(X, y)
+    model.set_params(warm_start=False)
+    return model
+
+
+def can_warm_start(settings, previous, prefix_hash, source_hash, dataset):
+    """Whether the dataset only had rows appended since the previous version was trained"""
+    return bool(
+        settings['TRAIN_WARM_START']
+        and previous is not None
+        and prefix_hash == previous['source_hash']
+        and source_hash != previous['source_hash']
+        and dataset.vocabularies == previous['vocabularies']
+        and previous['n_estimators'] + settings['TRAIN_WARM_START_TREES'] <= settings['TRAIN_MAX_TREES']
+    )
+
+
+def publish_model(settings, model, label_encoders, X, log=logger, training_info=None, y=None):
+    """Write a new model version with all serving artifacts and make it current"""
+    store = ModelStore(settings['MODEL_DIR'])
+    version = store.new_version()
+    path = store.staging_dir(version)
+
+    with open(os.path.join(path, MODEL_FILE), 'wb') as f:
+        pickle.dump(model, f)
+    with open(os.path.join(path, ENCODERS_FILE), 'wb') as f:
+        pickle.dump(label_encoders, f)
+
+    # Export the sklearn-free encoding table once it agrees with the encoders and the model
+    forest = CompiledForest.from_sklearn(model)
+    encoding = CategoricalEncoding.from_label_encoders(label_encoders)
+    encoding.check(label_encoders, forest)
+    with open(os.path.join(path, ENCODING_FILE), 'wb') as f:
+        encoding.save(f)
+
+    # Export the flat-array inference engine if it reproduces sklearn
+    predict = model.predict
+    step = max(1, len(X) // PARITY_CHECK_ROWS)
+    error = forest.max_abs_error(model, X[::step])
+    if error > PARITY_TOLERANCE:
+        log.error(f"Compiled forest differs from sklearn by {error:.3g}, not exporting it")
+    else:
+        if settings['FOREST_COMPACT']:
+            forest = compact_forest(settings, forest, X[::step], None if y is None else y[::step],
+                                    log, training_info)
+        if y is not None and settings['QUANTILE_POINTS']:
+            quantile_step = max(1, len(X) // QUANTILE_FIT_ROWS)
+            forest.fit_leaf_quantiles(X[::quantile_step], y[::quantile_step], settings['QUANTILE_POINTS'])
+        forest.save(os.path.join(path, FOREST_FILE))
+        predict = forest.predict
+        log.info(f"Compiled forest exported (max abs error vs sklearn: {error:.3g})")
+
+    # Precompute the lookup table from the freshly trained forest
+    if settings['GRID_MODE']:
+        grid_path = os.path.join(path, GRID_FILE)
+        grid = PredictionGrid.build(
+            predict, encoding, grid_path,
+            age_step=settings['GRID_AGE_STEP'],
+            bmi_step=settings['GRID_BMI_STEP']
+        )
+        max_error, mean_error = grid.record_error(grid_path, predict, X)
+        log.info(f"Prediction grid exported with shape {grid.table.shape} "
+                 f"(error vs forest on training set: max {max_error:.2f}, mean {mean_error:.2f})")
+
+    if training_info is not None:
+        with open(os.path.join(path, TRAINING_FILE), 'w') as f:
+            json.dump(training_info, f)
+
+    store.publish(version)
+
+    # Keep the single-file artifacts used by app.py in sync, replaced atomically
+    write_atomic(settings['MODEL_PATH'], lambda f: pickle.dump(model, f))
+    write_atomic(settings['ENCODERS_PATH'], lambda f: pickle.dump(label_encoders, f))
+
+    store.prune(settings['MODEL_KEEP_VERSIONS'])
+    return version
+
+
+def compact_forest(settings, forest, X, y, log=logger, training_info=None):
+    """The compacted forest if it stays within FOREST_COMPACT_MAX_ERROR of ``forest`` on X, else ``forest``
+
+    The size, accuracy and latency comparison is logged and recorded under
+    ``compaction`` in ``training_info``.
+    """
+    compacted = forest.compact(settings['FOREST_MERGE_TOLERANCE'])
+    report = compaction_report(forest, compacted, X, y)
+    accepted = report['max_abs_diff'] <= settings['FOREST_COMPACT_MAX_ERROR']
+    report['exported'] = accepted
+    if training_info is not None:
+        training_info['compaction'] = report
+
+    original, compact = report['original'], report['compact']
+    summary = (f"{original['nodes']} -> {compact['nodes']} nodes, "
+               f"{original['bytes'] / 1e6:.2f} -> {compact['bytes'] / 1e6:.2f} MB, "
+               f"single row {original['single_row_us']} -> {compact['single_row_us']} us, "
+               f"max abs diff {report['max_abs_diff']:.4g}")
+    if not accepted:
+        log.warning(f"Compact forest exceeds FOREST_COMPACT_MAX_ERROR, exporting the full one ({summary})")
+        return forest
+    log.info(f"Compact forest exported ({summary})")
+    return compacted
+
+
+def record_training_seconds(settings, seconds):
+    """Set the training duration gauge if anything can report it
+
+    That is a serving process that already has the metrics loaded, or a
+    training process writing to the multiprocess directory of the workers
+    that started it. A standalone run never imports prometheus_client.
+    """
+    if not settings.get('ENABLE_METRICS', True):
+        return
+    if 'metrics' in sys.modules or os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        import metrics
+        metrics.TRAINING_SECONDS.set(seconds)
+
+
+def train_and_publish(settings, log=logger, full=False, report=None):
+    """Train on the configured dataset and publish the result as a new version
+
+    The parsed dataset is cached by the source file's hash. If the source only
+    had rows appended since the current version was trained, that forest is
+    grown by TRAIN_WARM_START_TREES trees fitted on the updated data instead
+    of being retrained from scratch; ``full`` forces a full retrain. Phase
+    timings and the training mode are added to ``report`` if given.
+    """
+    report = {} if report is None else report
+    phases = report.setdefault('phases', {})
+    start = last = time.perf_counter()
+
+    def mark(phase):
+        nonlocal last
+        now = time.perf_counter()
+        phases[phase] = round(now - last, 4)
+        last = now
+
+    # The training stack is imported lazily; count it separately from fitting
+    import sklearn.ensemble  # noqa: F401
+    mark('imports')
+
+    store = ModelStore(settings['MODEL_DIR'])
+    previous_version = store.current_version()
+    previous = store.training_info(previous_version) if previous_version else None
+
+    source_hash, prefix_hash = hash_source(
+        settings['DATASET_PATH'], previous['source_size'] if previous else None)
+    mark('hash')
+
+    dataset, cached = load_dataset(settings['DATASET_PATH'], store.datasets_dir, source_hash)
+    mark('load')
+
+    if not full and can_warm_start(settings, previous, prefix_hash, source_hash, dataset):
+        mode = 'warm_start'
+        previous_model = store.load(previous_version, engine='sklearn').model
+        mark('load_model')
+        model = grow_model(previous_model, dataset.X, dataset.y,
+                           settings['TRAIN_WARM_START_TREES'], settings['TRAIN_N_JOBS'])
+    else:
+        mode = 'full'
+        model = fit_model(dataset.X, dataset.y, settings['TRAIN_N_JOBS'])
+    mark('fit')
+
+    report.update(mode=mode, dataset_cached=cached, rows=len(dataset), n_estimators=model.n_estimators)
+    training_info = {
+        'mode': mode,
+        'source_hash': source_hash,
+        'source_size': dataset.source_size,
+        'rows': len(dataset),
+        'n_estimators': model.n_estimators,
+        'vocabularies': dataset.vocabularies,
+        'parent_version': previous_version if mode == 'warm_start' else None,
+    }
+    version = publish_model(settings, model, dataset.label_encoders(), dataset.X, log, training_info, dataset.y)
+    mark('publish')
+    if 'compaction' in training_info:
+        report['compaction'] = training_info['compaction']
+
+    record_training_seconds(settings, time.perf_counter() - start)
+    log.info(
+        f"Model version {version} trained and published ({mode}, {model.n_estimators} trees, "
+        f"{len(dataset)} rows, dataset {'cached' if cached else 'parsed'}): "
+        + ', '.join(f"{phase} {seconds:.3f}s" for phase, seconds in phases.items())
+    )
+    return version
+
+
+def run_job(model_dir, job_id):
+    """Run a queued training job, recording its progress in the job file"""
+    store = ModelStore(model_dir)
+    job = store.update_job(job_id, status='running', started_at=time.time(), pid=os.getpid())
+    report = {}
+    try:
+        version = train_and_publish(job['settings'], report=report)
+    except Exception as e:
+        logger.error(f"Training job {job_id} failed: {str(e)}")
+        store.update_job(job_id, status='failed', finished_at=time.time(),
+                         error=str(e), traceback=traceback.format_exc())
+        return 1
+    store.update_job(job_id, status='succeeded', finished_at=time.time(), version=version, **report)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train and publish the insurance model')
+    parser.add_argument('--model-dir', help='Model store directory (default: MODEL_DIR from config)')
+    parser.add_argument('--job', help='Run the queued training job with this id')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'development'),
+                        help='Configuration name used when not running a job')
+    parser.add_argument('--n-jobs', type=int, help='Training parallelism (default: TRAIN_N_JOBS from config)')
+    parser.add_argument('--full', action='store_true', help='Retrain from scratch even if a warm start is possible')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+
+    from config import config
+    settings = {key: getattr(config[args.config], key) for key in TRAINING_SETTINGS}
+    if args.model_dir:
+        settings['MODEL_DIR'] = args.model_dir
+    if args.n_jobs is not None:
+        settings['TRAIN_N_JOBS'] = args.n_jobs
+    # A job started by the app has the caps in its environment (thread_env). A
+    # command line run caps NumPy's pools, already loaded, through threadpoolctl,
+    # which sklearn depends on; the OpenMP pool of sklearn, imported later, reads
+    # the variables.
+    limit_native_threads(settings['TRAIN_N_JOBS'])
+
+    if args.job:
+        return run_job(settings['MODEL_DIR'], args.job)
+
+    train_and_publish(settings, full=args.full)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,358 @@
+import time
+
+import numpy as np
+
+from arrayfile import write_arrays, open_arrays
+
+# Rows scored per traversal pass; bounds the (rows x trees) working arrays
+BATCH_CHUNK_SIZE = 4096
+
+# Largest absolute difference from sklearn accepted when exporting a forest
+PARITY_TOLERANCE = 1e-6
+
+# Rows timed one at a time when comparing a compacted forest with the original
+REPORT_LATENCY_ROWS = 200
+
+# Evenly spaced quantiles kept of the training targets in every leaf
+DEFAULT_QUANTILE_POINTS = 16
+
+
+def _index_dtype(n):
+    """Smallest unsigned integer type that can index n nodes"""
+    for dtype in (np.uint16, np.uint32):
+        if n <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+def _float32_floor(values):
+    """Largest float32 not above each value
+
+    Inputs are compared as float32, so x <= t holds exactly when x is at most
+    t rounded down to float32: the cast changes no split decision.
+    """
+    rounded = values.astype(np.float32)
+    return np.where(rounded > values, np.nextafter(rounded, np.float32(-np.inf)), rounded)
+
+
+class CompiledForest:
+    """Random forest regressor packed into flat NumPy arrays for inference
+
+    Every tree's nodes are stored back to back in the same arrays and ``roots``
+    holds the index of each tree's root. ``children`` interleaves the left and
+    right child of every node, so one step down a tree is a single gather at
+    ``2 * node + went_right``. Leaves point at themselves, which lets all trees
+    be walked together for a fixed number of levels without per-tree Python code.
+
+    ``leaf_quantiles``, if fitted, holds for every leaf a row of evenly spaced
+    quantiles of the training targets that ended up in it, from which
+    prediction quantiles are pooled; ``leaf_index`` maps a node to its row.
+    Forests saved before leaves got their own table have a row for every
+    node and no ``leaf_index``.
+    """
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth, n_features, leaf_quantiles=None,
+                 leaf_index=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.n_trees = len(roots)
+        self.leaf_quantiles = leaf_quantiles
+        self.leaf_index = leaf_index
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Export a fitted RandomForestRegressor"""
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            node = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            pairs = np.empty((tree.node_count, 2), dtype=np.intp)
+            pairs[:, 0] = np.where(is_leaf, node, tree.children_left) + offset
+            pairs[:, 1] = np.where(is_leaf, node, tree.children_right) + offset
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(pairs.ravel())
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            n_features=model.n_features_in_,
+        )
+
+    def _leaves(self, X, contributions=None):
+        """Return the leaf reached in every tree for each row, shape (rows, trees)
+
+        If a (rows, features) ``contributions`` array is given, the change in
+        node mean at every step is added to the feature split on, summed over
+        all trees.
+        """
+        flat = X.ravel()
+        row_offset = (np.arange(len(X), dtype=np.intp) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.max_depth):
+            feature = np.take(self.feature, node)
+            went_right = np.take(flat, row_offset + feature) > np.take(self.threshold, node)
+            # Compact forests store uint16/uint32 indices, which 2 * node could overflow
+            child = np.take(self.children, 2 * node.astype(np.intp, copy=False) + went_right)
+            if contributions is not None:
+                # Leaves point at themselves, so they add nothing
+                delta = np.take(self.value, child) - np.take(self.value, node)
+                contributions += np.bincount((row_offset + feature).ravel(), weights=delta.ravel(),
+                                             minlength=contributions.size).reshape(contributions.shape)
+            node = child
+        return node
+
+    def predict_one(self, row):
+        """Predict a single row, walking all trees at once"""
+        x = np.asarray(row, dtype=np.float32).ravel()
+        node = self.roots.astype(np.intp, copy=False)
+        for _ in range(self.max_depth):
+            node = self.children[2 * node + (x[self.feature[node]] > self.threshold[node])].astype(np.intp, copy=False)
+        return self.value[node].mean(dtype=np.float64)
+
+    def predict(self, X):
+        """Predict a 2-D feature matrix, matching RandomForestRegressor.predict"""
+        # sklearn casts inputs to float32 before comparing against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n, {self.n_features}), got {X.shape}")
+        if len(X) == 1:
+            return np.array([self.predict_one(X[0])])
+
+        out = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), BATCH_CHUNK_SIZE):
+            chunk = X[start:start + BATCH_CHUNK_SIZE]
+            out[start:start + len(chunk)] = np.take(self.value, self._leaves(chunk)).mean(axis=1, dtype=np.float64)
+        return out
+
+    def _levels(self, expand):
+        """Node indices of each tree level, following only nodes for which ``expand`` is true"""
+        levels = [np.asarray(self.roots, dtype=np.intp)]
+        while True:
+            parents = levels[-1][expand[levels[-1]]]
+            if not len(parents):
+                return levels
+            levels.append(np.take(self.children, np.stack([2 * parents, 2 * parents + 1], axis=1).ravel())
+                          .astype(np.intp))
+
+    def compact(self, tolerance=0.0):
+        """Return a smaller copy of the forest for serving
+
+        Thresholds are stored as float32 rounded down, which keeps every split
+        decision, and leaf values as float32. Feature ids become uint8 and node
+        indices the smallest unsigned type that fits. Any subtree whose leaves
+        lie within ``2 * tolerance`` of each other is merged into one leaf
+        holding their midrange, so no tree's output, and hence no prediction,
+        moves by more than ``tolerance`` from merging. Nodes no longer
+        reachable are dropped; internal nodes keep their means for explain().
+        Leaf quantiles are not carried over: fit them on the result.
+        """
+        n = len(self.value)
+        node = np.arange(n)
+        children = np.asarray(self.children, dtype=np.intp).reshape(-1, 2)
+        is_leaf = children[:, 0] == node
+
+        # Range of the leaf values below every node, filled bottom-up level by level
+        levels = self._levels(~is_leaf)
+        low = np.asarray(self.value, dtype=np.float64).copy()
+        high = low.copy()
+        for level in reversed(levels):
+            internal = level[~is_leaf[level]]
+            left, right = children[internal, 0], children[internal, 1]
+            low[internal] = np.minimum(low[left], low[right])
+            high[internal] = np.maximum(high[left], high[right])
+
+        merged = is_leaf | (high - low <= 2 * tolerance)
+        levels = self._levels(~merged)
+        kept = np.sort(np.concatenate(levels))
+
+        # Trees stay contiguous and every parent keeps a lower index than its children
+        index_dtype = _index_dtype(len(kept))
+        new_index = np.full(n, -1, dtype=np.intp)
+        new_index[kept] = np.arange(len(kept))
+        leaf = merged[kept]
+        pairs = np.where(leaf[:, None], np.arange(len(kept))[:, None], new_index[children[kept]])
+
+        return CompiledForest(
+            feature=np.where(leaf, 0, self.feature[kept]).astype(np.uint8 if self.n_features <= 256 else np.intp),
+            threshold=np.where(leaf, np.float32(np.inf), _float32_floor(np.asarray(self.threshold)[kept])),
+            children=pairs.ravel().astype(index_dtype),
+            value=np.where(leaf, (low[kept] + high[kept]) / 2, self.value[kept]).astype(np.float32),
+            roots=new_index[self.roots].astype(index_dtype),
+            max_depth=len(levels) - 1,
+            n_features=self.n_features,
+        )
+
+    def score(self, X, explain=False, quantiles=None):
+        """Predict a 2-D feature matrix, optionally with explanations and quantiles
+
+        Returns (predictions, explanation, quantile_values); the extras are
+        None unless requested, and all come from one traversal.
+
+        With ``explain``, the explanation is (bias, contributions): ``bias`` is
+        the mean root value over the trees and ``contributions[i, j]`` the part
+        of row i's prediction due to splits on feature j, i.e. the change in
+        node mean along the row's path through every tree, averaged over the
+        trees (tree-path decomposition). A row's bias plus contributions
+        equals its prediction.
+
+        ``quantiles`` (levels in [0, 1]) gives a (rows, levels) array pooled
+        from the leaf quantiles of every tree the row reaches, weighting the
+        trees equally like a quantile regression forest.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array of shape (n, {self.n_features}), got {X.shape}")
+        if quantiles is not None and self.leaf_quantiles is None:
+            raise ValueError("This forest has no leaf quantiles; retrain to add them")
+
+        out = np.empty(len(X), dtype=np.float64)
+        contributions = np.zeros((len(X), self.n_features), dtype=np.float64) if explain else None
+        quantile_values = np.empty((len(X), len(quantiles)), dtype=np.float64) if quantiles is not None else None
+        for start in range(0, len(X), BATCH_CHUNK_SIZE):
+            chunk = X[start:start + BATCH_CHUNK_SIZE]
+            rows = slice(start, start + len(chunk))
+            leaves = self._leaves(chunk, contributions[rows] if explain else None)
+            out[rows] = np.take(self.value, leaves).mean(axis=1, dtype=np.float64)
+            if quantiles is not None:
+                if self.leaf_index is not None:
+                    leaves = np.take(self.leaf_index, leaves)
+                pooled = np.take(self.leaf_quantiles, leaves, axis=0).reshape(len(chunk), -1)
+                quantile_values[rows] = np.quantile(pooled, quantiles, axis=1).T
+
+        explanation = None
+        if explain:
+            contributions /= self.n_trees
+            explanation = (float(np.take(self.value, self.roots).mean(dtype=np.float64)), contributions)
+        return out, explanation, quantile_values
+
+    def explain(self, X):
+        """Predict a 2-D feature matrix and decompose each prediction by feature
+
+        Returns (predictions, bias, contributions); see score().
+        """
+        predictions, (bias, contributions), _ = self.score(X, explain=True)
+        return predictions, bias, contributions
+
+    def fit_leaf_quantiles(self, X, y, points=DEFAULT_QUANTILE_POINTS):
+        """Summarize the targets reaching every leaf by ``points`` evenly spaced quantiles
+
+        Leaves no training row reaches keep their mean value. Only leaves get
+        a row in the table, located through ``leaf_index``.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        leaves = np.concatenate([self._leaves(X[start:start + BATCH_CHUNK_SIZE])
+                                 for start in range(0, len(X), BATCH_CHUNK_SIZE)]).ravel()
+        targets = np.repeat(np.asarray(y, dtype=np.float64), self.n_trees)
+
+        order = np.lexsort((targets, leaves))
+        leaves, targets = leaves[order], targets[order]
+        nodes, starts, counts = np.unique(leaves, return_index=True, return_counts=True)
+        levels = (np.arange(points) + 0.5) / points
+        positions = starts[:, None] + np.minimum((levels * counts[:, None]).astype(np.intp), counts[:, None] - 1)
+
+        node_count = len(self.value)
+        is_leaf = np.asarray(self.children, dtype=np.intp).reshape(-1, 2)[:, 0] == np.arange(node_count)
+        leaf_nodes = np.flatnonzero(is_leaf)
+        # Internal nodes are never looked up; they point at row 0
+        leaf_index = np.zeros(node_count, dtype=_index_dtype(len(leaf_nodes)))
+        leaf_index[leaf_nodes] = np.arange(len(leaf_nodes))
+
+        table = np.repeat(np.asarray(self.value, dtype=np.float32)[leaf_nodes, None], points, axis=1)
+        table[leaf_index[nodes]] = targets[positions]
+        self.leaf_quantiles = table
+        self.leaf_index = leaf_index
+
+    def max_abs_error(self, model, X):
+        """Largest absolute difference from the sklearn forest on X"""
+        X = np.asarray(X, dtype=np.float64)
+        return float(np.max(np.abs(self.predict(X) - model.predict(X)), initial=0.0))
+
+    def save(self, path):
+        """Write the packed arrays to a single memory-mappable file"""
+        with open(path, 'wb') as f:
+            write_arrays(
+                f,
+                {
+                    'feature': self.feature,
+                    'threshold': self.threshold,
+                    'children': self.children,
+                    'value': self.value,
+                    'roots': self.roots,
+                    **({'leaf_quantiles': self.leaf_quantiles} if self.leaf_quantiles is not None else {}),
+                    **({'leaf_index': self.leaf_index} if self.leaf_index is not None else {}),
+                },
+                meta={'max_depth': self.max_depth, 'n_features': self.n_features}
+            )
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a forest written by save(), memory-mapping its arrays by default"""
+        meta, arrays = open_arrays(path, mmap=mmap)
+        return cls(max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+
+    @property
+    def node_count(self):
+        return len(self.value)
+
+    @property
+    def nbytes(self):
+        """Total size of the packed arrays"""
+        arrays = (self.feature, self.threshold, self.children, self.value, self.roots, self.leaf_quantiles,
+                  self.leaf_index)
+        return sum(a.nbytes for a in arrays if a is not None)
+
+
+def _profile(forest, X, y=None):
+    """Size and latency of a forest, plus its mean absolute error when targets are given"""
+    single = []
+    for row in X[:REPORT_LATENCY_ROWS]:
+        start = time.perf_counter()
+        forest.predict(row[None, :])
+        single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    predictions = forest.predict(X)
+    batch = time.perf_counter() - start
+
+    profile = {
+        'nodes': forest.node_count,
+        'bytes': forest.nbytes,
+        'max_depth': forest.max_depth,
+        'single_row_us': round(float(np.median(single)) * 1e6, 3) if single else None,
+        'batch_row_us': round(batch / max(1, len(X)) * 1e6, 3),
+    }
+    if y is not None:
+        profile['mae'] = float(np.mean(np.abs(predictions - y))) if len(y) else 0.0
+    return profile, predictions
+
+
+def compaction_report(original, compacted, X, y=None):
+    """Size, accuracy and latency of a compacted forest against the original on X"""
+    X = np.asarray(X, dtype=np.float32)
+    y = None if y is None else np.asarray(y, dtype=np.float64)
+    report = {}
+    report['original'], expected = _profile(original, X, y)
+    report['compact'], predictions = _profile(compacted, X, y)
+    difference = np.abs(predictions - expected)
+    report['max_abs_diff'] = float(np.max(difference, initial=0.0))
+    report['mean_abs_diff'] = float(np.mean(difference)) if len(difference) else 0.0
+    return report